@@ -1,23 +1,103 @@
 # ai_analyzer.py
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, Content
-from vertexai.language_models import TextEmbeddingModel
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from __future__ import annotations
+
 import numpy as np
+import contextvars
 import json
+import os
 import re
+import time
+
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from config import (
+    GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES,
+    GEMINI_CHUNK_MAX_CHARS, GEMINI_CHUNK_CONCURRENCY, MATCH_TOP_K, PROMPT_PRUNING_ENABLED,
+    VECTOR_INDEX_BACKEND, VECTOR_INDEX_IVF_MIN_ROWS, VECTOR_INDEX_IVF_LISTS, VECTOR_INDEX_IVF_PROBES, VECTOR_INDEX_DIR,
+    MATCH_MODE, MATCH_SHORTLIST_SIZE, MATCH_LEXICAL_WEIGHT, MATCH_LEXICAL_THRESHOLD,
+    REQUIREMENT_EMBEDDING_CACHE_DIR, REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES,
+)
+from asset_catalog import AssetCatalog, get_asset_catalog
+from asset_matcher import AssetMatcher, SIMILARITY_THRESHOLD
+from term_matcher import get_term_matcher
+from embedding_cache import get_embedding_cache, normalize_requirement_text
+from embedding_client import get_embedding_client
+import model_registry
+from model_registry import get_generative_model
+from metrics import EXTERNAL_CALL_SECONDS, GEMINI_CALLS_TOTAL, GEMINI_TOKENS_TOTAL, PROMPT_PRUNING_TOTAL, PROMPT_CHARS_TOTAL, count, span
+from section_index import prune_edital_text
+from scheduler import gemini_call
+from vector_index import ExactIndex, create_index, load_index, l2_normalize
+
+# pandas e o SDK do Vertex AI são importados no primeiro uso (model_registry), não no cold start
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Versão do prompt de extração: incremente ao alterar o prompt para invalidar resultados em cache
+# (a poda de seções muda o texto enviado, então também entra na versão)
+EXTRACTION_PROMPT_VERSION = "3" + (":secoes" if PROMPT_PRUNING_ENABLED else "")
 
 # Função para inicializar o Vertex AI
-def initialize_vertex_ai(project_id: str, location: str):
-    vertexai.init(project=project_id, location=location)
+def initialize_vertex_ai(project_id: str, location: str, deferred: bool = False):
+    model_registry.initialize_vertex_ai(project_id, location, deferred)
 
 # Função para extrair requisitos usando Gemini
-def extract_requirements_with_gemini(edital_text: str) -> dict:
+def extract_requirements_with_gemini(edital_text: str, chunked: bool | None = None) -> dict:
     """
     Extrai informações estruturadas de requisitos do edital usando o modelo Gemini.
+    Com PROMPT_PRUNING_ENABLED, só as seções relevantes do edital são enviadas (ver section_index).
+    Editais maiores que GEMINI_CHUNK_MAX_CHARS caracteres (ou com chunked=True) são extraídos
+    em trechos, em paralelo, e os resultados parciais são combinados no mesmo esquema JSON.
     """
-    model = GenerativeModel("gemini-1.5-flash-001") # Ou "gemini-1.0-pro"
+    if PROMPT_PRUNING_ENABLED:
+        edital_text = _prune_prompt_text(edital_text)
+    if chunked is None:
+        chunked = GEMINI_CHUNK_MAX_CHARS > 0 and len(edital_text) > GEMINI_CHUNK_MAX_CHARS
+    if chunked:
+        return extract_requirements_chunked(edital_text)
+    return _extract_requirements_from_text(edital_text)
+
+def _prune_prompt_text(edital_text: str) -> str:
+    """Aplica a poda de seções e registra a economia (métricas, detalhamento da requisição e log)."""
+    with span("indice_secoes"):
+        result = prune_edital_text(edital_text)
+    PROMPT_PRUNING_TOTAL.inc(result="pruned" if result.pruned else "full")
+    PROMPT_CHARS_TOTAL.inc(result.original_chars, kind="original")
+    PROMPT_CHARS_TOTAL.inc(result.kept_chars, kind="sent")
+    count("prompt_chars_original", result.original_chars)
+    count("prompt_chars_sent", result.kept_chars)
+    count("prompt_tokens_saved_estimate", result.tokens_saved_estimate)
+    if result.pruned:
+        print(f"Prompt reduzido: {result.sections_kept} de {result.sections_total} seções, {result.kept_chars} de "
+              f"{result.original_chars} caracteres (~{result.tokens_saved_estimate} tokens economizados).")
+    elif result.sections_total:
+        print(f"Prompt com o edital completo: {result.reason} ({result.sections_total} seções).")
+    return result.text
+
+def _record_gemini_usage(response):
+    """Contabiliza a chamada e os tokens de prompt/resposta (usage_metadata) nas métricas e na requisição atual. Retorna o total de tokens."""
+    GEMINI_CALLS_TOTAL.inc(model=GEMINI_MODEL_NAME)
+    count("gemini_calls")
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    response_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    GEMINI_TOKENS_TOTAL.inc(prompt_tokens, model=GEMINI_MODEL_NAME, kind="prompt")
+    GEMINI_TOKENS_TOTAL.inc(response_tokens, model=GEMINI_MODEL_NAME, kind="response")
+    count("gemini_prompt_tokens", prompt_tokens)
+    count("gemini_response_tokens", response_tokens)
+    return prompt_tokens + response_tokens
+
+# Tokens de resposta reservados na cota antes da chamada (o JSON de requisitos costuma ficar abaixo disso)
+EXPECTED_RESPONSE_TOKENS = 2048
+
+def _extract_requirements_from_text(edital_text: str, chunk_note: str = "") -> dict:
+    """Uma chamada ao Gemini para o texto informado (edital completo ou um trecho dele)."""
+    model = get_generative_model(GEMINI_MODEL_NAME)
 
     # Prompt mais robusto e com exemplos para guiar a extração
     prompt = f"""
@@ -68,12 +148,18 @@ def extract_requirements_with_gemini(edital_text: str) -> dict:
             "ContatoDuvidas": "..."
         }}
     }}
-
+    {chunk_note}
     Texto do Edital:
     {edital_text}
     """
 
-    response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+    # Cota de tokens: reserva ~4 caracteres por token do prompt mais a resposta esperada; corrigida depois pelo usage_metadata
+    estimated_tokens = len(prompt) // 4 + EXPECTED_RESPONSE_TOKENS
+    with gemini_call(estimated_tokens) as adjust_tokens:
+        started = time.perf_counter()
+        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, service="gemini")
+        adjust_tokens(_record_gemini_usage(response) or estimated_tokens)
     
     # O Gemini pode envolver o JSON em '```json\n...\n```'. Limpar isso.
     try:
@@ -98,52 +184,316 @@ def extract_requirements_with_gemini(edital_text: str) -> dict:
         # Tentar uma correção mais agressiva ou retornar um dicionário vazio com erro
         return {"Error": "Failed to parse Gemini JSON output", "RawGeminiOutput": response.text}
 
+# Início de seção: cláusulas numeradas ("6.1.3 Qualificação técnica", "7. DO PAGAMENTO")
+# ou títulos como "CLÁUSULA", "CAPÍTULO", "ANEXO", "SEÇÃO"
+SECTION_START_PATTERN = re.compile(
+    r"^\s*(?:\d{1,2}(?:\.\d{1,2}){0,4}\.?\s+\S|(?:CL[ÁA]USULA|CAP[ÍI]TULO|ANEXO|SE[ÇC][ÃA]O|T[ÍI]TULO)\b)",
+    re.MULTILINE,
+)
+
+def split_edital_into_chunks(edital_text: str, max_chars: int) -> list[str]:
+    """
+    Divide o edital em trechos de até `max_chars` caracteres, cortando preferencialmente em inícios
+    de seção. Seções maiores que o limite são divididas em quebras de linha.
+    """
+    boundaries = [match.start() for match in SECTION_START_PATTERN.finditer(edital_text)]
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    sections = [edital_text[start:end] for start, end in zip(boundaries, boundaries[1:] + [len(edital_text)])]
+
+    pieces = []
+    for section in sections:
+        while len(section) > max_chars:
+            cut = section.rfind("\n", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(section[:cut])
+            section = section[cut:]
+        pieces.append(section)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def extract_requirements_chunked(edital_text: str, max_chars: int = GEMINI_CHUNK_MAX_CHARS, concurrency: int = GEMINI_CHUNK_CONCURRENCY) -> dict:
+    """
+    Map-reduce da extração: cada trecho do edital é enviado ao Gemini (no máximo `concurrency`
+    chamadas simultâneas) e os JSONs parciais são combinados por merge_extracted_requirements.
+    """
+    chunks = split_edital_into_chunks(edital_text, max_chars)
+    if len(chunks) <= 1:
+        return _extract_requirements_from_text(edital_text)
+
+    def extract_chunk(index: int) -> dict:
+        chunk_note = (
+            f"Este texto é o trecho {index + 1} de {len(chunks)} do edital. Extraia apenas o que constar neste trecho; "
+            "use \"N/A\" ou listas vazias para o que não aparecer nele."
+        )
+        return _extract_requirements_from_text(chunks[index], chunk_note)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="gemini-chunk") as executor:
+        # Cada trecho roda com uma cópia do contexto da requisição (métricas por requisição)
+        futures = [executor.submit(contextvars.copy_context().run, extract_chunk, index) for index in range(len(chunks))]
+        partials = [future.result() for future in futures]
+    print(f"Extração em {len(chunks)} trechos concluída ({sum('Error' in p for p in partials)} com erro).")
+    return merge_extracted_requirements(partials)
+
+def _dedupe_key(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, ensure_ascii=False)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+def _is_missing(value) -> bool:
+    return value is None or value == "" or value == [] or value == {} or (isinstance(value, str) and value.strip().upper() == "N/A")
+
+def _merge_lists(values: list[list]) -> list:
+    merged = []
+    seen = set()
+    for items in values:
+        for item in items if isinstance(items, list) else [items]:
+            key = _dedupe_key(item)
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+def _merge_values(values: list):
+    """Combina os valores de um mesmo campo vindos de vários trechos (ordem dos trechos preservada)."""
+    present = [value for value in values if not _is_missing(value)]
+    if not present:
+        return values[0] if values else "N/A"
+    if all(isinstance(value, dict) for value in present):
+        keys = []
+        for value in present:
+            keys.extend(key for key in value if key not in keys)
+        return {key: _merge_values([value.get(key) for value in present if key in value]) for key in keys}
+    if any(isinstance(value, list) for value in present):
+        return _merge_lists(present)
+    return present[0]
+
+def merge_extracted_requirements(partials: list[dict]) -> dict:
+    """
+    Combina de forma determinística os JSONs parciais da extração em trechos:
+    campos escalares ficam com o primeiro valor diferente de "N/A"; listas são concatenadas sem
+    duplicatas (comparação sem acentos, caixa ou pontuação); itens de
+    RequisitosObjetoQualificacaoTecnicaEspecifica com a mesma Descricao são unidos.
+    """
+    valid = [partial for partial in partials if isinstance(partial, dict) and "Error" not in partial]
+    if not valid:
+        return partials[0] if partials else {"Error": "No chunks extracted"}
+
+    object_items = {}
+    for partial in valid:
+        for item in partial.get("RequisitosObjetoQualificacaoTecnicaEspecifica", []) or []:
+            if not isinstance(item, dict):
+                continue
+            key = _dedupe_key(item.get("Descricao", "")) or _dedupe_key(item)
+            object_items.setdefault(key, []).append(item)
+
+    keys = []
+    for partial in valid:
+        keys.extend(key for key in partial if key not in keys)
+
+    merged = {}
+    for key in keys:
+        if key == "RequisitosObjetoQualificacaoTecnicaEspecifica":
+            merged[key] = [_merge_values(items) for items in object_items.values()]
+        else:
+            merged[key] = _merge_values([partial.get(key) for partial in valid if key in partial])
+    return merged
+
 
 # Função para gerar embeddings
-def get_text_embeddings(texts: list[str]) -> list[list[float]]:
+def get_text_embeddings(texts: list[str]) -> np.ndarray:
     """
     Gera embeddings para uma lista de textos usando o modelo de embedding do Vertex AI.
+    Usa o cliente compartilhado (lotes concorrentes com retry) e retorna uma matriz float32 (len(texts), dim).
     """
-    model = TextEmbeddingModel.from_pretrained("text-embedding-004") # Ou outro modelo de embedding adequado
-    embeddings = model.embed(texts)
-    return [embedding.values for embedding in embeddings]
-
-# Função para normalizar termos (ex: Google Workspace, GWS)
-# Pode ser expandida com um dicionário de sinônimos ou com a ajuda de um LLM
-def normalize_term(term: str) -> str:
-    term = term.lower().strip()
-    replacements = {
-        "google workspace": "google workspace",
-        "gws": "google workspace",
-        "contas google": "google workspace contas",
-        "google cloud platform": "google cloud platform",
-        "gcp": "google cloud platform",
-        "armazenamento em nuvem": "cloud storage",
-        "nuvem pública": "cloud public",
-        "ia": "inteligência artificial",
-        "inteligência artificial": "inteligência artificial",
-        "robô": "robô",
-        "robotizado": "robô",
-        "chatbots": "chatbot",
-        "ura": "unidade de resposta audível",
-        "geração de linguagem natural": "geração de linguagem natural"
-    }
-    # Tenta encontrar correspondência exata primeiro, depois parcial
-    for key, value in replacements.items():
-        if key in term:
-            return value
-    return term
+    with span("embeddings"):
+        return get_embedding_client(EMBEDDING_MODEL_NAME).embed(texts)
 
-# Função para cruzar ativos com requisitos
-def cross_reference_assets(extracted_requirements: dict, assets_df: pd.DataFrame) -> pd.DataFrame:
+def get_asset_texts(assets_df: pd.DataFrame | AssetCatalog) -> list[str]:
+    """Texto de cada ativo usado no embedding (produtos + resumo do objeto)."""
+    return get_asset_catalog(assets_df).texts
+
+def get_asset_embeddings(assets_df: pd.DataFrame | AssetCatalog, exclusive: bool = False) -> np.ndarray:
     """
-    Cruza os requisitos extraídos do edital com os ativos da planilha.
-    Retorna um DataFrame com a análise de atendimento.
+    Retorna os embeddings dos ativos (matriz float32) usando o cache em disco.
+    Apenas linhas novas ou alteradas da planilha são enviadas ao Vertex AI.
+    """
+    cache = get_embedding_cache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES)
+    return cache.embed(get_asset_texts(assets_df), get_text_embeddings, exclusive=exclusive)
+
+def get_requirement_embeddings(requirements: list[str]) -> np.ndarray:
+    """
+    Embeddings dos requisitos, um por requisito. Requisitos iguais após normalize_requirement_text
+    (numeração, acentos, caixa, espaços) são enviados ao Vertex AI uma única vez, e o cache em disco
+    reaproveita as cláusulas que se repetem entre editais.
+    """
+    if REQUIREMENT_EMBEDDING_CACHE_DIR:
+        cache = get_embedding_cache(REQUIREMENT_EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES,
+                                    normalize=normalize_requirement_text, name="requirement_embedding")
+        return cache.embed(requirements, get_text_embeddings)
+    distinct = {}
+    positions = [distinct.setdefault(normalize_requirement_text(text), len(distinct)) for text in requirements]
+    representatives = {}
+    for text, position in zip(requirements, positions):
+        representatives.setdefault(position, text)
+    vectors = np.asarray(get_text_embeddings([representatives[position] for position in range(len(distinct))]), dtype=np.float32)
+    return vectors[positions]
+
+def warm_asset_embedding_cache(assets_df: pd.DataFrame):
+    """
+    Aquece o cache de embeddings dos ativos (ex.: no startup).
+    Com vários workers, o primeiro a obter o lock calcula os embeddings ausentes e os demais reaproveitam.
     """
     if assets_df.empty:
-        return pd.DataFrame(columns=['Requisito', 'Tipo', 'Status', 'Evidência', 'Ação Necessária'])
+        return
+    get_asset_embeddings(assets_df, exclusive=True)
+    cache = get_embedding_cache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES)
+    print(f"Cache de embeddings aquecido: {cache.stats()}")
 
-    # Extrair os requisitos relevantes para cruzamento
+_asset_matcher_lock = threading.Lock()
+_asset_matcher_cache = {"catalog": None, "terms": None, "matcher": None}
+_vector_index = None
+
+def _vector_index_kind(rows: int) -> str:
+    if VECTOR_INDEX_BACKEND == "auto":
+        return "ivf" if rows >= VECTOR_INDEX_IVF_MIN_ROWS else "exact"
+    return VECTOR_INDEX_BACKEND
+
+def get_asset_vector_index(asset_embeddings: np.ndarray, keys: list[str]) -> tuple[ExactIndex, list[int]]:
+    """
+    Índice vetorial do catálogo, persistido em VECTOR_INDEX_DIR e reaberto via mmap.
+    Quando a planilha muda, apenas as linhas novas/alteradas (chaves ausentes) são adicionadas;
+    o índice é reconstruído se o backend mudar ou se a maior parte dos vetores ficar obsoleta.
+    Retorna (índice, id de cada linha no índice).
+    """
+    global _vector_index
+    kind = _vector_index_kind(len(keys))
+    dim = asset_embeddings.shape[1]
+    index_dir = os.path.join(VECTOR_INDEX_DIR, kind)
+
+    with _asset_matcher_lock:
+        index = _vector_index
+        if index is None or index.kind != kind or index.dim != dim:
+            index = load_index(index_dir)
+        if index is not None and (index.kind != kind or index.dim != dim or index.ntotal > 2 * len(set(keys))):
+            index = None
+        if index is None:
+            index = create_index(kind, dim, n_lists=VECTOR_INDEX_IVF_LISTS, n_probe=VECTOR_INDEX_IVF_PROBES)
+
+        previous_total = index.ntotal
+        row_ids = index.add(asset_embeddings, keys)
+        if index.ntotal != previous_total:
+            print(f"Índice vetorial ({kind}): {index.ntotal - previous_total} vetores adicionados, {index.ntotal} no total.")
+            try:
+                index.save(index_dir)
+            except OSError as e:
+                print(f"Aviso: não foi possível salvar o índice vetorial: {e}")
+        _vector_index = index
+    return index, row_ids
+
+def get_asset_matcher(assets_df: pd.DataFrame | AssetCatalog, with_vectors: bool = True) -> AssetMatcher:
+    """
+    Motor de correspondência para o catálogo informado. É reconstruído apenas quando o catálogo
+    muda (o snapshot da planilha é compartilhado entre requisições enquanto não houver nova revisão)
+    ou quando a tabela de sinônimos é recompilada.
+    Com with_vectors=False (modo lexical), os embeddings dos ativos não são calculados; o índice
+    vetorial é anexado na primeira chamada que precisar dele.
+    """
+    catalog = get_asset_catalog(assets_df)
+    term_matcher = get_term_matcher()
+    with _asset_matcher_lock:
+        matcher = None
+        if _asset_matcher_cache["catalog"] is catalog and _asset_matcher_cache["terms"] is term_matcher:
+            matcher = _asset_matcher_cache["matcher"]
+    if matcher is None:
+        matcher = AssetMatcher(catalog, term_matcher=term_matcher)
+        with _asset_matcher_lock:
+            _asset_matcher_cache["catalog"] = catalog
+            _asset_matcher_cache["terms"] = term_matcher
+            _asset_matcher_cache["matcher"] = matcher
+
+    if with_vectors and matcher.index is None:
+        asset_embeddings = get_asset_embeddings(catalog)
+        cache = get_embedding_cache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES)
+        keys = [cache.make_key(text) for text in catalog.texts]
+        index, row_ids = get_asset_vector_index(asset_embeddings, keys)
+        matcher.set_index(index, row_ids)
+    return matcher
+
+def prepare_asset_matcher(assets_df: pd.DataFrame) -> AssetMatcher:
+    """
+    Pré-constrói o motor de correspondência do catálogo para o MATCH_MODE configurado (embeddings e
+    índice vetorial no modo "embedding"; índice BM25 nos demais), para que análises seguidas o reaproveitem.
+    """
+    matcher = get_asset_matcher(assets_df, with_vectors=MATCH_MODE == "embedding")
+    if MATCH_MODE != "embedding":
+        matcher.lexical
+    return matcher
+
+def get_matching_version() -> str:
+    """Identifica a configuração do cruzamento (modo, peso e tabela de sinônimos) para a chave do cache de resultados."""
+    return f"{MATCH_MODE}:{MATCH_LEXICAL_WEIGHT}:{MATCH_SHORTLIST_SIZE}:{MATCH_LEXICAL_THRESHOLD}:{get_term_matcher().fingerprint}"
+
+def blend_scores(cosine: np.ndarray, lexical: np.ndarray, weight: float = MATCH_LEXICAL_WEIGHT) -> np.ndarray:
+    """
+    Score híbrido: o BM25 normalizado só reforça o cosseno (cos + w * lex * (1 - cos)), então um
+    requisito sem palavra-chave em comum mantém o score semântico e o limiar de classificação
+    continua com o mesmo significado.
+    """
+    return cosine + weight * lexical * (1 - cosine)
+
+def _rank_hybrid(matcher: AssetMatcher, assets_df: pd.DataFrame, requirements: list[str], top_k: int,
+                 requirement_embeddings: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pré-seleção lexical (BM25) + reranqueamento por embeddings apenas dos pares pré-selecionados.
+    Requisitos sem nenhum candidato lexical usam a busca vetorial no catálogo inteiro.
+    Retorna (linhas, scores, embeddings normalizados dos requisitos).
+    """
+    shortlist_rows, shortlist_scores = matcher.lexical.search(requirements, max(top_k, MATCH_SHORTLIST_SIZE))
+    if requirement_embeddings is None:
+        requirement_embeddings = get_requirement_embeddings(requirements)
+    requirement_embeddings = l2_normalize(requirement_embeddings)
+
+    shortlisted = np.unique(shortlist_rows[shortlist_rows >= 0])
+    position = {row: i for i, row in enumerate(shortlisted)}
+    if len(shortlisted):
+        # Só os ativos pré-selecionados precisam de embedding (os demais nem são enviados ao Vertex AI)
+        asset_embeddings = l2_normalize(get_asset_embeddings(get_asset_catalog(assets_df).take(shortlisted)))
+
+    top_indices = np.full((len(requirements), top_k), -1, dtype=np.int64)
+    top_scores = np.full((len(requirements), top_k), -np.inf, dtype=np.float32)
+    without_candidates = []
+    for q in range(len(requirements)):
+        valid = shortlist_rows[q] >= 0
+        rows = shortlist_rows[q][valid]
+        if not len(rows):
+            without_candidates.append(q)
+            continue
+        cosine = asset_embeddings[[position[row] for row in rows]] @ requirement_embeddings[q]
+        blended = blend_scores(cosine, shortlist_scores[q][valid])
+        order = np.argsort(-blended, kind="stable")[:top_k]
+        top_indices[q, :len(order)] = rows[order]
+        top_scores[q, :len(order)] = blended[order]
+
+    if without_candidates:
+        fallback_indices, fallback_scores = get_asset_matcher(assets_df).top_k(requirement_embeddings[without_candidates], top_k)
+        found = fallback_indices.shape[1]
+        top_indices[without_candidates, :found] = fallback_indices
+        top_scores[without_candidates, :found] = fallback_scores
+    return top_indices, top_scores, requirement_embeddings
+
+def collect_requirements(extracted_requirements: dict) -> list[str]:
+    """Textos dos requisitos cruzados com os ativos: itens do objeto/qualificação técnica e habilitações técnicas."""
     all_requirements = []
     
     # Requisitos do Objeto/Qualificação Técnica Específica
@@ -157,100 +507,88 @@ def cross_reference_assets(extracted_requirements: dict, assets_df: pd.DataFrame
             if "atestado" in req_item.lower() or "certificação" in req_item.lower() or "serviço especializado" in req_item.lower():
                 all_requirements.append(req_item)
     
-    all_requirements = [req for req in all_requirements if req.strip()] # Remove vazios
+    return [req for req in all_requirements if req.strip()] # Remove vazios
+
+def requirement_type_of(extracted_requirements: dict) -> str:
+    return "Objeto/Qualificação Técnica" if "RequisitosObjetoQualificacaoTecnicaEspecifica" in extracted_requirements else "Habilitação Técnica"
+
+def rank_requirements(requirements: list[str], assets_df: pd.DataFrame, top_k: int = MATCH_TOP_K,
+                      requirement_embeddings: np.ndarray | None = None) -> tuple[AssetMatcher, np.ndarray, np.ndarray, float, np.ndarray | None]:
+    """
+    Os top_k ativos de cada requisito no MATCH_MODE configurado. Embeddings dos requisitos já
+    calculados (ex.: salvos com a extração do edital) evitam a chamada ao Vertex AI.
+    Retorna (matcher, linhas, scores, limiar de "atende", embeddings dos requisitos; None no modo lexical).
+    """
+    threshold = SIMILARITY_THRESHOLD
+    if MATCH_MODE == "lexical":
+        # Apenas BM25 local: nenhuma chamada ao Vertex AI
+        matcher = get_asset_matcher(assets_df, with_vectors=False)
+        top_indices, top_scores = matcher.lexical.search(requirements, top_k)
+        return matcher, top_indices, top_scores, MATCH_LEXICAL_THRESHOLD, None
+    if MATCH_MODE == "hybrid":
+        matcher = get_asset_matcher(assets_df, with_vectors=False)
+        top_indices, top_scores, requirement_embeddings = _rank_hybrid(matcher, assets_df, requirements, top_k, requirement_embeddings)
+        return matcher, top_indices, top_scores, threshold, requirement_embeddings
+
+    # Embeddings dos ativos (matriz normalizada, pré-calculada por catálogo) e dos requisitos
+    matcher = get_asset_matcher(assets_df)
+    if requirement_embeddings is None:
+        requirement_embeddings = get_requirement_embeddings(requirements)
+    # Todos os requisitos contra todos os ativos em um único produto de matrizes
+    top_indices, top_scores = matcher.top_k(requirement_embeddings, top_k)
+    return matcher, top_indices, top_scores, threshold, requirement_embeddings
+
+def build_match_row(matcher: AssetMatcher, req_text: str, requirement_type: str, rows: np.ndarray, scores: np.ndarray,
+                    threshold: float, top_k: int = MATCH_TOP_K) -> dict:
+    """Linha do mapa de atendimento para o requisito, a partir dos seus candidatos (linhas/scores do melhor para o pior)."""
+    if len(rows) and rows[0] >= 0:
+        status, evidence, action_needed = matcher.classify(req_text, int(rows[0]), float(scores[0]), threshold)
+    else:
+        status, evidence, action_needed = "🚨 Não atende / Bloqueador", "—", "Buscar solução ou impugnar"
+
+    row = {
+        "Requisito": req_text,
+        "Tipo": requirement_type,
+        "Status": status,
+        "Evidência": evidence,
+        "Ação Necessária": action_needed
+    }
+    if top_k > 1:
+        row["Candidatos"] = matcher.describe_candidates(rows, scores)
+    return row
+
+# Função para cruzar ativos com requisitos
+def cross_reference_assets(extracted_requirements: dict, assets_df: pd.DataFrame, top_k: int = MATCH_TOP_K, on_row=None,
+                           on_match=None) -> pd.DataFrame:
+    """
+    Cruza os requisitos extraídos do edital com os ativos da planilha.
+    Retorna um DataFrame com a análise de atendimento. Com top_k > 1, a coluna "Candidatos"
+    lista os k ativos mais similares a cada requisito. `on_row(linha)` é chamado com cada
+    linha do mapa assim que ela é classificada (resposta em streaming).
+    `on_match(requisitos, embeddings, linhas, scores)` recebe o resultado do ranqueamento
+    (persistido para o recruzamento incremental, ver rematch.py).
+    """
+    import pandas as pd
+
+    if assets_df.empty:
+        return pd.DataFrame(columns=['Requisito', 'Tipo', 'Status', 'Evidência', 'Ação Necessária'])
 
+    # Extrair os requisitos relevantes para cruzamento
+    all_requirements = collect_requirements(extracted_requirements)
     if not all_requirements:
         return pd.DataFrame(columns=['Requisito', 'Tipo', 'Status', 'Evidência', 'Ação Necessária'])
 
-    # Prepare os textos para embeddings (ativos e requisitos)
-    assets_texts = assets_df['ProdutosConcatenados'].fillna('') + ' ' + assets_df['Resumo_Objeto_Consolidado'].fillna('')
-    assets_embeddings = get_text_embeddings(assets_texts.tolist())
-    
-    requirements_embeddings = get_text_embeddings(all_requirements)
+    matcher, top_indices, top_scores, threshold, requirement_embeddings = rank_requirements(all_requirements, assets_df, top_k)
+    if on_match is not None:
+        on_match(all_requirements, requirement_embeddings, top_indices, top_scores)
 
+    requirement_type = requirement_type_of(extracted_requirements)
     analysis_results = []
-
     for i, req_text in enumerate(all_requirements):
-        req_embedding = requirements_embeddings[i]
-        
-        best_match_score = -1
-        best_match_asset_index = -1
-        
-        # Calcule a similaridade do requisito com todos os ativos
-        if assets_embeddings and req_embedding: # Garante que não está vazio
-            # Reshape para cosine_similarity: (1, n_features) para o vetor único, (n_samples, n_features) para múltiplos vetores
-            similarities = cosine_similarity(np.array(req_embedding).reshape(1, -1), np.array(assets_embeddings)).flatten()
-            best_match_asset_index = np.argmax(similarities)
-            best_match_score = similarities[best_match_asset_index]
-
-        status = "🚨 Não atende / Bloqueador"
-        evidence = "—"
-        action_needed = "Buscar solução ou impugnar"
-
-        if best_match_score >= 0.8:  # Limiar de alta similaridade
-            matched_asset = assets_df.iloc[best_match_asset_index]
-            
-            # Lógica de Classificação (refinada)
-            # Exemplo: verificação de quantitativos e menções de IA/GCP
-            if "quantitativo mínimo" in req_text.lower():
-                # Tente extrair quantitativos do requisito e do ativo para comparação
-                # Isso exigiria uma lógica de NLP mais avançada para parsear "1.000.000 unidades de consumo" etc.
-                pass # Lógica complexa, deixada como placeholder
-            
-            # Normalizar termos para verificar menções de tecnologia/IA
-            normalized_req = normalize_term(req_text)
-            normalized_asset_products = normalize_term(matched_asset['ProdutosConcatenados'].fillna(''))
-            normalized_asset_summary = normalize_term(matched_asset['Resumo_Objeto_Consolidado'].fillna(''))
-            
-            # Verificar se a tecnologia/serviço principal do requisito está no ativo
-            tech_match = False
-            if "google cloud platform" in normalized_req and ("google cloud platform" in normalized_asset_products or "google cloud platform" in normalized_asset_summary):
-                tech_match = True
-            elif "google workspace" in normalized_req and ("google workspace" in normalized_asset_products or "google workspace" in normalized_asset_summary):
-                tech_match = True
-            elif "robô" in normalized_req and ("robô" in normalized_asset_products or "robô" in normalized_asset_summary):
-                tech_match = True
-            elif "inteligência artificial" in normalized_req and ("inteligência artificial" in normalized_asset_products or "inteligência artificial" in normalized_asset_summary):
-                tech_match = True
-            
-            
-            # Verificação de Certificações e IA (exemplo, precisa de mapeamento real)
-            # 'Certificacoes_Valores_Mencoes_IA' no seu Google Sheet
-            asset_certifications_ia = str(matched_asset.get('Certificacoes_Valores_Mencoes_IA', '')).lower()
-            
-            ia_mentioned_in_asset = "ia" in normalized_asset_products or "ia" in normalized_asset_summary or "inteligência artificial" in asset_certifications_ia
-            
-            if tech_match:
-                if (matched_asset['Tipo_Contrato'].lower() == 'contrato' and "atestado" not in req_text.lower()) or \
-                   (matched_asset['Tipo_Contrato'].lower() == 'atestado' and "atestado" in req_text.lower()):
-                    status = "✅ Atende diretamente"
-                    evidence = f"{matched_asset['Tipo_Contrato']} - {matched_asset['Nome_Orgao']} - {matched_asset['Ano_Contrato']}"
-                    action_needed = "Nenhuma"
-                elif matched_asset['Tipo_Contrato'].lower() in ['contrato', 'sow'] and "sow" in matched_asset['ProdutosConcatenados'].lower(): # Exemplo de "indireto"
-                    status = "⚠️ Atende indiretamente (combinando contrato e SOW)"
-                    evidence = f"{matched_asset['Tipo_Contrato']} + SOW - {matched_asset['Nome_Orgao']} - {matched_asset['Ano_Contrato']}"
-                    action_needed = "Detalhar no recurso"
-            
-            # Refinamento para IA, se o requisito for explicitamente sobre IA e o ativo mencionar IA
-            if "inteligência artificial" in normalized_req or "ia" in normalized_req:
-                if ia_mentioned_in_asset:
-                    status = "✅ Atende diretamente" # Pode ser mais granular se necessário
-                    evidence = f"{matched_asset['Tipo_Contrato']} - {matched_asset['Nome_Orgao']} - {matched_asset['Ano_Contrato']} (com IA)"
-                    action_needed = "Nenhuma"
-                else:
-                    # Se o requisito é de IA mas o ativo correspondente não menciona IA explicitamente
-                    if status != "✅ Atende diretamente": # Não sobrescreve se já atende diretamente por outro motivo
-                        status = "🚨 Não atende / Bloqueador (Requisito de IA não comprovado no ativo)"
-                        action_needed = "Buscar evidência específica de IA ou desenvolver"
-
-
-        analysis_results.append({
-            "Requisito": req_text,
-            "Tipo": "Objeto/Qualificação Técnica" if "RequisitosObjetoQualificacaoTecnicaEspecifica" in json.dumps(extracted_requirements) else "Habilitação Técnica",
-            "Status": status,
-            "Evidência": evidence,
-            "Ação Necessária": action_needed
-        })
+        row = build_match_row(matcher, req_text, requirement_type, top_indices[i], top_scores[i], threshold, top_k)
+        analysis_results.append(row)
+        if on_row is not None:
+            on_row(row)
 
     return pd.DataFrame(analysis_results)
 
@@ -259,6 +597,7 @@ if __name__ == "__main__":
     from config import GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME
     from google_sheets_integrator import get_google_sheet_data
     import os
+    import pandas as pd
 
     # Inicializar Vertex AI
     initialize_vertex_ai(GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION)
@@ -0,0 +1,355 @@
+# analysis_pipeline.py
+from __future__ import annotations
+
+from fastapi import HTTPException
+import asyncio
+import hashlib
+import inspect
+from typing import TYPE_CHECKING
+
+from pdf_processor import extract_text_from_pdf_async
+from docx_processor import extract_text_from_docx_async
+from google_sheets_integrator import get_google_sheet_data, get_sheet_revision
+from ai_analyzer import extract_requirements_with_gemini, cross_reference_assets, get_matching_version, EXTRACTION_PROMPT_VERSION
+from result_cache import ResultCache, make_result_cache_key
+from rematch import save_extraction, rematch_all
+from executors import run_in_executor
+from metrics import RESULT_CACHE_TOTAL, count, span
+from scheduler import CapacityExceeded
+from config import (
+    GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME, GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME,
+    RESULT_CACHE_DIR, RESULT_CACHE_MEMORY_ENTRIES, RESULT_CACHE_DISK_MAX_ENTRIES,
+)
+
+# pandas só é importado com a planilha (google_sheets_integrator), não no cold start
+if TYPE_CHECKING:
+    import pandas as pd
+
+PDF_CONTENT_TYPE = "application/pdf"
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+SUPPORTED_CONTENT_TYPES = [PDF_CONTENT_TYPE, DOCX_CONTENT_TYPE]
+
+# Etapas do pipeline, na ordem em que são executadas (usadas para reportar progresso)
+PIPELINE_STAGES = ["extracao_texto", "planilha_ativos", "extracao_requisitos", "cruzamento_ativos"]
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MEMORY_ENTRIES, RESULT_CACHE_DISK_MAX_ENTRIES)
+
+
+async def load_assets_dataframe() -> pd.DataFrame:
+    """Carrega a planilha de ativos no pool de threads de Sheets; em caso de erro, retorna DataFrame vazio."""
+    try:
+        # Usamos as variáveis de ambiente importadas de config.py
+        with span("planilha_ativos"):
+            ativos_df = await run_in_executor("sheets", get_google_sheet_data, GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME)
+        if ativos_df.empty:
+            print("Aviso: Planilha de ativos vazia ou não pôde ser carregada. Apenas extração de requisitos será feita.")
+        return ativos_df
+    except Exception as e:
+        print(f"Erro ao carregar planilha de ativos: {e}")
+        import pandas as pd
+        return pd.DataFrame() # Continue com um DataFrame vazio se houver erro
+
+
+def build_strategic_analysis(extracted_requirements: dict) -> dict:
+    """Análise estratégica (campo "analysis_strategic" da resposta), disponível logo após o Gemini."""
+    strategic_analysis = {
+        "Objeto": extracted_requirements.get("Objeto", "N/A"),
+        "Orgao": extracted_requirements.get("Orgao", "N/A"),
+        "TipoJulgamento": extracted_requirements.get("TipoJulgamento", "N/A"),
+        "ValorEstimado": extracted_requirements.get("ValorEstimado", "N/A"),
+        "Datas": extracted_requirements.get("Datas", {})
+    }
+
+    resumo_requisitos = {}
+    for k, v in extracted_requirements.get("RequisitosHabilitacao", {}).items():
+        if v:
+            resumo_requisitos[f"Habilitação {k}"] = v
+    for item in extracted_requirements.get("RequisitosObjetoQualificacaoTecnicaEspecifica", []):
+        desc = item.get("Descricao", "")
+        details = ", ".join(item.get("Detalhes", []))
+        quant = item.get("QuantitativoMinimo", "")
+        cert = item.get("CertificacaoExigida", "")
+        resumo_requisitos[f"Objeto/Técnico: {desc}"] = f"{details} (Quant.: {quant}, Cert.: {cert})"
+
+    return {
+        "NomeOrgao": strategic_analysis.get("Orgao"),
+        "Objeto": strategic_analysis.get("Objeto"),
+        "CriterioJulgamento": strategic_analysis.get("TipoJulgamento"),
+        "ValorEstimado": strategic_analysis.get("ValorEstimado"),
+        "Datas": strategic_analysis.get("Datas"),
+        "ResumoRequisitosExtraidos": resumo_requisitos
+    }
+
+
+def build_analysis_response(extracted_requirements: dict, analysis_map_df: pd.DataFrame) -> dict:
+    """Monta o corpo de resposta (análise estratégica + mapa de atendimento) a partir dos resultados do pipeline."""
+    return {
+        "analysis_strategic": build_strategic_analysis(extracted_requirements),
+        "mapa_atendimento": analysis_map_df.to_dict(orient="records")
+    }
+
+
+async def analyze_document(source: str | bytes | bytearray, content_type: str, on_stage=None, ativos_df: pd.DataFrame | None = None) -> dict:
+    """
+    Executa o pipeline completo (texto -> Gemini -> cruzamento com ativos) para um documento
+    (caminho do arquivo em disco ou conteúdo em memória, ver uploads.IngestedUpload.source).
+    `on_stage(etapa, estado)` é chamado com estado "running"/"done" a cada etapa de PIPELINE_STAGES.
+    Se `ativos_df` não for informado, a planilha de ativos é carregada em paralelo com a extração do texto.
+    Erros de entrada são levantados como HTTPException.
+    """
+    response, _ = await _run_pipeline(source, content_type, on_stage, ativos_df)
+    return response
+
+
+async def _run_pipeline(source: str | bytes | bytearray, content_type: str, on_stage, ativos_df: pd.DataFrame | None, on_event=None,
+                        document_sha256: str | None = None) -> tuple[dict, dict]:
+    """
+    Pipeline de analyze_document; retorna também os requisitos extraídos pelo Gemini. `on_event`: ver analyze_document_events.
+    Com `document_sha256`, a extração é guardada para o recruzamento (ver analyze_edital_text).
+    """
+    def report(stage: str, state: str):
+        if on_stage is not None:
+            on_stage(stage, state)
+
+    # A planilha de ativos é carregada em paralelo com a extração do texto
+    report("planilha_ativos", "running")
+    if ativos_df is None:
+        ativos_task = asyncio.create_task(load_assets_dataframe())
+    else:
+        ativos_task = asyncio.get_running_loop().create_future()
+        ativos_task.set_result(ativos_df)
+    try:
+        # 1. Texto do edital
+        report("extracao_texto", "running")
+        on_progress = None
+        if on_event is not None:
+            on_progress = lambda pages_done, page_count: on_event("extracao", {"paginas_extraidas": pages_done, "total_paginas": page_count})
+        edital_text = await extract_document_text(source, content_type, on_progress)
+        report("extracao_texto", "done")
+
+        # 2. e 3. Gemini e cruzamento com a planilha de ativos (carregada em paralelo desde o passo 1)
+        return await analyze_edital_text(edital_text, ativos_task, report, on_event, document_sha256)
+    finally:
+        if not ativos_task.done():
+            ativos_task.cancel()
+
+
+async def extract_document_text(source: str | bytes | bytearray, content_type: str, on_progress=None) -> str:
+    """
+    Etapa 1: texto do edital (PDF ou DOCX, no pool de processos). Levanta HTTPException se o formato não é suportado ou não há texto.
+    `on_progress(páginas extraídas, total de páginas)` acompanha a extração do PDF.
+    """
+    edital_text = ""
+    with span("extracao_texto"):
+        if content_type == PDF_CONTENT_TYPE:
+            edital_text = await extract_text_from_pdf_async(source, on_progress)
+        elif content_type == DOCX_CONTENT_TYPE:
+            edital_text = await extract_text_from_docx_async(source)
+
+    if not edital_text.strip():
+        raise HTTPException(status_code=400, detail="Não foi possível extrair texto do edital. O arquivo pode estar vazio ou ilegível.")
+    return edital_text
+
+
+async def analyze_edital_text(edital_text: str, ativos, report=None, on_event=None, document_sha256: str | None = None) -> tuple[dict, dict]:
+    """
+    Etapas 2 e 3: extração de requisitos pelo Gemini e cruzamento com os ativos.
+    `ativos` é o DataFrame de ativos ou um awaitable que o produz (carga em paralelo).
+    `on_event` recebe a análise estratégica assim que o Gemini responde e cada linha do mapa
+    assim que é classificada (chamado também a partir do pool de threads do Vertex AI).
+    Com `document_sha256`, a extração, os embeddings dos requisitos e o cruzamento são guardados
+    (rematch.save_extraction) para recruzar o edital quando a planilha mudar, sem reenviá-lo.
+    Retorna (resposta, requisitos extraídos).
+    """
+    report = report or (lambda stage, state: None)
+
+    # 2. Processamento Inteligente (Pipeline de IA), no pool de threads do Vertex AI
+    report("extracao_requisitos", "running")
+    with span("extracao_requisitos"):
+        extracted_requirements = await run_in_executor("vertex", extract_requirements_with_gemini, edital_text)
+    report("extracao_requisitos", "done")
+    on_row = None
+    if on_event is not None:
+        on_event("analise_estrategica", build_strategic_analysis(extracted_requirements))
+        on_row = lambda row: on_event("requisito", row)
+
+    # 3. Dados da planilha de ativos
+    ativos_df = await ativos if inspect.isawaitable(ativos) else ativos
+    report("planilha_ativos", "done")
+
+    import pandas as pd
+
+    report("cruzamento_ativos", "running")
+    analysis_map_df = pd.DataFrame(columns=['Requisito', 'Tipo', 'Status', 'Evidência', 'Ação Necessária'])
+    match_state = []
+    if not ativos_df.empty and extracted_requirements:
+        with span("cruzamento_ativos"):
+            analysis_map_df = await run_in_executor("vertex", cross_reference_assets, extracted_requirements, ativos_df, on_row=on_row,
+                                                    on_match=lambda *state: match_state.append(state))
+    report("cruzamento_ativos", "done")
+
+    if document_sha256 is not None and extracted_requirements and "Error" not in extracted_requirements:
+        await run_in_executor("vertex", save_extraction, document_sha256, extracted_requirements, ativos_df,
+                              match_state[0] if match_state else None, analysis_map_df.to_dict(orient="records"))
+
+    return build_analysis_response(extracted_requirements, analysis_map_df), extracted_requirements
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def document_sha256_of(source: str | bytes | bytearray) -> str:
+    return file_sha256(source) if isinstance(source, str) else hashlib.sha256(source).hexdigest()
+
+
+async def result_cache_key(document_sha256: str, ativos_df: pd.DataFrame) -> str | None:
+    """Chave do cache de resultados para o documento com a planilha atual; None se a planilha está indisponível."""
+    sheet_revision = get_sheet_revision(GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME)
+    if ativos_df.empty or sheet_revision is None:
+        return None
+    matching_version = await run_in_executor("sheets", get_matching_version)
+    return make_result_cache_key(document_sha256, sheet_revision, GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME, EXTRACTION_PROMPT_VERSION,
+                                 matching_version)
+
+
+def _record_result_cache(result: str):
+    RESULT_CACHE_TOTAL.inc(result=result)
+    count(f"result_cache_{result.replace('-', '_')}")
+
+
+async def analyze_document_cached(source: str | bytes | bytearray, content_type: str, document_sha256: str | None = None, on_stage=None) -> tuple[dict, str]:
+    """
+    Igual a analyze_document, mas consulta antes o cache de resultados, indexado por
+    (SHA-256 do documento, revisão da planilha, modelo Gemini, modelo de embedding, versão do prompt,
+    configuração do cruzamento: modo e tabela de sinônimos).
+    Retorna (resultado, estado do cache): "hit-memory", "hit-disk", "miss" ou "bypass"
+    (planilha indisponível ou resposta do Gemini inválida: o resultado não é cacheado).
+    """
+    if document_sha256 is None:
+        document_sha256 = await asyncio.to_thread(document_sha256_of, source)
+
+    ativos_df = await load_assets_dataframe()
+    key = await result_cache_key(document_sha256, ativos_df)
+    if key is None:
+        _record_result_cache("bypass")
+        result, _ = await _run_pipeline(source, content_type, on_stage, ativos_df, document_sha256=document_sha256)
+        return result, "bypass"
+
+    cached, layer = await asyncio.to_thread(result_cache.get, key)
+    _record_result_cache(f"hit-{layer}" if cached is not None else "miss")
+    if cached is not None:
+        if on_stage is not None:
+            for stage in PIPELINE_STAGES:
+                on_stage(stage, "done")
+        return cached, f"hit-{layer}"
+
+    result, extracted_requirements = await _run_pipeline(source, content_type, on_stage, ativos_df, document_sha256=document_sha256)
+    if "Error" in extracted_requirements:
+        # Falha ao interpretar a resposta do Gemini: não cachear, para que um novo envio tente de novo
+        return result, "bypass"
+    await asyncio.to_thread(result_cache.put, key, result)
+    return result, "miss"
+
+
+def _error_event(error: Exception) -> dict:
+    if isinstance(error, CapacityExceeded):
+        return {"status_code": error.status_code, "detail": error.detail, "retry_after": error.retry_after}
+    if isinstance(error, HTTPException):
+        return {"status_code": error.status_code, "detail": error.detail}
+    print(f"Erro inesperado na análise em streaming: {error}")
+    return {"status_code": 500, "detail": f"Erro interno do servidor: {error}"}
+
+
+async def analyze_document_events(source: str | bytes | bytearray, content_type: str, document_sha256: str | None = None):
+    """
+    Versão em streaming de analyze_document_cached. Gerador assíncrono de eventos (tipo, dados), na ordem:
+      "etapa"               {"etapa", "estado"} a cada etapa de PIPELINE_STAGES iniciada/concluída;
+      "extracao"            {"paginas_extraidas", "total_paginas"} a cada faixa de páginas do PDF extraída;
+      "analise_estrategica" o campo "analysis_strategic" da resposta, assim que o Gemini responde;
+      "requisito"           cada linha de "mapa_atendimento", assim que é classificada;
+      "fim"                 {"cache", "requisitos"}; ou "erro" {"status_code", "detail"} se o pipeline falhar
+                            (mais "retry_after", em segundos, quando falta cota do Vertex AI).
+    Em um acerto do cache de resultados, a análise e o mapa são emitidos de imediato. Se o consumidor
+    para de iterar (cliente desconectou), o pipeline é cancelado e as etapas seguintes não rodam.
+    """
+    if document_sha256 is None:
+        document_sha256 = await asyncio.to_thread(document_sha256_of, source)
+
+    ativos_df = await load_assets_dataframe()
+    key = await result_cache_key(document_sha256, ativos_df)
+    if key is not None:
+        cached, layer = await asyncio.to_thread(result_cache.get, key)
+        _record_result_cache(f"hit-{layer}" if cached is not None else "miss")
+        if cached is not None:
+            yield "analise_estrategica", cached["analysis_strategic"]
+            for row in cached["mapa_atendimento"]:
+                yield "requisito", row
+            yield "fim", {"cache": f"hit-{layer}", "requisitos": len(cached["mapa_atendimento"])}
+            return
+    else:
+        _record_result_cache("bypass")
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event: str, data):
+        # Chamado no event loop e nas threads do pool do Vertex AI (linhas do mapa)
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    async def run():
+        try:
+            result, extracted_requirements = await _run_pipeline(
+                source, content_type, lambda stage, state: emit("etapa", {"etapa": stage, "estado": state}), ativos_df, emit, document_sha256
+            )
+            cache_status = "bypass"
+            if key is not None and "Error" not in extracted_requirements:
+                await asyncio.to_thread(result_cache.put, key, result)
+                cache_status = "miss"
+            emit("fim", {"cache": cache_status, "requisitos": len(result["mapa_atendimento"])})
+        except Exception as e:
+            emit("erro", _error_event(e))
+        finally:
+            emit(None, None)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            event, data = await events.get()
+            if event is None:
+                break
+            yield event, data
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def rematch_stored_analyses() -> dict:
+    """
+    Recruza os editais já analisados com a planilha de ativos atual (rematch.rematch_all), sem OCR nem
+    Gemini, e grava os novos resultados no cache de resultados (o próximo envio do mesmo edital é um acerto).
+    Retorna {"revisao_planilha", "editais_recruzados", "editais": [resumo por edital, com as mudanças de status]}.
+    """
+    ativos_df = await load_assets_dataframe()
+    if ativos_df.empty:
+        raise HTTPException(status_code=503, detail="Planilha de ativos indisponível; não é possível recruzar os editais.")
+
+    with span("recruzamento"):
+        rematched = await run_in_executor("vertex", rematch_all, ativos_df)
+    editais = []
+    for summary, extracted_requirements, rows in rematched:
+        if extracted_requirements is not None:
+            key = await result_cache_key(summary["documento"], ativos_df)
+            if key is not None:
+                import pandas as pd
+                await asyncio.to_thread(result_cache.put, key, build_analysis_response(extracted_requirements, pd.DataFrame(rows)))
+        editais.append(summary)
+    return {
+        "revisao_planilha": get_sheet_revision(GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME),
+        "editais_recruzados": len(editais),
+        "editais": editais,
+    }
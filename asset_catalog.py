@@ -0,0 +1,111 @@
+# asset_catalog.py
+import hashlib
+import threading
+
+# Catálogo de ativos em formato compacto para o cruzamento: colunas em listas Python (uma entrada por
+# linha da planilha), com os campos em minúsculas e os textos de embedding pré-calculados. Depois de
+# convertido (uma vez por snapshot da planilha), o cruzamento não passa mais pelo pandas: subconjuntos
+# de linhas (take), textos e impressões digitais saem direto das listas.
+
+PRODUCTS_COLUMN = "ProdutosConcatenados"
+SUMMARY_COLUMN = "Resumo_Objeto_Consolidado"
+CERTIFICATIONS_COLUMN = "Certificacoes_Valores_Mencoes_IA"
+CONTRACT_TYPE_COLUMN = "Tipo_Contrato"
+AGENCY_COLUMN = "Nome_Orgao"
+YEAR_COLUMN = "Ano_Contrato"
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and value != value) # NaN
+
+
+def _as_text(value) -> str:
+    return "" if _is_missing(value) else str(value)
+
+
+class AssetCatalog:
+    """
+    Linhas da planilha de ativos em colunas. `columns` guarda os valores originais de todas as colunas
+    (usados na evidência e nas impressões digitais); os campos de texto do cruzamento já vêm convertidos
+    (vazio no lugar de ausente) e em minúsculas onde a classificação compara.
+    """
+
+    __slots__ = (
+        "columns", "size", "products", "summaries", "certifications", "contract_type", "agency", "year",
+        "products_lower", "contract_type_lower", "texts", "_fingerprints",
+    )
+
+    def __init__(self, columns: dict[str, list]):
+        self.columns = columns
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self.products = self.text_column(PRODUCTS_COLUMN)
+        self.summaries = self.text_column(SUMMARY_COLUMN)
+        self.certifications = self.text_column(CERTIFICATIONS_COLUMN)
+        self.contract_type = self.text_column(CONTRACT_TYPE_COLUMN)
+        # Valores originais (não convertidos) para a evidência, como exibidos até aqui
+        self.agency = columns.get(AGENCY_COLUMN, [""] * self.size)
+        self.year = columns.get(YEAR_COLUMN, [""] * self.size)
+        self.products_lower = [text.lower() for text in self.products]
+        self.contract_type_lower = [text.lower() for text in self.contract_type]
+        # Texto de cada ativo usado no embedding (produtos + resumo do objeto)
+        self.texts = [f"{product} {summary}" for product, summary in zip(self.products, self.summaries)]
+        self._fingerprints = None
+
+    @classmethod
+    def from_dataframe(cls, assets_df) -> "AssetCatalog":
+        return cls({name: assets_df[name].tolist() for name in assets_df.columns})
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def text_column(self, name: str) -> list[str]:
+        values = self.columns.get(name)
+        if values is None:
+            return [""] * self.size
+        return [_as_text(value) for value in values]
+
+    def take(self, rows) -> "AssetCatalog":
+        """Subconjunto das linhas informadas, na ordem dada."""
+        rows = [int(row) for row in rows]
+        return AssetCatalog({name: [values[row] for row in rows] for name, values in self.columns.items()})
+
+    def fingerprints(self) -> list[str]:
+        """
+        Impressão digital de cada linha (todas as colunas, como texto): muda quando qualquer campo usado
+        no cruzamento ou na evidência muda, e não depende da posição da linha.
+        """
+        if self._fingerprints is None:
+            # Como texto: o snapshot em disco (Parquet) grava colunas mistas como string
+            names = sorted(self.columns, key=str)
+            columns = [[_as_text(value) for value in self.columns[name]] for name in names]
+            self._fingerprints = [
+                hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).hexdigest()
+                for values in zip(*columns)
+            ]
+        return self._fingerprints
+
+
+_catalog_lock = threading.Lock()
+_catalog_cache = {"df": None, "catalog": None}
+
+
+def get_asset_catalog(assets) -> AssetCatalog:
+    """
+    Catálogo compacto dos ativos. Aceita um AssetCatalog (retornado como está) ou o DataFrame da
+    planilha, convertido uma única vez por snapshot (o DataFrame é compartilhado entre requisições
+    enquanto não houver nova revisão).
+    """
+    if isinstance(assets, AssetCatalog):
+        return assets
+    with _catalog_lock:
+        if _catalog_cache["df"] is assets:
+            return _catalog_cache["catalog"]
+    catalog = AssetCatalog.from_dataframe(assets)
+    with _catalog_lock:
+        _catalog_cache["df"] = assets
+        _catalog_cache["catalog"] = catalog
+    return catalog
@@ -0,0 +1,165 @@
+# asset_matcher.py
+import threading
+
+import numpy as np
+
+from asset_catalog import AssetCatalog, get_asset_catalog
+from lexical_index import LexicalIndex
+from term_matcher import TermMatcher, get_term_matcher
+from vector_index import ExactIndex, l2_normalize
+
+# Limiar de alta similaridade (cosseno) para considerar que o ativo corresponde ao requisito
+SIMILARITY_THRESHOLD = 0.8
+
+# Tecnologias/serviços verificados no requisito e no ativo para confirmar a correspondência
+TECH_TERMS = ["google cloud platform", "google workspace", "robô", "inteligência artificial"]
+
+class AssetMatcher:
+    """
+    Motor de correspondência requisito -> ativo.
+
+    Construído uma vez por catálogo (asset_catalog, com as colunas já em minúsculas) e consulta um índice vetorial (vector_index) com os embeddings dos ativos.
+    Sem índice informado, usa um ExactIndex em memória (um único produto de matrizes por requisição).
+    `row_ids[i]` é o id, no índice, do vetor da linha i; ids sem linha (ativos removidos da
+    planilha, mas ainda no índice) são descartados nos resultados.
+    Os termos canônicos (term_matcher) de cada ativo são extraídos uma única vez, na construção.
+    Sem embeddings (modo lexical), só o índice BM25 (`lexical`) fica disponível; o índice vetorial
+    pode ser anexado depois com set_index.
+    """
+
+    def __init__(self, assets: AssetCatalog, asset_embeddings: np.ndarray | None = None, index: ExactIndex | None = None,
+                 row_ids: list[int] | None = None, term_matcher: TermMatcher | None = None):
+        catalog = get_asset_catalog(assets)
+        self.size = len(catalog)
+        self.term_matcher = term_matcher or get_term_matcher()
+        self.index = None
+        self.id_to_row = np.zeros(0, dtype=np.int64)
+        self.live_ids = 0
+        self._lexical_index = None
+        self._lexical_lock = threading.Lock()
+        if index is None and asset_embeddings is not None:
+            index = ExactIndex(np.asarray(asset_embeddings).shape[1] if len(asset_embeddings) else 0)
+            row_ids = index.add(asset_embeddings, [str(row) for row in range(self.size)]) if self.size else []
+        if index is not None:
+            self.set_index(index, row_ids)
+
+        products, summaries, certifications = catalog.products, catalog.summaries, catalog.certifications
+        self._lexical_documents = [" ".join(texts) for texts in zip(products, summaries, certifications)]
+
+        self.products_lower = catalog.products_lower
+        self.contract_type = catalog.contract_type
+        self.contract_type_lower = catalog.contract_type_lower
+        self.agency = catalog.agency
+        self.year = catalog.year
+
+        # Todos os termos canônicos de produtos + resumo (uma linha pode citar várias tecnologias)
+        self.asset_terms = [
+            self.term_matcher.find_terms(product) | self.term_matcher.find_terms(summary)
+            for product, summary in zip(products, summaries)
+        ]
+        self.tech_terms = [terms & set(TECH_TERMS) for terms in self.asset_terms]
+        self.ia_mentioned = [
+            "inteligência artificial" in terms or "inteligência artificial" in self.term_matcher.find_terms(certification)
+            for terms, certification in zip(self.asset_terms, certifications)
+        ]
+
+    def set_index(self, index: ExactIndex, row_ids: list[int]):
+        """Anexa o índice vetorial dos ativos (`row_ids[i]` = id do vetor da linha i no índice)."""
+        id_to_row = np.full(index.ntotal, -1, dtype=np.int64)
+        for row, index_id in reversed(list(enumerate(row_ids))):
+            id_to_row[index_id] = row # Linhas com texto idêntico compartilham o vetor; vale a primeira
+        self.id_to_row = id_to_row
+        self.live_ids = int((id_to_row >= 0).sum())
+        self.index = index
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """Índice BM25 sobre produtos + resumo + certificações, construído no primeiro uso."""
+        with self._lexical_lock:
+            if self._lexical_index is None:
+                self._lexical_index = LexicalIndex(self._lexical_documents, self.term_matcher)
+            return self._lexical_index
+
+    def top_k(self, requirement_embeddings: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Busca os k ativos mais similares (cosseno) para todos os requisitos de uma vez.
+        Retorna (linhas, scores), com forma (n_requisitos, k) e ordenados do melhor para o pior;
+        posições sem candidato têm linha -1.
+        """
+        queries = l2_normalize(requirement_embeddings)
+        k = max(1, min(k, self.live_ids))
+        if self.index is None:
+            raise ValueError("AssetMatcher sem índice vetorial: use set_index ou o modo lexical.")
+        if queries.shape[0] == 0 or self.live_ids == 0:
+            return np.zeros((queries.shape[0], 0), dtype=np.int64), np.zeros((queries.shape[0], 0), dtype=np.float32)
+
+        # Busca k + ids obsoletos para garantir k linhas vivas após o filtro
+        ids, scores = self.index.search(queries, min(self.index.ntotal, k + self.index.ntotal - self.live_ids))
+        # Ids adicionados ao índice depois da criação deste matcher (catálogo mais novo) também são descartados
+        known = (ids >= 0) & (ids < len(self.id_to_row))
+        rows = np.where(known, self.id_to_row[np.where(known, ids, 0)], -1)
+
+        top_rows = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        top_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        for q in range(queries.shape[0]):
+            live = rows[q] >= 0
+            found = rows[q][live][:k]
+            top_rows[q, :len(found)] = found
+            top_scores[q, :len(found)] = scores[q][live][:k]
+        return top_rows, top_scores
+
+    def evidence(self, asset_index: int) -> str:
+        return f"{self.contract_type[asset_index]} - {self.agency[asset_index]} - {self.year[asset_index]}"
+
+    def classify(self, req_text: str, asset_index: int, score: float, threshold: float = SIMILARITY_THRESHOLD) -> tuple[str, str, str]:
+        """
+        Classifica o atendimento do requisito pelo melhor ativo. Retorna (status, evidência, ação necessária).
+        `score` é o cosseno dos embeddings, o score combinado (híbrido) ou o BM25 normalizado (lexical).
+        """
+        status = "🚨 Não atende / Bloqueador"
+        evidence = "—"
+        action_needed = "Buscar solução ou impugnar"
+
+        if score < threshold:
+            return status, evidence, action_needed
+
+        req_lower = req_text.lower()
+        # Lógica de Classificação (refinada): menções de IA/GCP e tipo de contrato
+        # Termos canônicos do requisito, para verificar menções de tecnologia/IA
+        req_terms = self.term_matcher.find_terms(req_text)
+
+        # Verificar se alguma tecnologia/serviço do requisito está no ativo
+        tech_match = bool(req_terms & self.tech_terms[asset_index])
+
+        contract_type = self.contract_type_lower[asset_index]
+        if tech_match:
+            if (contract_type == 'contrato' and "atestado" not in req_lower) or \
+               (contract_type == 'atestado' and "atestado" in req_lower):
+                status = "✅ Atende diretamente"
+                evidence = self.evidence(asset_index)
+                action_needed = "Nenhuma"
+            elif contract_type in ['contrato', 'sow'] and "sow" in self.products_lower[asset_index]: # Exemplo de "indireto"
+                status = "⚠️ Atende indiretamente (combinando contrato e SOW)"
+                evidence = f"{self.contract_type[asset_index]} + SOW - {self.agency[asset_index]} - {self.year[asset_index]}"
+                action_needed = "Detalhar no recurso"
+
+        # Refinamento para IA, se o requisito for explicitamente sobre IA e o ativo mencionar IA
+        if "inteligência artificial" in req_terms:
+            if self.ia_mentioned[asset_index]:
+                status = "✅ Atende diretamente" # Pode ser mais granular se necessário
+                evidence = f"{self.evidence(asset_index)} (com IA)"
+                action_needed = "Nenhuma"
+            else:
+                # Se o requisito é de IA mas o ativo correspondente não menciona IA explicitamente
+                if status != "✅ Atende diretamente": # Não sobrescreve se já atende diretamente por outro motivo
+                    status = "🚨 Não atende / Bloqueador (Requisito de IA não comprovado no ativo)"
+                    action_needed = "Buscar evidência específica de IA ou desenvolver"
+
+        return status, evidence, action_needed
+
+    def describe_candidates(self, indices: np.ndarray, scores: np.ndarray) -> list[dict]:
+        """Lista dos k melhores ativos para um requisito (evidência + similaridade)."""
+        return [
+            {"Evidência": self.evidence(int(index)), "Similaridade": round(float(score), 4)}
+            for index, score in zip(indices, scores) if index >= 0
+        ]
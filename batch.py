@@ -0,0 +1,185 @@
+# batch.py
+import argparse
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+
+from analysis_pipeline import (
+    analyze_edital_text, extract_document_text, file_sha256, load_assets_dataframe, result_cache, result_cache_key,
+    PDF_CONTENT_TYPE, DOCX_CONTENT_TYPE,
+)
+from ai_analyzer import prepare_asset_matcher
+from executors import run_in_executor
+from scheduler import set_max_wait
+from config import BATCH_PREFETCH_DOCUMENTS, BATCH_CONCURRENCY
+
+CONTENT_TYPES_BY_EXTENSION = {".pdf": PDF_CONTENT_TYPE, ".docx": DOCX_CONTENT_TYPE}
+
+
+@dataclass
+class BatchDocument:
+    name: str
+    path: str
+    content_type: str
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return f"Erro interno: {error}"
+
+
+async def analyze_batch(documents: list[BatchDocument]):
+    """
+    Analisa vários editais com uma única carga da planilha e do motor de correspondência (embeddings
+    dos ativos calculados uma vez). A extração de texto (PDF/OCR) roda à frente do Gemini: enquanto
+    o documento N está no Gemini, os próximos BATCH_PREFETCH_DOCUMENTS já estão sendo extraídos.
+
+    Gerador assíncrono: produz um registro por documento, na ordem de conclusão, com
+    "status" "ok" (e "resultado") ou "erro" (e "erro"); a falha de um documento não interrompe os demais.
+    """
+    # Lote é processamento de vazão: espera a cota do Vertex AI em vez de falhar rápido
+    set_max_wait(None)
+    ativos_df = await load_assets_dataframe()
+    if not ativos_df.empty:
+        try:
+            await run_in_executor("vertex", prepare_asset_matcher, ativos_df)
+        except Exception as e:
+            # Cada documento tentará de novo no cruzamento; o erro aparece no registro dele
+            print(f"Aviso: não foi possível pré-carregar o catálogo de ativos: {e}")
+
+    texts = asyncio.Queue(maxsize=max(1, BATCH_PREFETCH_DOCUMENTS))
+    records = asyncio.Queue()
+    workers = max(1, BATCH_CONCURRENCY)
+    finished = object()
+
+    def record(index: int, document: BatchDocument, **fields) -> dict:
+        return {"indice": index, "arquivo": document.name, **fields}
+
+    async def extract_texts():
+        for index, document in enumerate(documents):
+            try:
+                if document.content_type not in CONTENT_TYPES_BY_EXTENSION.values():
+                    raise HTTPException(status_code=400, detail="Formato de arquivo não suportado. Apenas PDF e DOCX são aceitos.")
+                document_sha256 = await asyncio.to_thread(file_sha256, document.path)
+                key = await result_cache_key(document_sha256, ativos_df)
+                if key is not None:
+                    cached, layer = await asyncio.to_thread(result_cache.get, key)
+                    if cached is not None:
+                        await records.put(record(index, document, status="ok", cache=f"hit-{layer}", resultado=cached))
+                        continue
+                edital_text = await extract_document_text(document.path, document.content_type)
+                await texts.put((index, document, key, document_sha256, edital_text))
+            except Exception as e:
+                await records.put(record(index, document, status="erro", erro=_error_message(e)))
+        for _ in range(workers):
+            await texts.put(None)
+
+    async def analyze_texts():
+        try:
+            while (item := await texts.get()) is not None:
+                index, document, key, document_sha256, edital_text = item
+                try:
+                    result, extracted_requirements = await analyze_edital_text(edital_text, ativos_df, document_sha256=document_sha256)
+                    cache_status = "bypass"
+                    if key is not None and "Error" not in extracted_requirements:
+                        await asyncio.to_thread(result_cache.put, key, result)
+                        cache_status = "miss"
+                    await records.put(record(index, document, status="ok", cache=cache_status, resultado=result))
+                except Exception as e:
+                    await records.put(record(index, document, status="erro", erro=_error_message(e)))
+        finally:
+            await records.put(finished)
+
+    tasks = [asyncio.create_task(extract_texts())] + [asyncio.create_task(analyze_texts()) for _ in range(workers)]
+    try:
+        remaining_workers = workers
+        while remaining_workers:
+            item = await records.get()
+            if item is finished:
+                remaining_workers -= 1
+                continue
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def list_documents(directory: str) -> list[BatchDocument]:
+    """Editais (PDF/DOCX) de um diretório, em ordem alfabética."""
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        content_type = CONTENT_TYPES_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+        path = os.path.join(directory, name)
+        if content_type and os.path.isfile(path):
+            documents.append(BatchDocument(name, path, content_type))
+    return documents
+
+
+def _already_done(output_path: str) -> set[str]:
+    """Arquivos com resultado "ok" em um JSONL anterior (para --resume)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Linha incompleta de uma execução interrompida
+            if entry.get("status") == "ok":
+                done.add(entry.get("arquivo"))
+    return done
+
+
+async def run_batch_cli(directory: str, output_path: str, resume: bool = False) -> tuple[int, int]:
+    """Analisa os editais do diretório gravando cada resultado no JSONL assim que fica pronto. Retorna (ok, erros)."""
+    documents = list_documents(directory)
+    if resume:
+        done = _already_done(output_path)
+        documents = [document for document in documents if document.name not in done]
+    print(f"{len(documents)} editais para analisar em {directory}.")
+
+    ok = errors = 0
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        async for entry in analyze_batch(documents):
+            output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            output.flush()
+            if entry["status"] == "ok":
+                ok += 1
+            else:
+                errors += 1
+            print(f"[{ok + errors}/{len(documents)}] {entry['arquivo']}: {entry['status']}" +
+                  (f" ({entry['erro']})" if entry["status"] == "erro" else ""))
+    return ok, errors
+
+
+# Linha de comando: python batch.py <diretório com editais> --output resultados.jsonl
+if __name__ == "__main__":
+    from ai_analyzer import initialize_vertex_ai
+    from model_registry import preload_models
+    from executors import shutdown_executors
+    from pdf_processor import shutdown_pdf_executor
+    from config import GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION
+
+    parser = argparse.ArgumentParser(description="Análise em lote de editais (PDF/DOCX) de um diretório.")
+    parser.add_argument("directory", help="Diretório com os editais.")
+    parser.add_argument("--output", default="resultados.jsonl", help="Arquivo JSONL de saída (um documento por linha).")
+    parser.add_argument("--resume", action="store_true", help='Pula os editais que já têm resultado "ok" no arquivo de saída.')
+    args = parser.parse_args()
+
+    initialize_vertex_ai(GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION)
+    try:
+        preload_models()
+    except Exception as e:
+        print(f"Aviso: não foi possível preparar os modelos do Vertex AI: {e}")
+    try:
+        ok, errors = asyncio.run(run_batch_cli(args.directory, args.output, args.resume))
+        print(f"Concluído: {ok} com sucesso, {errors} com erro. Resultados em {args.output}")
+    finally:
+        shutdown_executors()
+        shutdown_pdf_executor()
@@ -0,0 +1,531 @@
+# benchmark.py
+"""
+Benchmark offline do pipeline de /analyze_edital/, sem serviços do Google.
+
+Gemini, embeddings e Google Sheets são substituídos por implementações locais com latência
+configurável e saída determinística; os editais (PDF com camada de texto ou escaneados) e os
+catálogos de ativos são sintéticos. Para cada cenário (páginas x catálogo x concorrência) reporta
+latência p50/p95 por etapa e ponta a ponta, vazão e pico de memória.
+
+Com --startup, mede o cold start em processos novos, com e sem FAST_STARTUP: tempo de import de
+main, do evento de startup e da primeira análise, RSS do worker após cada fase e quais módulos
+pesados (pandas, SDK do Vertex AI, PyMuPDF...) já foram carregados.
+
+Uso:
+    python benchmark.py --pages 5,50 --catalog-rows 10,10000 --concurrency 1,8 --requests 16
+    python benchmark.py --scanned --pages 5 --output resultados.json
+    python benchmark.py --startup --startup-runs 5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Tecnologias usadas nos editais e catálogos sintéticos (cobrem a tabela de sinônimos padrão)
+TECHNOLOGIES = [
+    "Google Cloud Platform (GCP)", "Google Workspace", "GWS", "inteligência artificial", "IA generativa",
+    "chatbots", "URA", "robô de atendimento", "armazenamento em nuvem", "BigQuery", "Kubernetes", "ISO 27001",
+]
+AGENCIES = ["Ministério da Economia", "Prefeitura de São Paulo", "TRF-3", "Banco do Brasil", "DETRAN-SP", "Receita Federal"]
+FILLER = (
+    "O presente termo de referência estabelece as condições de execução dos serviços, os níveis mínimos de "
+    "serviço, as obrigações da contratada e da contratante e os critérios de medição e pagamento. "
+)
+
+# Módulos cujo import domina o cold start (verificados em sys.modules no --startup)
+HEAVY_MODULES = ["vertexai", "google.cloud.aiplatform", "google.api_core", "pandas", "pyarrow", "gspread", "fitz", "sklearn"]
+
+_REQUIREMENT_RE = re.compile(r"A licitante deverá comprovar ([^\n]+?)\.")
+
+
+# ---------------------------------------------------------------------------
+# Backends locais
+# ---------------------------------------------------------------------------
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Gemini local: devolve o JSON do esquema de extração montado a partir das frases de requisito do texto."""
+
+    def __init__(self, latency: float, latency_per_1k_chars: float = 0.0):
+        self.latency = latency
+        self.latency_per_1k_chars = latency_per_1k_chars
+
+    def generate_content(self, prompt, generation_config=None):
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        time.sleep(self.latency + self.latency_per_1k_chars * len(prompt) / 1000)
+        requirements = list(dict.fromkeys(_REQUIREMENT_RE.findall(prompt)))[:40]
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        return FakeResponse(json.dumps({
+            "Objeto": "Contratação de serviços de nuvem e inteligência artificial",
+            "Orgao": AGENCIES[digest % len(AGENCIES)],
+            "TipoJulgamento": "Menor preço",
+            "ValorEstimado": f"R$ {digest % 10_000_000:,}".replace(",", "."),
+            "Datas": {"Abertura": "01/01/2025"},
+            "RequisitosHabilitacao": {
+                "Juridica": [], "Fiscal": [], "EconomicoFinanceira": [],
+                "TecnicaGeral": [f"Atestado de capacidade técnica em {req}" for req in requirements[:5]],
+            },
+            "RequisitosObjetoQualificacaoTecnicaEspecifica": [
+                {"Descricao": req, "Detalhes": [], "QuantitativoMinimo": "", "CertificacaoExigida": ""} for req in requirements
+            ],
+        }, ensure_ascii=False))
+
+
+class FakeEmbedding:
+    def __init__(self, values: list[float]):
+        self.values = values
+
+
+class FakeEmbeddingModel:
+    """
+    Modelo de embedding local: feature hashing das palavras (determinístico e com similaridade
+    de cosseno significativa entre textos com vocabulário em comum).
+    """
+
+    def __init__(self, dim: int, latency: float):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get_embeddings(self, texts: list[str]) -> list[FakeEmbedding]:
+        time.sleep(self.latency)
+        return [FakeEmbedding(self._vector(text).tolist()) for text in texts]
+
+
+class FakeWorksheet:
+    def __init__(self, records: list[dict], latency: float):
+        self.records = records
+        self.latency = latency
+
+    def get_all_records(self) -> list[dict]:
+        time.sleep(self.latency)
+        return self.records
+
+
+class FakeSpreadsheet:
+    """Planilha local: uma aba com o catálogo sintético e revisão fixa."""
+
+    def __init__(self, records: list[dict], revision: str, latency: float):
+        self.worksheet_ = FakeWorksheet(records, latency)
+        self.revision = revision
+
+    def worksheet(self, tab_name: str) -> FakeWorksheet:
+        return self.worksheet_
+
+    def get_lastUpdateTime(self) -> str:
+        return self.revision
+
+
+# ---------------------------------------------------------------------------
+# Dados sintéticos
+# ---------------------------------------------------------------------------
+
+def generate_catalog(rows: int, seed: int = 0) -> list[dict]:
+    """Catálogo de ativos sintético com as colunas usadas no cruzamento."""
+    rng = random.Random(seed)
+    catalog = []
+    for row in range(rows):
+        technologies = rng.sample(TECHNOLOGIES, k=rng.randint(1, 3))
+        catalog.append({
+            "Tipo_Contrato": rng.choice(["Contrato", "Atestado", "SOW"]),
+            "Nome_Orgao": rng.choice(AGENCIES),
+            "Ano_Contrato": rng.randint(2015, 2025),
+            "ProdutosConcatenados": ", ".join(technologies),
+            "Resumo_Objeto_Consolidado": f"Projeto {row}: fornecimento e suporte de {' e '.join(technologies)} "
+                                         f"para {rng.randint(100, 100_000)} usuários",
+            "Certificacoes_Valores_Mencoes_IA": rng.choice(["", "", "ISO 27001", "inteligência artificial aplicada"]),
+        })
+    return catalog
+
+
+def _page_text(page_number: int, rng: random.Random) -> str:
+    lines = [f"Página {page_number + 1} - Edital de Pregão Eletrônico", ""]
+    for item in range(rng.randint(1, 3)):
+        technology = rng.choice(TECHNOLOGIES)
+        quantity = rng.randint(1, 500) * 1000
+        lines.append(f"{page_number + 1}.{item + 1}. A licitante deverá comprovar experiência em {technology} "
+                     f"com quantitativo mínimo de {quantity} unidades.")
+    lines.append(FILLER * rng.randint(2, 5))
+    return "\n".join(lines)
+
+
+def generate_pdf(path: str, pages: int, scanned: bool = False, seed: int = 0) -> str:
+    """Edital sintético; com scanned=True as páginas são imagens sem camada de texto (exige OCR)."""
+    import fitz
+
+    rng = random.Random(seed)
+    document = fitz.open()
+    for page_number in range(pages):
+        text = _page_text(page_number, rng)
+        if not scanned:
+            document.new_page().insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+            continue
+        # Renderiza a página de texto em imagem e a insere em uma página nova, sem texto
+        source = fitz.open()
+        source.new_page().insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+        pixmap = source.load_page(0).get_pixmap(dpi=150)
+        page = document.new_page()
+        page.insert_image(page.rect, stream=pixmap.tobytes("png"))
+        source.close()
+    document.save(path)
+    document.close()
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Execução
+# ---------------------------------------------------------------------------
+
+def _percentile(values: list[float], percentile: float) -> float:
+    return float(np.percentile(values, percentile)) if values else 0.0
+
+
+class MemorySampler:
+    """Amostra o RSS do processo (e dos workers de PDF) em background para obter o pico do cenário."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss_bytes(pid: int | str = "self") -> int:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+    def _total_rss(self) -> int:
+        total = self._rss_bytes()
+        try:
+            import pdf_processor
+            executor = pdf_processor._pdf_executor
+            if executor is not None:
+                total += sum(self._rss_bytes(pid) for pid in list(executor._processes))
+        except Exception:
+            pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._total_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if not os.path.exists("/proc/self/statm"):
+            import resource
+            self.peak_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            return self
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def _configure_environment(work_dir: str, args):
+    """Direciona caches e snapshots para um diretório temporário e desativa chamadas externas."""
+    os.environ.update({
+        "EMBEDDING_CACHE_DIR": os.path.join(work_dir, "embeddings"),
+        "REQUIREMENT_EMBEDDING_CACHE_DIR": os.path.join(work_dir, "requirement_embeddings"),
+        "RESULT_CACHE_DIR": os.path.join(work_dir, "results"),
+        "SHEETS_SNAPSHOT_DIR": os.path.join(work_dir, "sheets"),
+        "VECTOR_INDEX_DIR": os.path.join(work_dir, "vector_index"),
+        "OCR_CACHE_DIR": os.path.join(work_dir, "ocr") if args.ocr_cache else "",
+        "JOBS_DB_PATH": os.path.join(work_dir, "jobs", "jobs.sqlite3"),
+        "JOBS_FILES_DIR": os.path.join(work_dir, "jobs", "files"),
+        "GOOGLE_SHEET_URL": "https://benchmark.local/planilha",
+        "EMBEDDING_RETRY_BASE_SECONDS": "0.01",
+    })
+    if args.match_mode:
+        os.environ["MATCH_MODE"] = args.match_mode
+
+
+def _install_fakes(args, stage_timings: dict):
+    """Registra os backends locais e instrumenta as etapas do pipeline para medir a latência de cada uma."""
+    import analysis_pipeline
+    import model_registry
+    from config import GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME
+
+    model_registry.set_model("generative", GEMINI_MODEL_NAME, FakeGenerativeModel(args.gemini_latency, args.gemini_latency_per_1k_chars))
+    model_registry.set_model("embedding", EMBEDDING_MODEL_NAME, FakeEmbeddingModel(args.embedding_dim, args.embedding_latency))
+
+    def timed(stage: str, func):
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(*a, **kw):
+                started = time.perf_counter()
+                try:
+                    return await func(*a, **kw)
+                finally:
+                    stage_timings.setdefault(stage, []).append(time.perf_counter() - started)
+        else:
+            def wrapper(*a, **kw):
+                started = time.perf_counter()
+                try:
+                    return func(*a, **kw)
+                finally:
+                    stage_timings.setdefault(stage, []).append(time.perf_counter() - started)
+        return wrapper
+
+    analysis_pipeline.extract_text_from_pdf_async = timed("extracao_texto", analysis_pipeline.extract_text_from_pdf_async)
+    analysis_pipeline.load_assets_dataframe = timed("planilha_ativos", analysis_pipeline.load_assets_dataframe)
+    analysis_pipeline.extract_requirements_with_gemini = timed("extracao_requisitos", analysis_pipeline.extract_requirements_with_gemini)
+    analysis_pipeline.cross_reference_assets = timed("cruzamento_ativos", analysis_pipeline.cross_reference_assets)
+
+
+def _use_catalog(rows: int, args):
+    """Troca a planilha local pelo catálogo sintético do cenário (nova revisão, snapshot em memória descartado)."""
+    import google_sheets_integrator
+
+    spreadsheet = FakeSpreadsheet(generate_catalog(rows, seed=rows), f"benchmark-{rows}", args.sheets_latency)
+    google_sheets_integrator._get_spreadsheet = lambda sheet_url: spreadsheet
+    google_sheets_integrator._snapshots.clear()
+
+
+async def _run_scenario(app, pdf_bytes: bytes, requests: int, concurrency: int, unique_documents: bool) -> list[float]:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client, index: int):
+        # Um sufixo de comentário PDF torna o SHA-256 único (sem isso, o cache de resultados responde)
+        content = pdf_bytes + f"\n%benchmark-{index}-{time.time_ns()}\n".encode() if unique_documents else pdf_bytes
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/analyze_edital/", files={"edital_file": (f"edital_{index}.pdf", content, "application/pdf")}
+            )
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"Requisição {index} falhou ({response.status_code}): {response.text[:300]}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        await asyncio.gather(*[one(client, index) for index in range(requests)])
+    return latencies
+
+
+def run_benchmark(args) -> list[dict]:
+    work_dir = tempfile.mkdtemp(prefix="xanalysis_benchmark_")
+    _configure_environment(work_dir, args)
+
+    import main
+    from pdf_processor import shutdown_pdf_executor
+    from config import OCR_TESSERACT_PATH
+
+    stage_timings = {}
+    _install_fakes(args, stage_timings)
+
+    if args.scanned and not shutil.which(OCR_TESSERACT_PATH or "tesseract"):
+        print("Aviso: Tesseract não encontrado; cenários escaneados serão ignorados.")
+        args.scanned = False
+
+    results = []
+    try:
+        for pages in args.pages:
+            for scanned in ([False, True] if args.scanned else [False]):
+                pdf_path = generate_pdf(os.path.join(work_dir, f"edital_{pages}_{int(scanned)}.pdf"), pages, scanned, seed=pages)
+                with open(pdf_path, "rb") as f:
+                    pdf_bytes = f.read()
+
+                for rows in args.catalog_rows:
+                    _use_catalog(rows, args)
+                    # Aquecimento: carrega a planilha e os embeddings do catálogo (cache frio não entra na medição)
+                    asyncio.run(_run_scenario(main.app, pdf_bytes, 1, 1, unique_documents=True))
+
+                    for concurrency in args.concurrency:
+                        stage_timings.clear()
+                        with MemorySampler() as memory:
+                            started = time.perf_counter()
+                            latencies = asyncio.run(_run_scenario(main.app, pdf_bytes, args.requests, concurrency, not args.result_cache))
+                            elapsed = time.perf_counter() - started
+
+                        result = {
+                            "pages": pages,
+                            "scanned": scanned,
+                            "catalog_rows": rows,
+                            "concurrency": concurrency,
+                            "requests": args.requests,
+                            "throughput_rps": round(args.requests / elapsed, 3),
+                            "latency_p50_s": round(_percentile(latencies, 50), 4),
+                            "latency_p95_s": round(_percentile(latencies, 95), 4),
+                            "stages": {
+                                stage: {"p50_s": round(_percentile(values, 50), 4), "p95_s": round(_percentile(values, 95), 4)}
+                                for stage, values in stage_timings.items()
+                            },
+                            "peak_rss_mb": round(memory.peak_bytes / (1024 * 1024), 1),
+                        }
+                        results.append(result)
+                        _print_result(result)
+    finally:
+        shutdown_pdf_executor()
+        if not args.keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _startup_child(pdf_path: str, args) -> dict:
+    """Executado em um processo novo: mede import, startup e primeira análise de um worker."""
+    work_dir = tempfile.mkdtemp(prefix="xanalysis_startup_")
+    _configure_environment(work_dir, args)
+
+    def rss_mb() -> float:
+        return round(MemorySampler._rss_bytes() / (1024 * 1024), 1)
+
+    def loaded() -> list[str]:
+        return [name for name in HEAVY_MODULES if name in sys.modules]
+
+    result = {"fast_startup": os.getenv("FAST_STARTUP", "false").lower() == "true"}
+    started = time.perf_counter()
+    import main
+    result["import_s"] = round(time.perf_counter() - started, 4)
+    result["import_rss_mb"] = rss_mb()
+    result["import_modules"] = loaded()
+
+    _install_fakes(args, {})
+    _use_catalog(args.catalog_rows[0], args)
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    async def run():
+        started = time.perf_counter()
+        await main.startup_event()
+        result["startup_s"] = round(time.perf_counter() - started, 4)
+        result["startup_rss_mb"] = rss_mb()
+        result["startup_modules"] = loaded()
+        started = time.perf_counter()
+        await _run_scenario(main.app, pdf_bytes, 1, 1, unique_documents=True)
+        result["first_request_s"] = round(time.perf_counter() - started, 4)
+        result["first_request_rss_mb"] = rss_mb()
+        result["first_request_modules"] = loaded()
+        await main.shutdown_event()
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def run_startup_benchmark(args) -> list[dict]:
+    """
+    Cold start com e sem FAST_STARTUP: cada execução é um processo Python novo (imports frios, como
+    um worker recém-criado). Os backends locais substituem os clientes do Vertex AI, então o SDK só
+    aparece entre os módulos carregados quando o próprio startup o importa.
+    """
+    work_dir = tempfile.mkdtemp(prefix="xanalysis_benchmark_")
+    pdf_path = generate_pdf(os.path.join(work_dir, "edital_startup.pdf"), args.pages[0], seed=args.pages[0])
+    child_args = [
+        "--startup-child", pdf_path, "--pages", str(args.pages[0]), "--catalog-rows", str(args.catalog_rows[0]),
+        "--gemini-latency", str(args.gemini_latency), "--embedding-latency", str(args.embedding_latency),
+        "--embedding-dim", str(args.embedding_dim), "--sheets-latency", str(args.sheets_latency),
+    ]
+    if args.match_mode:
+        child_args += ["--match-mode", args.match_mode]
+
+    results = []
+    try:
+        for fast_startup in (False, True):
+            runs = []
+            for _ in range(args.startup_runs):
+                env = {**os.environ, "FAST_STARTUP": "true" if fast_startup else "false"}
+                completed = subprocess.run([sys.executable, os.path.abspath(__file__), *child_args], env=env,
+                                           capture_output=True, text=True, check=True)
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            result = {"fast_startup": fast_startup, "runs": len(runs)}
+            for field in ("import_s", "startup_s", "first_request_s", "import_rss_mb", "startup_rss_mb", "first_request_rss_mb"):
+                result[field] = round(statistics.median(run[field] for run in runs), 4)
+            for field in ("import_modules", "startup_modules", "first_request_modules"):
+                result[field] = runs[-1][field]
+            results.append(result)
+            _print_startup_result(result)
+    finally:
+        if not args.keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _print_startup_result(result: dict):
+    mode = "FAST_STARTUP" if result["fast_startup"] else "startup padrão"
+    print(f"\n{mode} (mediana de {result['runs']} processos):")
+    for phase, label in (("import", "import main"), ("startup", "evento startup"), ("first_request", "primeira análise")):
+        modules = ", ".join(result[f"{phase}_modules"]) or "nenhum"
+        print(f"    {label:<18} {result[f'{phase}_s']:.3f}s  RSS {result[f'{phase}_rss_mb']} MB  módulos pesados: {modules}")
+
+
+def _print_result(result: dict):
+    kind = "escaneado" if result["scanned"] else "texto"
+    print(
+        f"\n{result['pages']} páginas ({kind}), catálogo {result['catalog_rows']} linhas, concorrência {result['concurrency']}: "
+        f"{result['throughput_rps']} req/s, p50 {result['latency_p50_s']}s, p95 {result['latency_p95_s']}s, "
+        f"pico RSS {result['peak_rss_mb']} MB"
+    )
+    for stage, timing in result["stages"].items():
+        print(f"    {stage:<22} p50 {timing['p50_s']:.4f}s  p95 {timing['p95_s']:.4f}s")
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de análise de editais.")
+    parser.add_argument("--pages", type=_int_list, default=[5, 50], help="Páginas dos editais sintéticos (lista separada por vírgulas).")
+    parser.add_argument("--scanned", action="store_true", help="Inclui editais escaneados (sem camada de texto; exige Tesseract).")
+    parser.add_argument("--catalog-rows", type=_int_list, default=[10, 1000], help="Tamanhos do catálogo de ativos (10 a 100000).")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="Requisições simultâneas.")
+    parser.add_argument("--requests", type=int, default=16, help="Requisições por cenário.")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Latência fixa do Gemini local (s).")
+    parser.add_argument("--gemini-latency-per-1k-chars", type=float, default=0.002, help="Latência adicional por 1000 caracteres do prompt (s).")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Latência por lote do modelo de embedding local (s).")
+    parser.add_argument("--embedding-dim", type=int, default=256, help="Dimensão dos embeddings locais.")
+    parser.add_argument("--sheets-latency", type=float, default=0.3, help="Latência do download da planilha local (s).")
+    parser.add_argument("--match-mode", choices=["embedding", "hybrid", "lexical"], help="Sobrescreve MATCH_MODE.")
+    parser.add_argument("--ocr-cache", action="store_true", help="Mantém o cache de OCR ativo (as páginas escaneadas se repetem entre requisições).")
+    parser.add_argument("--result-cache", action="store_true", help="Reenvia o mesmo documento (mede o caminho com cache de resultados).")
+    parser.add_argument("--output", help="Grava os resultados em JSON neste arquivo.")
+    parser.add_argument("--keep-work-dir", action="store_true", help="Mantém o diretório temporário com caches e PDFs gerados.")
+    parser.add_argument("--startup", action="store_true", help="Mede o cold start (import, startup e primeira análise) com e sem FAST_STARTUP.")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Processos novos por modo no --startup (reporta a mediana).")
+    parser.add_argument("--startup-child", metavar="PDF", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.startup_child:
+        print(json.dumps(_startup_child(args.startup_child, args)))
+        sys.exit(0)
+    results = run_startup_benchmark(args) if args.startup else run_benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.output}")
@@ -11,4 +11,159 @@ GOOGLE_SHEET_TAB_NAME = os.getenv("GOOGLE_SHEET_TAB_NAME", "DataFunction")
 
 # OCR Tesseract (opcional, se não estiver no PATH ou para depuração local)
 # No Dockerfile, Tesseract já estará no PATH.
-OCR_TESSERACT_PATH = os.getenv("OCR_TESSERACT_PATH", None) # Ex: r'C:\Program Files\Tesseract-OCR\tesseract.exe'
\ No newline at end of file
+OCR_TESSERACT_PATH = os.getenv("OCR_TESSERACT_PATH", None) # Ex: r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Motor: "auto" usa o pacote tesserocr (Tesseract carregado uma vez por worker) se instalado;
+# senão (ou com "tesseract-cli"), uma execução do binário por lote de páginas
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "por")
+# Resolução e cor da renderização para OCR (300 dpi em tons de cinza é o recomendado para o Tesseract)
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+# Página com menos caracteres que isso na camada de texto é tratada como escaneada (OCR da página inteira)
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))
+# Em páginas com texto, imagens sem texto por cima ocupando ao menos esta fração da página passam por OCR
+OCR_MIN_IMAGE_AREA_RATIO = float(os.getenv("OCR_MIN_IMAGE_AREA_RATIO", "0.15"))
+# Cache do texto reconhecido por hash da imagem (capas e anexos padrão se repetem entre editais); vazio desativa
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "/tmp/xanalysis_cache/ocr")
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "20000"))
+OCR_TIMEOUT_SECONDS = int(os.getenv("OCR_TIMEOUT_SECONDS", "60")) # Por imagem
+# Imagens renderizadas por chamada ao Tesseract: cada página a 300 dpi ocupa ~8 MB em memória; o lote é
+# renderizado, reconhecido e liberado antes do próximo (editais escaneados grandes não acumulam todas as páginas)
+OCR_BATCH_IMAGES = int(os.getenv("OCR_BATCH_IMAGES", "8"))
+# Vagas de CPU para o Tesseract, compartilhadas entre os workers de PDF/DOCX (o OCR é o trecho mais pesado;
+# sem limite, cada worker roda o seu e a CPU fica disputada), e threads OpenMP de cada execução
+OCR_CPU_SLOTS = int(os.getenv("OCR_CPU_SLOTS", str(max(1, (os.cpu_count() or 1) - 1))))
+OCR_THREADS = int(os.getenv("OCR_THREADS", "1"))
+
+# Modelos do Vertex AI
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash-001") # Ou "gemini-1.0-pro"
+
+# Transporte do SDK do Vertex AI ("grpc" mantém um canal HTTP/2 por cliente; "rest" usa HTTP/1.1)
+VERTEX_API_TRANSPORT = os.getenv("VERTEX_API_TRANSPORT", "grpc")
+# Cria os clientes dos modelos no startup e, se ativado, faz uma chamada mínima a cada modelo
+# para que a primeira requisição após um cold start não pague conexão/TLS
+MODEL_WARMUP_ON_STARTUP = os.getenv("MODEL_WARMUP_ON_STARTUP", "false").lower() == "true"
+# Se "true", o startup não importa o SDK do Vertex AI nem cria os clientes dos modelos: vertexai.init e os
+# clientes ficam para a primeira chamada ao Gemini/embedding (cold start mais curto e menos memória por
+# worker; a primeira análise paga o import). Sem efeito sobre MODEL_WARMUP_ON_STARTUP, que cria os clientes
+FAST_STARTUP = os.getenv("FAST_STARTUP", "false").lower() == "true"
+
+# Embeddings (Vertex AI) e cache em disco dos embeddings dos ativos
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-004")
+# Diretório compartilhado entre workers (em Cloud Run, /tmp é memória; use um volume montado para persistir entre instâncias)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "/tmp/xanalysis_cache/embeddings")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+# Cache dos embeddings dos requisitos dos editais, pelo texto normalizado (cláusulas de habilitação se repetem
+# entre editais quase palavra por palavra); vazio desativa (os repetidos dentro do edital continuam deduplicados)
+REQUIREMENT_EMBEDDING_CACHE_DIR = os.getenv("REQUIREMENT_EMBEDDING_CACHE_DIR", "/tmp/xanalysis_cache/requirement_embeddings")
+REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+# Se "true", o startup carrega a planilha e aquece o cache de embeddings dos ativos
+EMBEDDING_CACHE_WARM_ON_STARTUP = os.getenv("EMBEDDING_CACHE_WARM_ON_STARTUP", "false").lower() == "true"
+
+# Cache (snapshot) da planilha de ativos
+SHEETS_CACHE_TTL_SECONDS = float(os.getenv("SHEETS_CACHE_TTL_SECONDS", "300"))
+# Após uma atualização com falha, o snapshot anterior segue servido e a próxima tentativa espera este tempo
+SHEETS_RETRY_SECONDS = float(os.getenv("SHEETS_RETRY_SECONDS", "30"))
+SHEETS_FETCH_TIMEOUT_SECONDS = float(os.getenv("SHEETS_FETCH_TIMEOUT_SECONDS", "20"))
+SHEETS_SNAPSHOT_DIR = os.getenv("SHEETS_SNAPSHOT_DIR", "/tmp/xanalysis_cache/sheets")
+
+# Extração de PDF em paralelo (pool de processos por faixas de páginas)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "16"))
+
+# Uploads: tamanho máximo (0 desativa) e limite a partir do qual o documento sai da memória para um arquivo de spool.
+# O upload é lido direto do corpo da requisição, uma única vez (ver uploads.receive_uploads); o Content-Length é checado antes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_SPOOL_THRESHOLD_BYTES = int(os.getenv("UPLOAD_SPOOL_THRESHOLD_BYTES", str(4 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "/tmp/xanalysis_uploads")
+
+# DOCX: OCR das imagens embutidas (ex.: atestados escaneados colados no edital), no mesmo pool e cache de OCR dos PDFs
+DOCX_OCR_IMAGES = os.getenv("DOCX_OCR_IMAGES", "false").lower() == "true"
+# Imagens com largura ou altura menor que isso (logos, ícones) não passam por OCR
+DOCX_OCR_MIN_IMAGE_SIDE = int(os.getenv("DOCX_OCR_MIN_IMAGE_SIDE", "300"))
+# Imagens por tarefa do pool de processos
+DOCX_OCR_SHARD_IMAGES = int(os.getenv("DOCX_OCR_SHARD_IMAGES", "8"))
+
+# Pools de threads para as etapas de rede (Sheets e Vertex AI) do pipeline
+SHEETS_EXECUTOR_THREADS = int(os.getenv("SHEETS_EXECUTOR_THREADS", "4"))
+VERTEX_EXECUTOR_THREADS = int(os.getenv("VERTEX_EXECUTOR_THREADS", "16"))
+
+# API assíncrona de jobs (submit/poll/result)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "/tmp/xanalysis_jobs/jobs.sqlite3")
+JOBS_FILES_DIR = os.getenv("JOBS_FILES_DIR", "/tmp/xanalysis_jobs/files")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_QUEUE_MAX_SIZE = int(os.getenv("JOBS_QUEUE_MAX_SIZE", "100"))
+# Jobs concluídos/falhos (e seus resultados) são apagados do store após este tempo (0 desativa), verificado a cada intervalo
+JOBS_RETENTION_SECONDS = int(os.getenv("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOBS_SWEEP_INTERVAL_SECONDS = int(os.getenv("JOBS_SWEEP_INTERVAL_SECONDS", "3600"))
+
+# Cache do resultado completo da análise (LRU em memória + disco)
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "/tmp/xanalysis_cache/results")
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "128"))
+RESULT_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", "2000"))
+# Extrações do Gemini (e embeddings dos requisitos) guardadas por edital, para recruzar com a planilha
+# atualizada sem reenviar o PDF (POST /rematch/); vazio desativa
+EXTRACTION_STORE_DIR = os.getenv("EXTRACTION_STORE_DIR", "/tmp/xanalysis_cache/extractions")
+EXTRACTION_STORE_MAX_ENTRIES = int(os.getenv("EXTRACTION_STORE_MAX_ENTRIES", "2000"))
+
+# Extração em trechos (map-reduce) para editais longos; GEMINI_CHUNK_MAX_CHARS=0 desativa
+GEMINI_CHUNK_MAX_CHARS = int(os.getenv("GEMINI_CHUNK_MAX_CHARS", "120000"))
+GEMINI_CHUNK_CONCURRENCY = int(os.getenv("GEMINI_CHUNK_CONCURRENCY", "4"))
+# Poda do prompt: envia ao Gemini só as seções do edital com objeto, habilitação, qualificação técnica,
+# valores, datas e julgamento (índice de seções por cláusulas numeradas e densidade de palavras-chave)
+PROMPT_PRUNING_ENABLED = os.getenv("PROMPT_PRUNING_ENABLED", "true").lower() == "true"
+PROMPT_PRUNING_MIN_CHARS = int(os.getenv("PROMPT_PRUNING_MIN_CHARS", "15000")) # Editais menores vão inteiros
+PROMPT_PRUNING_MIN_SECTIONS = int(os.getenv("PROMPT_PRUNING_MIN_SECTIONS", "8")) # Menos seções que isso: índice pouco confiável
+PROMPT_PRUNING_MIN_DENSITY = float(os.getenv("PROMPT_PRUNING_MIN_DENSITY", "4")) # Palavras-chave por 1000 caracteres
+PROMPT_PRUNING_PREAMBLE_CHARS = int(os.getenv("PROMPT_PRUNING_PREAMBLE_CHARS", "4000"))
+PROMPT_PRUNING_MAX_KEPT_RATIO = float(os.getenv("PROMPT_PRUNING_MAX_KEPT_RATIO", "0.8")) # Acima disso, envia o texto completo
+
+# Cliente de embeddings: lotes por requisição, concorrência e retry em erros de cota
+EMBEDDING_BATCH_MAX_TEXTS = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", "250"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "15000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_BASE_SECONDS = float(os.getenv("EMBEDDING_RETRY_BASE_SECONDS", "1.0"))
+
+# Número de ativos candidatos retornados por requisito no mapa de atendimento (coluna "Candidatos")
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "3"))
+
+# Cruzamento requisito -> ativo: "embedding" (só vetorial), "hybrid" (pré-seleção BM25 + reranqueamento
+# por embeddings dos pares pré-selecionados) ou "lexical" (só BM25 local, sem Vertex AI).
+# O padrão continua "embedding": os limiares de status foram calibrados para a similaridade pura de embeddings
+MATCH_MODE = os.getenv("MATCH_MODE", "embedding")
+MATCH_SHORTLIST_SIZE = int(os.getenv("MATCH_SHORTLIST_SIZE", "50"))
+MATCH_LEXICAL_WEIGHT = float(os.getenv("MATCH_LEXICAL_WEIGHT", "0.3"))
+MATCH_LEXICAL_THRESHOLD = float(os.getenv("MATCH_LEXICAL_THRESHOLD", "0.5")) # Limiar de "atende" no modo lexical
+
+# Índice vetorial dos ativos: "exact" (força bruta), "ivf" (aproximado) ou "auto" (ivf a partir de VECTOR_INDEX_IVF_MIN_ROWS linhas)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "auto")
+VECTOR_INDEX_IVF_MIN_ROWS = int(os.getenv("VECTOR_INDEX_IVF_MIN_ROWS", "20000"))
+VECTOR_INDEX_IVF_LISTS = int(os.getenv("VECTOR_INDEX_IVF_LISTS", "0")) # 0 = raiz quadrada do número de linhas
+VECTOR_INDEX_IVF_PROBES = int(os.getenv("VECTOR_INDEX_IVF_PROBES", "8"))
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "/tmp/xanalysis_cache/vector_index")
+
+# Tabela de sinônimos de tecnologias (termo -> termo canônico): aba da planilha de ativos ou arquivo JSON/CSV
+# Sem nenhuma das duas, usa a tabela padrão de term_matcher.py
+SYNONYMS_SHEET_TAB = os.getenv("SYNONYMS_SHEET_TAB", "")
+SYNONYMS_FILE = os.getenv("SYNONYMS_FILE", "")
+
+# Análise em lote (endpoint /batch/analyze_editais/ e CLI batch.py)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_PREFETCH_DOCUMENTS = int(os.getenv("BATCH_PREFETCH_DOCUMENTS", "2")) # Textos extraídos à frente do Gemini
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2")) # Documentos em análise (Gemini + cruzamento) ao mesmo tempo
+BATCH_FILES_DIR = os.getenv("BATCH_FILES_DIR", "/tmp/xanalysis_batch")
+
+# Controle de capacidade (scheduler.py): análises simultâneas/em espera no servidor e cotas do Vertex AI.
+# Sem capacidade dentro de SCHEDULER_MAX_WAIT_SECONDS, a requisição recebe 429/503 com Retry-After (jobs esperam sem limite)
+SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "20"))
+SCHEDULER_RETRY_AFTER_SECONDS = float(os.getenv("SCHEDULER_RETRY_AFTER_SECONDS", "10"))
+ANALYSIS_MAX_CONCURRENT = int(os.getenv("ANALYSIS_MAX_CONCURRENT", "8"))
+ANALYSIS_MAX_QUEUED = int(os.getenv("ANALYSIS_MAX_QUEUED", "16"))
+# Cotas por minuto do projeto no Vertex AI (0 = sem limite local); a concorrência cai pela metade a cada 429
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "0"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "0"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
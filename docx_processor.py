@@ -0,0 +1,212 @@
+# docx_processor.py
+import asyncio
+import io
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from pdf_processor import get_pdf_executor
+from ocr import load_image, ocr_images
+from metrics import OCR_CACHE_TOTAL, count
+from config import DOCX_OCR_IMAGES, DOCX_OCR_MIN_IMAGE_SIDE, DOCX_OCR_SHARD_IMAGES
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_V = "{urn:schemas-microsoft-com:vml}"
+_PACKAGE_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+_BODY, _P, _T, _TAB, _BR, _CR = _W + "body", _W + "p", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_TBL, _TR, _TC = _W + "tbl", _W + "tr", _W + "tc"
+_BLIP, _IMAGEDATA = _A + "blip", _V + "imagedata"
+
+# Marcador da posição de uma imagem no texto, substituído pelo texto do OCR
+_IMAGE_MARKER = "\x00{}\x00"
+_IMAGE_MARKER_RE = re.compile("\x00(\\d+)\x00")
+
+CELL_SEPARATOR = " | "
+
+
+def _open_zip(source: str | bytes | bytearray) -> zipfile.ZipFile:
+    """Abre o pacote a partir do caminho do arquivo ou do conteúdo em memória (sem cópia em disco)."""
+    return zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def _main_document_path(archive: zipfile.ZipFile) -> str:
+    """Parte principal do pacote (normalmente word/document.xml), segundo _rels/.rels."""
+    try:
+        with archive.open("_rels/.rels") as f:
+            for relationship in ET.parse(f).getroot():
+                if relationship.get("Type") == _OFFICE_DOCUMENT:
+                    return relationship.get("Target").lstrip("/")
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+
+def _relationships(archive: zipfile.ZipFile, document_path: str) -> dict:
+    """{rId: caminho no zip} dos relacionamentos internos do documento (imagens, entre outros)."""
+    folder, name = posixpath.split(document_path)
+    try:
+        with archive.open(posixpath.join(folder, "_rels", f"{name}.rels")) as f:
+            root = ET.parse(f).getroot()
+    except KeyError:
+        return {}
+    targets = {}
+    for relationship in root.iter(_PACKAGE_RELS + "Relationship"):
+        if relationship.get("TargetMode") == "External":
+            continue
+        target = relationship.get("Target", "")
+        targets[relationship.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+    return targets
+
+
+def _parse_document(source: str | bytes | bytearray, with_images: bool) -> tuple[str, list[str]]:
+    """
+    Lê o XML principal do DOCX em streaming (descompactado e analisado aos poucos com iterparse),
+    descartando cada parágrafo/tabela do corpo depois de processado: a memória usada não cresce com
+    o tamanho do arquivo, só com o texto extraído. Tabelas viram uma linha por linha da tabela, com as
+    células separadas por CELL_SEPARATOR. Com `with_images`, as imagens ficam marcadas no texto e
+    seus caminhos no zip são retornados (na ordem dos marcadores) para o OCR.
+    """
+    lines = []
+    images = []
+    image_positions = {}
+    paragraph = []
+    tables = [] # Pilha de tabelas abertas (tabelas aninhadas): {"row": células da linha, "cell": parágrafos da célula}
+    body = None
+    depth = 0
+
+    with _open_zip(source) as archive:
+        document_path = _main_document_path(archive)
+        relationships = _relationships(archive, document_path) if with_images else {}
+        with archive.open(document_path) as stream:
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    depth += 1
+                    if tag == _BODY:
+                        body = elem
+                    elif tag == _TBL:
+                        tables.append({"row": [], "cell": None})
+                    elif tag == _TR and tables:
+                        tables[-1]["row"] = []
+                    elif tag == _TC and tables:
+                        tables[-1]["cell"] = []
+                    continue
+
+                depth -= 1
+                if tag == _T:
+                    paragraph.append(elem.text or "")
+                elif tag == _TAB:
+                    paragraph.append("\t")
+                elif tag in (_BR, _CR):
+                    paragraph.append("\n")
+                elif tag in (_BLIP, _IMAGEDATA):
+                    target = relationships.get(elem.get(_R + "embed") or elem.get(_R + "id"))
+                    if target:
+                        if target not in image_positions:
+                            image_positions[target] = len(images)
+                            images.append(target)
+                        paragraph.append(_IMAGE_MARKER.format(image_positions[target]))
+                elif tag == _P:
+                    text = "".join(paragraph)
+                    paragraph.clear()
+                    if tables and tables[-1]["cell"] is not None:
+                        if text.strip():
+                            tables[-1]["cell"].append(" ".join(text.split()))
+                    else:
+                        lines.append(text)
+                    elem.clear()
+                elif tag == _TC and tables:
+                    table = tables[-1]
+                    table["row"].append(" ".join(table["cell"]))
+                    table["cell"] = None
+                    elem.clear()
+                elif tag == _TR and tables:
+                    row = CELL_SEPARATOR.join(tables[-1]["row"])
+                    if len(tables) > 1 and tables[-2]["cell"] is not None:
+                        tables[-2]["cell"].append(row) # Tabela aninhada: entra no texto da célula externa
+                    else:
+                        lines.append(row)
+                    elem.clear()
+                elif tag == _TBL and tables:
+                    tables.pop()
+                    elem.clear()
+
+                # Bloco do corpo já processado: sai da árvore para não acumular o documento inteiro
+                if depth == 2 and body is not None:
+                    body.remove(elem)
+
+    return "\n".join(lines), images
+
+
+def _ocr_docx_images(source: str | bytes | bytearray, targets: list[str]) -> tuple[list[str], dict]:
+    """Executado em um worker: OCR das imagens do DOCX (pequenas ou em formato não suportado ficam vazias)."""
+    texts = [""] * len(targets)
+    pixmaps, positions = [], []
+    with _open_zip(source) as archive:
+        for position, target in enumerate(targets):
+            try:
+                pixmap = load_image(archive.read(target))
+            except Exception:
+                continue # Ex.: EMF/WMF, ou parte ausente no pacote
+            if min(pixmap.width, pixmap.height) < DOCX_OCR_MIN_IMAGE_SIDE:
+                continue
+            pixmaps.append(pixmap)
+            positions.append(position)
+    recognized, cache_hits = ocr_images(pixmaps)
+    for position, text in zip(positions, recognized):
+        texts[position] = text
+    return texts, {"ocr_images": len(pixmaps), "ocr_cache_hits": cache_hits}
+
+
+def _join_images(text: str, image_texts: list[str]) -> str:
+    """Substitui os marcadores das imagens pelo texto reconhecido (ou remove, sem OCR)."""
+    def replace(match):
+        image_text = image_texts[int(match.group(1))].strip() if image_texts else ""
+        return f"\n{image_text}\n" if image_text else ""
+    return _IMAGE_MARKER_RE.sub(replace, text)
+
+
+def _record_images(shard_stats: list[dict]):
+    ocr_count = sum(stats["ocr_images"] for stats in shard_stats)
+    cache_hits = sum(stats["ocr_cache_hits"] for stats in shard_stats)
+    OCR_CACHE_TOTAL.inc(cache_hits, result="hit")
+    OCR_CACHE_TOTAL.inc(ocr_count - cache_hits, result="miss")
+    count("docx_images_ocr", ocr_count)
+
+
+def extract_text_from_docx(source: str | bytes | bytearray, ocr: bool | None = None) -> str:
+    """
+    Extrai o texto de um DOCX (caminho do arquivo ou conteúdo em memória): parágrafos e tabelas do corpo, na ordem do documento.
+    Com OCR (padrão: DOCX_OCR_IMAGES), o texto das imagens embutidas entra no lugar de cada imagem.
+    """
+    ocr = DOCX_OCR_IMAGES if ocr is None else ocr
+    text, images = _parse_document(source, ocr)
+    if not images:
+        return _join_images(text, [])
+    image_texts, stats = _ocr_docx_images(source, images)
+    _record_images([stats])
+    return _join_images(text, image_texts)
+
+
+async def extract_text_from_docx_async(source: str | bytes | bytearray, ocr: bool | None = None) -> str:
+    """
+    Versão não bloqueante para o endpoint: a leitura do XML roda no pool de processos dos PDFs e,
+    com OCR, as imagens são divididas em lotes de DOCX_OCR_SHARD_IMAGES entre os workers do pool.
+    """
+    ocr = DOCX_OCR_IMAGES if ocr is None else ocr
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+    text, images = await loop.run_in_executor(executor, _parse_document, source, ocr)
+    if not images:
+        return _join_images(text, [])
+
+    shard_size = max(1, DOCX_OCR_SHARD_IMAGES)
+    shards = [images[first:first + shard_size] for first in range(0, len(images), shard_size)]
+    results = await asyncio.gather(*[loop.run_in_executor(executor, _ocr_docx_images, source, shard) for shard in shards])
+    _record_images([stats for _, stats in results])
+    return _join_images(text, [image_text for texts, _ in results for image_text in texts])
@@ -0,0 +1,352 @@
+# embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import EMBEDDING_CACHE_TOTAL, count
+
+try:
+    import fcntl
+except ImportError: # Windows: sem flock, o cache é protegido só dentro do processo (não compartilhe o diretório entre workers)
+    fcntl = None
+
+
+def normalize_text_for_cache(text: str) -> str:
+    """Normaliza o texto antes do hash: Unicode NFC, espaços colapsados e bordas removidas."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# Numeração no início do requisito: "6.1.3.1.", "1)", "a)", "(b)", "IV -", marcadores de lista
+_LEADING_NUMBERING = re.compile(r"^(?:\(?(?:\d+(?:\.\d+)*\.?|[a-z]|[ivx]{1,6})\)|\d+(?:\.\d+)*\.?|[a-z][.)]|[ivx]{1,6}\s*[-–.)]|[-–•*·])\s+")
+
+
+def normalize_requirement_text(text: str) -> str:
+    """
+    Forma canônica de um requisito, para reconhecer a mesma cláusula em editais diferentes:
+    sem acentos, em minúsculas, sem a numeração do item e sem pontuação final, com espaços colapsados.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    while True:
+        stripped = _LEADING_NUMBERING.sub("", text, count=1)
+        if stripped == text:
+            break
+        text = stripped
+    return text.rstrip(" .;:,…")
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def _remove_if_exists(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings em disco, endereçado pelo conteúdo.
+
+    A chave é o SHA-256 do nome do modelo + texto normalizado, então só textos novos ou
+    alterados geram chamadas ao Vertex AI. Os vetores ficam em um único arquivo float32
+    contíguo (lido via np.memmap) e o índice (chave -> linha, último uso) em um snapshot JSON
+    mais um log de linhas JSON acrescentadas a cada gravação; o snapshot só é reescrito quando o
+    log cresce demais ou na compactação (o log de cada snapshot tem o número da sua geração).
+    O diretório pode ser compartilhado por vários workers: escritas usam flock exclusivo
+    e recargas do índice usam flock compartilhado (sem fcntl, ex.: Windows, só o lock do processo).
+    Quando o número de entradas passa de `max_entries`, as menos usadas recentemente são
+    descartadas e o arquivo de vetores é compactado.
+    `normalize` define quais textos compartilham a chave (ex.: normalize_requirement_text para os
+    requisitos); `name` identifica o cache nas métricas.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 50000, normalize=normalize_text_for_cache,
+                 name: str = "embedding"):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.normalize = normalize
+        self.name = name
+        self.cache_dir = os.path.join(cache_dir, _model_slug(model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self._lock_path = os.path.join(self.cache_dir, ".lock")
+
+        self._entries = {}  # chave -> [linha, último uso]
+        self._touched = {}  # chave -> último uso ainda não persistido
+        self._dim = None
+        self._rows = 0
+        self._vectors = None
+        self._index_mtime = None
+        self._generation = 0 # Geração do snapshot; o log correspondente é index.<geração>.log
+        self._log_offset = 0 # Bytes do log já aplicados
+        self._log_lines = 0
+        self._mutex = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, text: str) -> str:
+        payload = f"{self.model_name}\x00{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield # Chamado sempre com self._mutex
+            return
+        with open(self._lock_path, "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload_if_changed(self):
+        """Recarrega índice e memmap se outro processo alterou o cache. Deve ser chamado com flock."""
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        changed = False
+        if mtime != self._index_mtime:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("model") != self.model_name:
+                print(f"Aviso: índice do cache de embeddings pertence a outro modelo ({index.get('model')}). Ignorando.")
+                return
+            self._entries = index.get("entries", {})
+            self._dim = index.get("dim")
+            self._rows = index.get("rows", 0)
+            self._generation = index.get("generation", 0)
+            self._log_offset = self._log_lines = 0
+            self._index_mtime = mtime
+            changed = True
+        if self._replay_log() or changed:
+            self._open_vectors()
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.cache_dir, f"index.{generation}.log")
+
+    def _replay_log(self) -> bool:
+        """Aplica as linhas do log gravadas desde a última leitura. Retorna True se havia alguma."""
+        path = self._log_path(self._generation)
+        try:
+            if os.path.getsize(path) <= self._log_offset:
+                return False
+            with open(path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        complete = data[:data.rfind(b"\n") + 1] # Linha incompleta (gravação interrompida) fica de fora
+        for line in complete.splitlines():
+            key, row, last_used = json.loads(line)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [row, last_used]
+                self._rows = max(self._rows, row + 1)
+            else:
+                entry[1] = max(entry[1], last_used)
+            self._log_lines += 1
+        self._log_offset += len(complete)
+        return bool(complete)
+
+    def _append_log(self, records: list):
+        path = self._log_path(self._generation)
+        # Com o flock exclusivo todo o log já foi aplicado: o que passar do offset é uma linha incompleta
+        if os.path.exists(path) and os.path.getsize(path) != self._log_offset:
+            os.truncate(path, self._log_offset)
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(path, "ab") as f:
+            f.write(data)
+        self._log_offset += len(data)
+        self._log_lines += len(records)
+
+    def _merge_touched(self):
+        for key, last_used in self._touched.items():
+            if key in self._entries:
+                self._entries[key][1] = max(self._entries[key][1], last_used)
+        self._touched = {}
+
+    def _write_index(self):
+        """Reescreve o snapshot do índice em uma nova geração (com log vazio) e apaga o log anterior."""
+        self._merge_touched()
+        old_log = self._log_path(self._generation)
+        self._generation += 1
+        _remove_if_exists(self._log_path(self._generation)) # Sobra de uma geração antiga com o mesmo número
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self._dim, "rows": self._rows, "generation": self._generation,
+                       "entries": self._entries}, f)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.stat(self._index_path).st_mtime_ns
+        self._log_offset = self._log_lines = 0
+        _remove_if_exists(old_log)
+
+    def _open_vectors(self):
+        self._vectors = None
+        if self._dim and self._rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self._dim))
+
+    def _evict_if_needed(self):
+        """Descarta as entradas menos usadas recentemente e compacta o arquivo de vetores. Retorna True se compactou."""
+        if len(self._entries) <= self.max_entries:
+            return False
+
+        ordered = sorted(self._entries.items(), key=lambda item: item[1][1], reverse=True)
+        kept = ordered[:self.max_entries]
+        old_rows = np.array([entry[0] for _, entry in kept], dtype=np.int64)
+        compacted = np.ascontiguousarray(self._vectors[old_rows], dtype=np.float32)
+
+        tmp_path = f"{self._vectors_path}.{os.getpid()}.tmp"
+        compacted.tofile(tmp_path)
+        os.replace(tmp_path, self._vectors_path)
+
+        self._entries = {key: [new_row, entry[1]] for new_row, (key, entry) in enumerate(kept)}
+        self._rows = len(kept)
+        self._open_vectors()
+        print(f"Cache de embeddings compactado: {len(ordered) - len(kept)} entradas removidas.")
+        return True
+
+    def _lookup(self, keys: list[str]) -> dict:
+        now = time.time()
+        found = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and key not in found:
+                found[key] = np.array(self._vectors[entry[0]], dtype=np.float32)
+                self._touched[key] = now
+        return found
+
+    def stored_vectors(self) -> np.ndarray:
+        """Cópia dos vetores de todas as entradas do cache (ex.: consultas reais no relatório de recall do índice)."""
+        with self._mutex, self._file_lock(exclusive=False):
+            self._reload_if_changed()
+            if not self._entries or self._vectors is None:
+                return np.empty((0, self._dim or 0), dtype=np.float32)
+            rows = np.array(sorted(entry[0] for entry in self._entries.values()), dtype=np.int64)
+            return np.array(self._vectors[rows], dtype=np.float32)
+
+    def put_many(self, keys: list[str], vectors: np.ndarray):
+        """Grava novos vetores no cache (append no arquivo float32 + atualização do índice)."""
+        with self._mutex, self._file_lock(exclusive=True):
+            self._reload_if_changed()
+            self._put_many_locked(keys, vectors)
+
+    def _put_many_locked(self, keys: list[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(keys) != vectors.shape[0] or not len(keys):
+            return
+
+        if self._dim is None:
+            self._dim = int(vectors.shape[1])
+        elif self._dim != vectors.shape[1]:
+            raise ValueError(f"Dimensão de embedding inesperada: {vectors.shape[1]} (cache usa {self._dim}).")
+
+        now = time.time()
+        records = [[key, self._entries[key][0], last_used] for key, last_used in self._touched.items() if key in self._entries]
+        new_positions = []
+        seen = set()
+        for position, key in enumerate(keys):
+            if key not in self._entries and key not in seen:
+                new_positions.append(position)
+                seen.add(key)
+        if new_positions:
+            # Descarta linhas órfãs (ex.: processo interrompido entre o append e a gravação do índice)
+            expected_size = self._rows * self._dim * 4
+            if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != expected_size:
+                os.truncate(self._vectors_path, expected_size)
+            with open(self._vectors_path, "ab") as f:
+                np.ascontiguousarray(vectors[new_positions]).tofile(f)
+            for offset, position in enumerate(new_positions):
+                self._entries[keys[position]] = [self._rows + offset, now]
+                records.append([keys[position], self._rows + offset, now])
+            self._rows += len(new_positions)
+            self._open_vectors()
+        self._merge_touched()
+        compacted = self._evict_if_needed()
+        # Snapshot completo só na primeira gravação, após a compactação (linhas renumeradas) ou com o log grande;
+        # senão, só as entradas novas/usadas vão para o fim do log
+        if compacted or self._index_mtime is None or self._log_lines + len(records) > max(1000, len(self._entries) // 2):
+            self._write_index()
+        elif records:
+            self._append_log(records)
+
+    def embed(self, texts: list[str], embed_fn, exclusive: bool = False) -> np.ndarray:
+        """
+        Retorna uma matriz float32 (len(texts), dim) com os embeddings dos textos.
+        Apenas textos ausentes do cache são enviados a `embed_fn` (cada texto distinto uma única vez).
+        Com `exclusive=True` o cálculo dos ausentes acontece com o lock do cache, de modo que
+        apenas um processo aquece o cache e os demais reaproveitam o resultado.
+        """
+        if not texts:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+
+        keys = [self.make_key(text) for text in texts]
+        with self._mutex, self._file_lock(exclusive=exclusive):
+            self._reload_if_changed()
+            found = self._lookup(keys)
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            EMBEDDING_CACHE_TOTAL.inc(len(keys) - len(missing), cache=self.name, result="hit")
+            EMBEDDING_CACHE_TOTAL.inc(len(missing), cache=self.name, result="miss")
+            count(f"{self.name}_cache_hits", len(keys) - len(missing))
+            count(f"{self.name}_cache_misses", len(missing))
+
+            if missing and exclusive:
+                new_vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+                self._put_many_locked(list(missing.keys()), new_vectors)
+                found.update(zip(missing.keys(), new_vectors))
+                missing = {}
+
+        # Fora do lock: a chamada remota não bloqueia outras threads/processos que só leem o cache
+        if missing:
+            new_vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(list(missing.keys()), new_vectors)
+            found.update(zip(missing.keys(), new_vectors))
+
+        return np.vstack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "dim": self._dim,
+                "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: str, model_name: str, max_entries: int = 50000, normalize=normalize_text_for_cache,
+                        name: str = "embedding") -> EmbeddingCache:
+    """Retorna a instância (única por processo) do cache para o diretório/modelo informados."""
+    with _caches_lock:
+        cache_key = (cache_dir, model_name)
+        if cache_key not in _caches:
+            _caches[cache_key] = EmbeddingCache(cache_dir, model_name, max_entries, normalize, name)
+        return _caches[cache_key]
+
+
+def get_cache_stats() -> dict:
+    """Estatísticas de todos os caches de embeddings do processo, por nome (para /metrics)."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,137 @@
+# embedding_client.py
+from __future__ import annotations
+
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from metrics import EMBEDDING_BATCHES_TOTAL, EMBEDDING_TEXTS_TOTAL, EMBEDDING_RETRIES_TOTAL, EXTERNAL_CALL_SECONDS, count
+from model_registry import get_embedding_model
+from scheduler import embedding_call
+from config import (
+    EMBEDDING_BATCH_MAX_TEXTS, EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES, EMBEDDING_RETRY_BASE_SECONDS,
+)
+
+if TYPE_CHECKING:
+    from vertexai.language_models import TextEmbeddingModel
+
+
+def retryable_errors() -> tuple:
+    """Erros transitórios (cota, sobrecarga) que justificam nova tentativa com backoff (import no primeiro uso)."""
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa conservadora de tokens (~4 caracteres por token), sem depender do tokenizer remoto."""
+    return len(text) // 4 + 1
+
+
+def make_batches(texts: list[str], max_texts: int, max_tokens: int) -> list[list[int]]:
+    """Agrupa índices de textos em lotes que respeitam o limite de instâncias e de tokens por requisição."""
+    batches = []
+    current = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_texts or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingClient:
+    """
+    Cliente de embeddings do Vertex AI: reaproveita o handle do modelo, divide a entrada em lotes
+    (por quantidade e tokens), envia os lotes em paralelo com limite de concorrência e repete com
+    backoff exponencial em erros de cota. Retorna sempre uma matriz float32 (len(texts), dim).
+    """
+
+    def __init__(self, model_name: str, max_texts: int = EMBEDDING_BATCH_MAX_TEXTS, max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                 concurrency: int = EMBEDDING_CONCURRENCY, max_retries: int = EMBEDDING_MAX_RETRIES):
+        self.model_name = model_name
+        self.max_texts = max_texts
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embedding-batch")
+        self.stats = {"requests": 0, "texts": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def model(self) -> TextEmbeddingModel:
+        with self._model_lock:
+            if self._model is None:
+                self._model = get_embedding_model(self.model_name)
+            return self._model
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with embedding_call():
+                    started = time.perf_counter()
+                    embeddings = self.model.get_embeddings(texts)
+                    EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, service="embedding")
+                EMBEDDING_BATCHES_TOTAL.inc(model=self.model_name)
+                EMBEDDING_TEXTS_TOTAL.inc(len(texts), model=self.model_name)
+                with self._stats_lock:
+                    self.stats["requests"] += 1
+                    self.stats["texts"] += len(texts)
+                return np.array([embedding.values for embedding in embeddings], dtype=np.float32)
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = EMBEDDING_RETRY_BASE_SECONDS * (2 ** attempt) * (0.5 + random.random())
+                EMBEDDING_RETRIES_TOTAL.inc(model=self.model_name)
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                print(f"Aviso: erro transitório no embedding ({type(e).__name__}); nova tentativa em {delay:.1f}s.")
+                time.sleep(delay)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        batches = make_batches(texts, self.max_texts, self.max_tokens)
+        count("embedding_batches", len(batches))
+        count("embedding_texts", len(texts))
+        if len(batches) == 1:
+            return self._embed_batch(texts)
+
+        # Cada lote roda com uma cópia do contexto da requisição (prazo de espera do scheduler)
+        futures = [self._executor.submit(contextvars.copy_context().run, self._embed_batch, [texts[i] for i in batch]) for batch in batches]
+        results = [future.result() for future in futures]
+        matrix = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for batch, vectors in zip(batches, results):
+            matrix[batch] = vectors
+        return matrix
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_embedding_client(model_name: str) -> EmbeddingClient:
+    """Retorna o cliente de embeddings (único por processo) para o modelo informado."""
+    with _clients_lock:
+        if model_name not in _clients:
+            _clients[model_name] = EmbeddingClient(model_name)
+        return _clients[model_name]
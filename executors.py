@@ -0,0 +1,43 @@
+# executors.py
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SHEETS_EXECUTOR_THREADS, VERTEX_EXECUTOR_THREADS
+
+# Pools de threads dedicados às etapas de rede do pipeline, para que chamadas bloqueantes
+# (gspread, SDK do Vertex AI) não travem o event loop do uvicorn.
+# OCR e parsing de PDF usam o pool de processos de pdf_processor.get_pdf_executor().
+# O SQLite do job store tem uma thread só: as escritas de um job são aplicadas na ordem em que foram feitas.
+_EXECUTOR_SIZES = {
+    "sheets": SHEETS_EXECUTOR_THREADS,
+    "vertex": VERTEX_EXECUTOR_THREADS,
+    "jobs": 1,
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Retorna (criando sob demanda) o pool de threads da etapa informada ('sheets', 'vertex' ou 'jobs')."""
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=_EXECUTOR_SIZES[name], thread_name_prefix=f"{name}-stage")
+        return _executors[name]
+
+async def run_in_executor(name: str, func, *args, **kwargs):
+    """
+    Executa uma função bloqueante no pool da etapa e aguarda o resultado sem bloquear o event loop.
+    O contexto (contextvars, ex.: detalhamento de tempos da requisição) é propagado para a thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(name), functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
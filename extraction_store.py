@@ -0,0 +1,134 @@
+# extraction_store.py
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+# Máximo de snapshots da planilha (impressões digitais das linhas) mantidos em disco
+_MAX_SHEET_SNAPSHOTS = 50
+
+
+def make_extraction_key(document_sha256: str, gemini_model: str, prompt_version: str) -> str:
+    """Chave da extração: mesmo documento + mesmo modelo/prompt do Gemini = mesmos requisitos extraídos."""
+    payload = json.dumps([document_sha256, gemini_model, prompt_version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionStore:
+    """
+    Extrações do Gemini persistidas por edital, com o último cruzamento com a planilha de ativos.
+
+    Cada edital tem um JSON (requisitos extraídos, textos cruzados, candidatos de cada requisito e
+    mapa de atendimento) e um .npy com os embeddings dos requisitos. Os candidatos são gravados
+    pela impressão digital da linha da planilha (ver rematch.asset_fingerprints), e o snapshot
+    das impressões digitais da planilha usada fica em `sheets/`, para o recruzamento comparar com a
+    planilha atual. Como o ResultCache, os arquivos podem ser compartilhados entre workers e os
+    menos usados recentemente (mtime) são removidos acima de `max_entries`.
+    """
+
+    def __init__(self, store_dir: str, max_entries: int = 2000):
+        self.store_dir = store_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(store_dir, "sheets"), exist_ok=True)
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.store_dir, key[:2], f"{key}.{extension}")
+
+    def get(self, key: str) -> tuple[dict | None, np.ndarray | None]:
+        """Retorna (registro, embeddings dos requisitos); (None, None) se o edital não está guardado."""
+        path = self._path(key, "json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, None
+        try:
+            embeddings = np.load(self._path(key, "npy"))
+        except (FileNotFoundError, ValueError, OSError):
+            embeddings = None
+        return entry, embeddings
+
+    def put(self, key: str, entry: dict, embeddings: np.ndarray | None = None):
+        path = self._path(key, "json")
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if embeddings is not None:
+                # Os embeddings vão antes do JSON: um registro legível sempre tem os vetores correspondentes
+                with open(f"{self._path(key, 'npy')}.{suffix}", "wb") as f:
+                    np.save(f, np.asarray(embeddings, dtype=np.float32))
+                os.replace(f"{self._path(key, 'npy')}.{suffix}", self._path(key, "npy"))
+            with open(f"{path}.{suffix}", "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(f"{path}.{suffix}", path)
+            self._evict()
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar a extração do edital: {e}")
+
+    def keys(self) -> list[str]:
+        """Chaves de todos os editais guardados, do mais recente para o mais antigo."""
+        entries = []
+        for name in os.listdir(self.store_dir):
+            directory = os.path.join(self.store_dir, name)
+            if name == "sheets" or not os.path.isdir(directory):
+                continue
+            for file_name in os.listdir(directory):
+                if file_name.endswith(".json"):
+                    try:
+                        entries.append((os.path.getmtime(os.path.join(directory, file_name)), file_name[:-len(".json")]))
+                    except FileNotFoundError:
+                        pass
+        return [key for _, key in sorted(entries, reverse=True)]
+
+    def _evict(self):
+        keys = self.keys()
+        for key in keys[self.max_entries:]:
+            for extension in ("json", "npy"):
+                try:
+                    os.remove(self._path(key, extension))
+                except FileNotFoundError:
+                    pass
+
+    def _sheet_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.store_dir, "sheets", f"{snapshot_id}.json")
+
+    def save_sheet_snapshot(self, fingerprints: list[str]) -> str:
+        """Grava (uma vez por conteúdo) as impressões digitais das linhas da planilha. Retorna o id do snapshot."""
+        snapshot_id = hashlib.sha256("\n".join(fingerprints).encode("utf-8")).hexdigest()[:32]
+        path = self._sheet_path(snapshot_id)
+        with self._lock:
+            try:
+                if os.path.exists(path):
+                    os.utime(path)
+                    return snapshot_id
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(fingerprints, f)
+                os.replace(temp_path, path)
+                self._evict_sheet_snapshots()
+            except OSError as e:
+                print(f"Aviso: não foi possível gravar o snapshot da planilha: {e}")
+        return snapshot_id
+
+    def load_sheet_snapshot(self, snapshot_id: str) -> list[str] | None:
+        try:
+            with open(self._sheet_path(snapshot_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _evict_sheet_snapshots(self):
+        directory = os.path.join(self.store_dir, "sheets")
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+        try:
+            paths.sort(key=os.path.getmtime)
+        except FileNotFoundError:
+            return
+        for path in paths[:max(0, len(paths) - _MAX_SHEET_SNAPSHOTS)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -1,43 +1,258 @@
 # google_sheets_integrator.py
-import gspread
-import pandas as pd
+from __future__ import annotations
+
 import os
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING
+
+from config import SHEETS_CACHE_TTL_SECONDS, SHEETS_RETRY_SECONDS, SHEETS_FETCH_TIMEOUT_SECONDS, SHEETS_SNAPSHOT_DIR
 # from google.oauth2 import service_account # Não é mais explicitamente necessário aqui se gspread gerenciar
 
+# gspread e pandas são importados na primeira leitura da planilha, não no cold start do servidor
+if TYPE_CHECKING:
+    import gspread
+    import pandas as pd
+
+# Snapshot em memória da planilha de ativos, por (url, aba): {"df", "revision", "loaded_at", "ttl"}
+# (ttl = SHEETS_CACHE_TTL_SECONDS, ou SHEETS_RETRY_SECONDS depois de uma atualização com falha)
+_snapshots = {}
+_refreshing = set()
+_spreadsheets = {}
+_gspread_client = None
+_lock = threading.Lock()
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sheets-refresh")
+
+_stats = {
+    "hits": 0,            # snapshot dentro do TTL
+    "stale_hits": 0,      # snapshot expirado servido enquanto atualiza em background
+    "misses": 0,          # sem snapshot em memória
+    "refreshes": 0,       # download completo da aba
+    "not_modified": 0,    # revisão inalterada, download evitado
+    "disk_fallbacks": 0,  # API lenta/indisponível, snapshot local usado
+    "errors": 0,
+}
+
+
+def _get_spreadsheet(sheet_url: str) -> gspread.Spreadsheet:
+    """Reaproveita o cliente gspread e o handle da planilha entre atualizações."""
+    global _gspread_client
+    import gspread
+
+    with _lock:
+        if _gspread_client is None:
+            # Autenticação: gspread tentará usar as credenciais da conta de serviço do ambiente
+            # Certifique-se de que a conta de serviço do Cloud Run tem permissão de Sheets Reader/Editor
+            _gspread_client = gspread.service_account() # NENHUM ARQUIVO DE CHAVE AQUI!
+        client = _gspread_client
+    spreadsheet = _spreadsheets.get(sheet_url)
+    if spreadsheet is None:
+        try:
+            spreadsheet = client.open_by_url(sheet_url)
+        except gspread.exceptions.SpreadsheetNotFound:
+            raise Exception(f"Planilha não encontrada na URL: {sheet_url}")
+        _spreadsheets[sheet_url] = spreadsheet
+    return spreadsheet
+
+
+def _get_revision(spreadsheet: gspread.Spreadsheet) -> str | None:
+    """Marcador de revisão da planilha (modifiedTime do Drive). None se não for possível obtê-lo."""
+    try:
+        return spreadsheet.get_lastUpdateTime()
+    except Exception as e:
+        print(f"Aviso: não foi possível obter a revisão da planilha: {e}")
+        return None
+
+
+def _download_sheet_data(spreadsheet: gspread.Spreadsheet, tab_name: str) -> pd.DataFrame:
+    import gspread
+    import pandas as pd
+
+    try:
+        worksheet = spreadsheet.worksheet(tab_name)
+    except gspread.exceptions.WorksheetNotFound:
+        raise Exception(f"Aba '{tab_name}' não encontrada na planilha.")
+
+    data = worksheet.get_all_records() # Retorna uma lista de dicionários
+    df = pd.DataFrame(data)
+
+    # Opcional: Limpar colunas totalmente vazias ou linhas com todos os valores vazios se necessário
+    df.dropna(axis=1, how='all', inplace=True) # Remove colunas totalmente vazias
+    df.dropna(axis=0, how='all', inplace=True) # Remove linhas totalmente vazias
+
+    print(f"Dados carregados da planilha: {df.shape[0]} linhas, {df.shape[1]} colunas.")
+    return df
+
+
+def _content_revision(df: pd.DataFrame) -> str:
+    """Revisão derivada do conteúdo, usada quando o Drive não informa modifiedTime."""
+    payload = json.dumps(df.to_dict(orient="split"), sort_keys=True, default=str)
+    return "sha256:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _snapshot_paths(sheet_url: str, tab_name: str) -> tuple[str, str]:
+    name = hashlib.sha1(f"{sheet_url}|{tab_name}".encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(SHEETS_SNAPSHOT_DIR, name)
+    return f"{base}.parquet", f"{base}.json"
+
+
+def _save_snapshot_to_disk(sheet_url: str, tab_name: str, df: pd.DataFrame, revision: str):
+    data_path, meta_path = _snapshot_paths(sheet_url, tab_name)
+    try:
+        os.makedirs(SHEETS_SNAPSHOT_DIR, exist_ok=True)
+        # get_all_records mistura números e strings vazias na mesma coluna; Parquet exige tipo único
+        disk_df = df.copy()
+        for column in disk_df.columns:
+            if disk_df[column].dtype == object:
+                disk_df[column] = disk_df[column].astype(str)
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        disk_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, data_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"revision": revision, "saved_at": time.time()}, f)
+    except Exception as e:
+        print(f"Aviso: não foi possível salvar o snapshot local da planilha: {e}")
+
+
+def _load_snapshot_from_disk(sheet_url: str, tab_name: str) -> dict | None:
+    data_path, meta_path = _snapshot_paths(sheet_url, tab_name)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        import pandas as pd
+        df = pd.read_parquet(data_path)
+    except Exception as e:
+        print(f"Aviso: snapshot local da planilha ilegível: {e}")
+        return None
+    # loaded_at = 0 força nova tentativa de atualização na próxima chamada
+    return {"df": df, "revision": meta.get("revision"), "loaded_at": 0.0, "ttl": SHEETS_CACHE_TTL_SECONDS}
+
+
+def _refresh_snapshot(sheet_url: str, tab_name: str) -> dict:
+    """Atualiza o snapshot em memória, evitando o download se a revisão da planilha não mudou."""
+    key = (sheet_url, tab_name)
+    try:
+        spreadsheet = _get_spreadsheet(sheet_url)
+        revision = _get_revision(spreadsheet)
+        current = _snapshots.get(key)
+        if current is not None and revision is not None and revision == current["revision"]:
+            snapshot = {**current, "loaded_at": time.time(), "ttl": SHEETS_CACHE_TTL_SECONDS}
+            with _lock:
+                _snapshots[key] = snapshot
+                _stats["not_modified"] += 1
+            return snapshot
+
+        df = _download_sheet_data(spreadsheet, tab_name)
+        snapshot = {"df": df, "revision": revision or _content_revision(df), "loaded_at": time.time(), "ttl": SHEETS_CACHE_TTL_SECONDS}
+        with _lock:
+            _snapshots[key] = snapshot
+            _stats["refreshes"] += 1
+        _save_snapshot_to_disk(sheet_url, tab_name, df, snapshot["revision"])
+        return snapshot
+    except Exception:
+        with _lock:
+            _stats["errors"] += 1
+            # Continua servindo o snapshot anterior, mas sem tentar de novo a cada requisição enquanto a API falha
+            if key in _snapshots:
+                _snapshots[key] = {**_snapshots[key], "loaded_at": time.time(), "ttl": SHEETS_RETRY_SECONDS}
+        _spreadsheets.pop(sheet_url, None) # Reabre a planilha na próxima tentativa
+        raise
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def _submit_refresh(sheet_url: str, tab_name: str):
+    """Agenda uma atualização (no máximo uma em andamento por planilha/aba). Retorna o future ou None."""
+    key = (sheet_url, tab_name)
+    with _lock:
+        if key in _refreshing:
+            return None
+        _refreshing.add(key)
+    return _refresh_executor.submit(_refresh_snapshot, sheet_url, tab_name)
+
+
+def _log_background_error(future):
+    if future.exception() is not None:
+        print(f"Erro ao atualizar planilha em background: {future.exception()}")
+
+
 def get_google_sheet_data(sheet_url: str, tab_name: str) -> pd.DataFrame:
     """
     Carrega dados de uma aba específica de uma planilha do Google Sheets.
     Assume que a primeira linha contém os nomes das colunas.
     No Cloud Run, usará as credenciais da conta de serviço anexada ao serviço.
+
+    O resultado é mantido em um snapshot em memória por SHEETS_CACHE_TTL_SECONDS. Expirado o TTL,
+    o snapshot atual continua sendo servido enquanto uma atualização roda em background, e o
+    download só acontece se a revisão (modifiedTime) da planilha mudou. Se a API estiver lenta
+    ou indisponível, usa o último snapshot salvo em disco (Parquet). Se a atualização falhar, o snapshot
+    atual continua sendo servido e a próxima tentativa só acontece após SHEETS_RETRY_SECONDS.
+    O DataFrame retornado é compartilhado entre requisições: não o modifique in-place.
     """
+    key = (sheet_url, tab_name)
+    snapshot = _snapshots.get(key)
+
+    if snapshot is not None:
+        if time.time() - snapshot["loaded_at"] < snapshot["ttl"]:
+            with _lock:
+                _stats["hits"] += 1
+        else:
+            with _lock:
+                _stats["stale_hits"] += 1
+            future = _submit_refresh(sheet_url, tab_name)
+            if future is not None:
+                future.add_done_callback(_log_background_error)
+        return snapshot["df"]
+
+    with _lock:
+        _stats["misses"] += 1
+
+    future = _submit_refresh(sheet_url, tab_name)
     try:
-        # Autenticação: gspread tentará usar as credenciais da conta de serviço do ambiente
-        # Certifique-se de que a conta de serviço do Cloud Run tem permissão de Sheets Reader/Editor
-        gc = gspread.service_account() # NENHUM ARQUIVO DE CHAVE AQUI!
-        
-        spreadsheet = gc.open_by_url(sheet_url)
-        worksheet = spreadsheet.worksheet(tab_name)
-        
-        data = worksheet.get_all_records() # Retorna uma lista de dicionários
-        df = pd.DataFrame(data)
-        
-        # Opcional: Limpar colunas totalmente vazias ou linhas com todos os valores vazios se necessário
-        df.dropna(axis=1, how='all', inplace=True) # Remove colunas totalmente vazias
-        df.dropna(axis=0, how='all', inplace=True) # Remove linhas totalmente vazias
-        
-        print(f"Dados carregados da planilha: {df.shape[0]} linhas, {df.shape[1]} colunas.")
-        return df
-
-    except gspread.exceptions.SpreadsheetNotFound:
-        raise Exception(f"Planilha não encontrada na URL: {sheet_url}")
-    except gspread.exceptions.WorksheetNotFound:
-        raise Exception(f"Aba '{tab_name}' não encontrada na planilha.")
+        if future is None:
+            # Outra requisição já está carregando a planilha; aguarda o snapshot dela
+            deadline = time.time() + SHEETS_FETCH_TIMEOUT_SECONDS
+            while key not in _snapshots and key in _refreshing and time.time() < deadline:
+                time.sleep(0.05)
+            if key in _snapshots:
+                return _snapshots[key]["df"]
+            raise TimeoutError("Tempo esgotado aguardando o carregamento da planilha.")
+        return future.result(timeout=SHEETS_FETCH_TIMEOUT_SECONDS)["df"]
     except Exception as e:
-        print(f"Erro ao carregar dados da planilha: {e}")
-        raise
+        disk_snapshot = _load_snapshot_from_disk(sheet_url, tab_name)
+        if disk_snapshot is None:
+            if isinstance(e, FutureTimeoutError):
+                raise Exception(f"Tempo esgotado ao carregar a planilha ({SHEETS_FETCH_TIMEOUT_SECONDS}s) e não há snapshot local.")
+            print(f"Erro ao carregar dados da planilha: {e}")
+            raise
+        print(f"Aviso: usando snapshot local da planilha (revisão {disk_snapshot['revision']}) após falha na API: {e!r}")
+        with _lock:
+            _stats["disk_fallbacks"] += 1
+            # A API acabou de falhar: próxima tentativa após SHEETS_RETRY_SECONDS
+            _snapshots.setdefault(key, {**disk_snapshot, "loaded_at": time.time(), "ttl": SHEETS_RETRY_SECONDS})
+        return _snapshots[key]["df"]
+
+
+def get_sheet_revision(sheet_url: str, tab_name: str) -> str | None:
+    """Revisão do snapshot em memória da planilha/aba (None se ainda não carregada)."""
+    snapshot = _snapshots.get((sheet_url, tab_name))
+    return snapshot["revision"] if snapshot else None
+
+
+def get_sheet_cache_stats() -> dict:
+    """Contadores do cache da planilha (hits, misses, refreshes, etc.)."""
+    with _lock:
+        return dict(_stats)
 
 # Exemplo de uso (para teste local)
 if __name__ == "__main__":
+    import gspread
     from config import GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME
     
     # Para testar LOCALMENTE SEM ARQUIVO DE CHAVE:
@@ -0,0 +1,247 @@
+# jobs.py
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+
+from analysis_pipeline import analyze_document_cached, PIPELINE_STAGES
+from executors import get_executor, run_in_executor
+from pdf_processor import cleanup_temp_file
+from scheduler import CapacityExceeded, set_max_wait
+from config import JOBS_RETENTION_SECONDS, JOBS_SWEEP_INTERVAL_SECONDS
+
+# Estados possíveis de um job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Vezes que um job volta para a fila após 429 do Vertex AI antes de falhar
+MAX_CAPACITY_RETRIES = 5
+
+
+class JobStore:
+    """
+    Armazenamento persistente (SQLite) dos jobs de análise: estado, progresso por etapa e resultado.
+    Resultados concluídos ficam disponíveis sem recomputação, inclusive após reinício do processo,
+    até serem apagados por purge_finished. Os métodos são bloqueantes: a partir do event loop, chame-os
+    no pool "jobs" (executors.run_in_executor), que também mantém a ordem das escritas.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    filename TEXT,
+                    content_type TEXT,
+                    file_path TEXT,
+                    progress TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def create(self, filename: str, content_type: str, file_path: str, priority: int) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        progress = {stage: "pending" for stage in PIPELINE_STAGES}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, filename, content_type, file_path, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, priority, filename, content_type, file_path, json.dumps(progress), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, priority, filename, content_type, file_path, progress, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ["id", "status", "priority", "filename", "content_type", "file_path", "progress", "result", "error", "created_at", "updated_at"]
+        job = dict(zip(keys, row))
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def update(self, job_id: str, **fields):
+        if "progress" in fields:
+            fields["progress"] = json.dumps(fields["progress"])
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def set_stage(self, job_id: str, stage: str, state: str):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            progress = json.loads(row[0])
+            progress[stage] = state
+            self._conn.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?", (json.dumps(progress), time.time(), job_id))
+
+    def purge_finished(self, older_than: float) -> list[str]:
+        """Apaga os jobs concluídos/falhos sem atualização desde `older_than` (epoch); retorna o arquivo de cada um (ou None)."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT file_path FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (JOB_DONE, JOB_FAILED, older_than)
+            ).fetchall()
+            self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (JOB_DONE, JOB_FAILED, older_than))
+        return [file_path for (file_path,) in rows]
+
+    def unfinished(self) -> list[tuple[str, int, str]]:
+        """Jobs que ficaram na fila ou em execução (ex.: reinício do processo), em ordem de criação."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, priority, file_path FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+
+
+def _remove_file(file_path: str | None):
+    if file_path and os.path.exists(file_path):
+        cleanup_temp_file(file_path)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Fila limitada com prioridades (maior prioridade primeiro; empate em ordem de chegada)
+    consumida por um número fixo de workers asyncio que executam o pipeline de análise.
+    Uma tarefa de limpeza apaga periodicamente os jobs finalizados há mais de JOBS_RETENTION_SECONDS.
+    """
+
+    def __init__(self, store: JobStore, workers: int, max_size: int):
+        self.store = store
+        self.workers = workers
+        self.max_size = max_size
+        self._queue = None
+        self._tasks = []
+        self._sequence = itertools.count()
+        self._capacity_retries = {}
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if JOBS_RETENTION_SECONDS > 0:
+            self._tasks.append(asyncio.create_task(self._sweeper()))
+        # Recupera jobs interrompidos por um reinício
+        for job_id, priority, file_path in await run_in_executor("jobs", self.store.unfinished):
+            if self._queue.full():
+                await run_in_executor("jobs", self.store.update, job_id, status=JOB_FAILED, error="Fila cheia ao retomar o job após reinício.")
+                _remove_file(file_path) # Sem nova tentativa, o upload guardado não serve mais
+                continue
+            await run_in_executor("jobs", self.store.update, job_id, status=JOB_QUEUED)
+            self._queue.put_nowait((-priority, next(self._sequence), job_id))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str, priority: int):
+        """Enfileira um job já registrado no store. Levanta JobQueueFull se a fila estiver cheia."""
+        try:
+            self._queue.put_nowait((-priority, next(self._sequence), job_id))
+        except asyncio.QueueFull:
+            raise JobQueueFull()
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await self.purge_finished()
+            except Exception as e:
+                print(f"Aviso: falha na limpeza de jobs antigos: {e}")
+            await asyncio.sleep(JOBS_SWEEP_INTERVAL_SECONDS)
+
+    async def purge_finished(self, retention_seconds: float = JOBS_RETENTION_SECONDS) -> int:
+        """Apaga os jobs finalizados há mais de `retention_seconds` (e arquivos que tenham sobrado). Retorna quantos."""
+        file_paths = await run_in_executor("jobs", self.store.purge_finished, time.time() - retention_seconds)
+        for file_path in file_paths:
+            _remove_file(file_path)
+        return len(file_paths)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await run_in_executor("jobs", self.store.get, job_id)
+        if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+            return
+
+        await run_in_executor("jobs", self.store.update, job_id, status=JOB_RUNNING)
+        # Jobs não têm cliente esperando: aguardam a cota do Vertex AI em vez de falhar rápido
+        set_max_wait(None)
+        try:
+            result, _ = await analyze_document_cached(
+                job["file_path"], job["content_type"],
+                # Chamado dentro do event loop: a escrita vai para a thread do store sem esperar (a ordem é mantida)
+                on_stage=lambda stage, state: get_executor("jobs").submit(self.store.set_stage, job_id, stage, state),
+            )
+            await run_in_executor("jobs", self.store.update, job_id, status=JOB_DONE, result=result)
+        except CapacityExceeded as e:
+            if await self._retry_later(job_id, job["priority"], e.retry_after):
+                return # O arquivo fica para a nova tentativa
+            await run_in_executor("jobs", self.store.update, job_id, status=JOB_FAILED, error=str(e.detail))
+        except HTTPException as e:
+            await run_in_executor("jobs", self.store.update, job_id, status=JOB_FAILED, error=str(e.detail))
+        except Exception as e:
+            print(f"Erro inesperado no job {job_id}: {e}")
+            await run_in_executor("jobs", self.store.update, job_id, status=JOB_FAILED, error=f"Erro interno do servidor: {e}")
+        # Se o worker for cancelado (shutdown), o arquivo é mantido para o job ser retomado no próximo startup
+        self._capacity_retries.pop(job_id, None)
+        _remove_file(job["file_path"])
+
+    async def _retry_later(self, job_id: str, priority: int, delay: float) -> bool:
+        """Recoloca o job na fila após `delay` segundos (Retry-After do 429). False se já esgotou as tentativas."""
+        attempts = self._capacity_retries.get(job_id, 0) + 1
+        if attempts > MAX_CAPACITY_RETRIES:
+            return False
+        self._capacity_retries[job_id] = attempts
+        await run_in_executor("jobs", self.store.update, job_id, status=JOB_QUEUED)
+        print(f"Job {job_id} sem cota no Vertex AI; nova tentativa em {delay}s ({attempts}/{MAX_CAPACITY_RETRIES}).")
+
+        def requeue():
+            try:
+                self.submit(job_id, priority)
+            except JobQueueFull:
+                # Continua "queued" no store: é retomado no próximo startup
+                print(f"Aviso: fila cheia ao recolocar o job {job_id}; será retomado no próximo reinício.")
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+        return True
@@ -0,0 +1,114 @@
+# lexical_index.py
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+from term_matcher import TermMatcher
+
+# Palavras muito frequentes em editais/ativos que não ajudam a distinguir ativos
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "no", "na", "nos", "nas", "um", "uma",
+    "para", "por", "com", "sem", "ao", "aos", "que", "se", "ou", "como", "sua", "seu", "suas", "seus",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acentos (\"Certificação\" e \"certificacao\" viram o mesmo token)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str, term_matcher: TermMatcher | None = None) -> list[str]:
+    """
+    Tokens do texto para o BM25. Os termos canônicos da tabela de sinônimos entram como tokens
+    extras, para que "GCP" no requisito encontre "Google Cloud Platform" no ativo.
+    """
+    tokens = [token for token in _TOKEN_RE.findall(_fold(text)) if token not in STOPWORDS]
+    if term_matcher is not None:
+        tokens.extend(f"#{term}" for term in term_matcher.find_terms(text))
+    return tokens
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 sobre os textos dos ativos, totalmente local (sem Vertex AI).
+
+    O score é um BM25 normalizado para [0, 1]: a contribuição de cada termo da consulta satura
+    em 1 quando o termo aparece no ativo com a frequência típica, e a soma é ponderada pelo IDF.
+    Assim 1.0 significa "todos os termos do requisito presentes" e o valor é comparável ao
+    cosseno dos embeddings na classificação.
+    """
+
+    def __init__(self, documents: list[str], term_matcher: TermMatcher | None = None, k1: float = 1.2, b: float = 0.75):
+        self.term_matcher = term_matcher
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for row, document in enumerate(documents):
+            tokens = tokenize(document, term_matcher)
+            lengths[row] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(row)
+                postings[token][1].append(count)
+
+        average_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        self._length_norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        self._postings = {
+            token: (np.array(rows, dtype=np.int64), np.array(counts, dtype=np.float32))
+            for token, (rows, counts) in postings.items()
+        }
+        self._idf = {
+            token: math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            for token, (rows, _) in self._postings.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score normalizado de cada ativo para a consulta (vetor de tamanho `size`)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        query_tokens = set(tokenize(query, self.term_matcher))
+        if not query_tokens or not self.size:
+            return scores
+
+        # Termos ausentes do catálogo contam no denominador com o IDF máximo (não podem ser atendidos)
+        max_idf = math.log(1 + (self.size + 0.5) / 0.5)
+        total_idf = 0.0
+        for token in query_tokens:
+            idf = self._idf.get(token, max_idf)
+            total_idf += idf
+            if token not in self._postings:
+                continue
+            rows, counts = self._postings[token]
+            saturation = counts * (self.k1 + 1) / (counts + self._length_norm[rows])
+            np.add.at(scores, rows, idf * np.minimum(saturation, 1.0))
+        return scores / total_idf
+
+    def search(self, queries: list[str], k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Os k ativos com maior score para cada consulta. Retorna (linhas, scores) com forma
+        (n_consultas, k), do melhor para o pior; posições sem candidato (score 0) têm linha -1.
+        """
+        k = max(0, min(k, self.size))
+        top_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        top_scores = np.zeros((len(queries), k), dtype=np.float32)
+        for q, query in enumerate(queries):
+            scores = self.scores(query)
+            candidates = np.flatnonzero(scores > 0)
+            if not len(candidates) or not k:
+                continue
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            top_rows[q, :len(candidates)] = candidates
+            top_scores[q, :len(candidates)] = scores[candidates]
+        return top_rows, top_scores
@@ -1,14 +1,30 @@
 # main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
 import os
-import pandas as pd
 import io
+import uuid
+import json
+import shutil
+import time
 
-from pdf_processor import extract_text_from_pdf, save_uploaded_file_temp, cleanup_temp_file
-from google_sheets_integrator import get_google_sheet_data
-from ai_analyzer import initialize_vertex_ai, extract_requirements_with_gemini, cross_reference_assets
-from config import GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME
+from pdf_processor import shutdown_pdf_executor
+from google_sheets_integrator import get_google_sheet_data, get_sheet_cache_stats
+from ai_analyzer import initialize_vertex_ai, warm_asset_embedding_cache
+from model_registry import preload_models, warm_up_models
+from analysis_pipeline import analyze_document_cached, analyze_document_events, rematch_stored_analyses, SUPPORTED_CONTENT_TYPES
+from batch import BatchDocument, analyze_batch
+from uploads import check_content_length, receive_uploads, upload_form_openapi
+from jobs import JobStore, JobQueue, JobQueueFull, JOB_DONE, JOB_FAILED
+from executors import run_in_executor, shutdown_executors
+from metrics import REQUEST_SECONDS, register_collector, render_metrics, start_request
+from scheduler import CapacityExceeded, admission, get_scheduler_stats
+from embedding_cache import get_cache_stats
+from config import (
+    GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME, EMBEDDING_CACHE_WARM_ON_STARTUP, MODEL_WARMUP_ON_STARTUP, FAST_STARTUP,
+    JOBS_DB_PATH, JOBS_FILES_DIR, JOBS_WORKERS, JOBS_QUEUE_MAX_SIZE, BATCH_MAX_FILES, BATCH_FILES_DIR, SCHEDULER_RETRY_AFTER_SECONDS,
+)
 
 
 app = FastAPI(
@@ -16,106 +32,297 @@ app = FastAPI(
     description="API para análise de editais usando IA e integração de dados de ativos."
 )
 
+job_store = None
+job_queue = None
+warm_task = None
+
+# Estatísticas já mantidas pelo cache da planilha e pela fila de jobs, expostas em /metrics
+register_collector("xanalysis_sheets_cache_total", "Eventos do cache da planilha de ativos.", "counter", "event", get_sheet_cache_stats)
+register_collector("xanalysis_jobs_pending", "Jobs aguardando na fila.", "gauge", "queue",
+                   lambda: {"analyze_edital": job_queue.pending() if job_queue is not None else 0})
+register_collector("xanalysis_scheduler_state", "Controle de capacidade: análises ativas/em espera, limites adaptativos e chamadas em andamento ao Vertex AI.",
+                   "gauge", "key", get_scheduler_stats)
+register_collector("xanalysis_embedding_cache_hit_ratio", "Fração das consultas atendidas por cada cache de embeddings (ativos e requisitos) neste processo.",
+                   "gauge", "cache", lambda: {name: stats["hit_ratio"] for name, stats in get_cache_stats().items()})
+
+async def warm_embedding_cache():
+    try:
+        ativos_df = await run_in_executor("sheets", get_google_sheet_data, GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME)
+        await run_in_executor("vertex", warm_asset_embedding_cache, ativos_df)
+    except Exception as e:
+        print(f"Erro ao aquecer o cache de embeddings: {e}")
+
 @app.on_event("startup")
 async def startup_event():
+    global job_store, job_queue, warm_task
     try:
-        initialize_vertex_ai(GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION)
-        print("Vertex AI inicializado com sucesso.")
+        initialize_vertex_ai(GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CLOUD_LOCATION, deferred=FAST_STARTUP)
+        print("Vertex AI será inicializado no primeiro uso." if FAST_STARTUP else "Vertex AI inicializado com sucesso.")
     except Exception as e:
         print(f"Erro ao inicializar Vertex AI: {e}")
         # Em um ambiente de produção, considere um 'sys.exit(1)' aqui
         # se a falha na inicialização da IA for um impedimento crítico.
 
-@app.post("/analyze_edital/")
+    # Clientes dos modelos criados uma vez por processo (e aquecidos, se configurado)
+    try:
+        if not FAST_STARTUP:
+            await run_in_executor("vertex", preload_models)
+        if MODEL_WARMUP_ON_STARTUP:
+            await run_in_executor("vertex", warm_up_models)
+    except Exception as e:
+        print(f"Erro ao preparar os modelos do Vertex AI: {e}")
+
+    if EMBEDDING_CACHE_WARM_ON_STARTUP:
+        # Em segundo plano: a API começa a atender enquanto a planilha é lida e os embeddings calculados
+        warm_task = asyncio.create_task(warm_embedding_cache())
+
+    job_store = await run_in_executor("jobs", JobStore, JOBS_DB_PATH)
+    job_queue = JobQueue(job_store, workers=JOBS_WORKERS, max_size=JOBS_QUEUE_MAX_SIZE)
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warm_task is not None:
+        warm_task.cancel()
+    if job_queue is not None:
+        await job_queue.stop()
+    shutdown_executors()
+    shutdown_pdf_executor()
+
+EDITAL_FILE_FORM = upload_form_openapi("edital_file", "Arquivo do edital (PDF ou DOCX).")
+
+@app.post("/analyze_edital/", openapi_extra=EDITAL_FILE_FORM)
 async def analyze_edital_endpoint(
-    edital_file: UploadFile = File(..., description="Arquivo do edital (PDF ou DOCX).")
+    request: Request,
     # Removidos google_sheet_url e google_sheet_tab_name como parâmetros de Form
+    debug: bool = Query(False, description="Inclui no corpo o detalhamento de tempos e contadores (_timings).")
 ):
     """
     Endpoint para analisar um edital.
     Recebe um arquivo de edital (PDF/DOCX).
     A URL da planilha e o nome da aba são lidos das variáveis de ambiente do Cloud Run.
     Retorna uma análise estratégica e um mapa de atendimento.
+    O header X-Result-Cache indica se o resultado veio do cache (hit-memory/hit-disk), foi calculado (miss)
+    ou não pôde ser cacheado (bypass). O header Server-Timing traz a duração de cada etapa.
+    Sem capacidade (servidor cheio ou cota do Vertex AI esgotada), responde 503/429 com Retry-After.
     """
-    
-    # 1. Salvar o arquivo do edital temporariamente
-    if edital_file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-        raise HTTPException(status_code=400, detail="Formato de arquivo não suportado. Apenas PDF e DOCX são aceitos.")
+    check_content_length(request)
 
-    temp_file_path = None
+    timings = start_request()
+    status_code = 500
+    upload = None
+    admitted = None
     try:
-        file_content = await edital_file.read()
-        temp_file_path = save_uploaded_file_temp(file_content, edital_file.filename)
-
-        edital_text = ""
-        if edital_file.content_type == "application/pdf":
-            edital_text = extract_text_from_pdf(temp_file_path)
-        elif edital_file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            raise HTTPException(status_code=501, detail="Processamento de DOCX não implementado ainda. Use PDF.")
+        # Vaga de análise antes de ler o corpo da requisição (o upload é lido por receive_uploads, não pelo
+        # FastAPI): com o servidor cheio, recusa sem receber o arquivo
+        admitted = await admission.acquire()
 
+        # 1. Receber o edital direto do corpo da requisição (em memória, ou em arquivo de spool se for grande), com limite de tamanho
+        [upload] = await receive_uploads(request, "edital_file", content_types=SUPPORTED_CONTENT_TYPES)
 
-        if not edital_text.strip():
-            raise HTTPException(status_code=400, detail="Não foi possível extrair texto do edital. O arquivo pode estar vazio ou ilegível.")
-
-        # 2. Carregar dados da planilha de ativos das variáveis de ambiente
-        try:
-            # Usamos as variáveis de ambiente importadas de config.py
-            ativos_df = get_google_sheet_data(GOOGLE_SHEET_URL, GOOGLE_SHEET_TAB_NAME)
-            if ativos_df.empty:
-                print("Aviso: Planilha de ativos vazia ou não pôde ser carregada. Apenas extração de requisitos será feita.")
-        except Exception as e:
-            print(f"Erro ao carregar planilha de ativos: {e}")
-            ativos_df = pd.DataFrame() # Continue com um DataFrame vazio se houver erro
-
-        # 3. Processamento Inteligente (Pipeline de IA)
-        extracted_requirements = extract_requirements_with_gemini(edital_text)
-        
-        analysis_map_df = pd.DataFrame(columns=['Requisito', 'Tipo', 'Status', 'Evidência', 'Ação Necessária'])
-        if not ativos_df.empty and extracted_requirements:
-            analysis_map_df = cross_reference_assets(extracted_requirements, ativos_df)
-        
-        strategic_analysis = {
-            "Objeto": extracted_requirements.get("Objeto", "N/A"),
-            "Orgao": extracted_requirements.get("Orgao", "N/A"),
-            "TipoJulgamento": extracted_requirements.get("TipoJulgamento", "N/A"),
-            "ValorEstimado": extracted_requirements.get("ValorEstimado", "N/A"),
-            "Datas": extracted_requirements.get("Datas", {})
-        }
-
-        analysis_map_json = analysis_map_df.to_dict(orient="records")
-
-        resumo_requisitos = {}
-        for k, v in extracted_requirements.get("RequisitosHabilitacao", {}).items():
-            if v:
-                resumo_requisitos[f"Habilitação {k}"] = v
-        for item in extracted_requirements.get("RequisitosObjetoQualificacaoTecnicaEspecifica", []):
-            desc = item.get("Descricao", "")
-            details = ", ".join(item.get("Detalhes", []))
-            quant = item.get("QuantitativoMinimo", "")
-            cert = item.get("CertificacaoExigida", "")
-            resumo_requisitos[f"Objeto/Técnico: {desc}"] = f"{details} (Quant.: {quant}, Cert.: {cert})"
-
-
-        return JSONResponse(content={
-            "analysis_strategic": {
-                "NomeOrgao": strategic_analysis.get("Orgao"),
-                "Objeto": strategic_analysis.get("Objeto"),
-                "CriterioJulgamento": strategic_analysis.get("TipoJulgamento"),
-                "ValorEstimado": strategic_analysis.get("ValorEstimado"),
-                "Datas": strategic_analysis.get("Datas"),
-                "ResumoRequisitosExtraidos": resumo_requisitos
-            },
-            "mapa_atendimento": analysis_map_json
-        })
+        # 2. Pipeline completo (texto, planilha de ativos, Gemini e cruzamento), ou resultado em cache
+        result, cache_status = await analyze_document_cached(upload.source, upload.content_type, document_sha256=upload.sha256)
+        if debug:
+            result = {**result, "_timings": timings.as_dict()}
+        status_code = 200
+        return JSONResponse(content=result, headers={"X-Result-Cache": cache_status, "Server-Timing": timings.server_timing_header()})
 
     except HTTPException as e:
+        status_code = e.status_code
         raise e
     except Exception as e:
         print(f"Erro inesperado no endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {e}")
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            cleanup_temp_file(temp_file_path)
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.started, endpoint="analyze_edital", status=status_code)
+        if upload is not None:
+            upload.cleanup()
+        if admitted is not None:
+            await admission.release(admitted)
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+@app.post("/analyze_edital/stream/", openapi_extra=EDITAL_FILE_FORM)
+async def analyze_edital_stream_endpoint(
+    request: Request,
+    format: str = Query("ndjson", description='Formato do stream: "ndjson" (uma linha JSON por evento) ou "sse" (Server-Sent Events).'),
+    debug: bool = Query(False, description='Inclui no evento "fim" o detalhamento de tempos e contadores (_timings).')
+):
+    """
+    Versão em streaming de /analyze_edital/: os eventos são enviados à medida que as etapas terminam,
+    sem esperar o pipeline completo. Cada evento tem um tipo e um objeto de dados:
+    "etapa" (início/fim de cada etapa), "extracao" (páginas extraídas / total), "analise_estrategica"
+    (o campo analysis_strategic, logo após o Gemini), "requisito" (cada linha do mapa_atendimento)
+    e, por último, "fim" ({"cache", "requisitos"}) ou "erro" ({"status_code", "detail"}).
+    Em NDJSON, cada linha é {"event": tipo, "data": dados}; em SSE, "event: tipo" e "data: dados".
+    Fechar a conexão cancela a análise. Com o servidor cheio, responde 503 com Retry-After antes do stream.
+    """
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato de stream inválido. Use um de: {', '.join(STREAM_FORMATS)}.")
+    check_content_length(request)
+
+    timings = start_request()
+    admitted = await admission.acquire()
+    try:
+        [upload] = await receive_uploads(request, "edital_file", content_types=SUPPORTED_CONTENT_TYPES)
+    except BaseException:
+        await admission.release(admitted)
+        raise
+
+    def encode(event: str, data) -> str:
+        if format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+    async def stream_events():
+        status_code = 200
+        try:
+            async for event, data in analyze_document_events(upload.source, upload.content_type, upload.sha256):
+                if event == "erro":
+                    status_code = data["status_code"]
+                if event == "fim" and debug:
+                    data = {**data, "_timings": timings.as_dict()}
+                yield encode(event, data)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - timings.started, endpoint="analyze_edital_stream", status=status_code)
+            upload.cleanup()
+            await admission.release(admitted)
+
+    # no-cache e X-Accel-Buffering evitam que proxies segurem os eventos até o fim da resposta
+    return StreamingResponse(stream_events(), media_type=STREAM_FORMATS[format],
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/batch/analyze_editais/", openapi_extra=upload_form_openapi("edital_files", "Arquivos dos editais (PDF ou DOCX).", multiple=True))
+async def analyze_editais_batch_endpoint(request: Request):
+    """
+    Análise em lote: a planilha de ativos e os embeddings do catálogo são carregados uma única vez
+    e a extração de texto dos próximos editais acontece enquanto o Gemini analisa o atual.
+    A resposta é um stream NDJSON (application/x-ndjson) com uma linha por edital, enviada assim que
+    ele termina: {"indice", "arquivo", "status": "ok"|"erro", "cache", "resultado" | "erro"}.
+    O erro de um edital não interrompe os demais. O lote ocupa uma vaga de análise do início ao fim do stream
+    (com o servidor cheio, responde 503 com Retry-After antes de receber os arquivos).
+    """
+    check_content_length(request, max_files=BATCH_MAX_FILES)
+    admitted = await admission.acquire()
+
+    # Cada edital é gravado uma única vez, direto do corpo da requisição para o diretório do lote
+    batch_dir = os.path.join(BATCH_FILES_DIR, uuid.uuid4().hex)
+    try:
+        uploads = await receive_uploads(request, "edital_files", max_files=BATCH_MAX_FILES, spool_threshold=0, spool_dir=batch_dir)
+    except BaseException:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        await admission.release(admitted)
+        raise
+    documents = []
+    for index, upload in enumerate(uploads):
+        extension = os.path.splitext(upload.filename or "")[1]
+        documents.append(BatchDocument(upload.filename or f"edital_{index}{extension}", upload.path, upload.content_type))
+
+    async def stream_results():
+        try:
+            async for entry in analyze_batch(documents):
+                yield json.dumps(entry, ensure_ascii=False) + "\n"
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            await admission.release(admitted)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/jobs/analyze_edital/", status_code=202, openapi_extra=EDITAL_FILE_FORM)
+async def submit_analysis_job(
+    request: Request,
+    priority: int = Query(0, description="Prioridade do job (maior valor é processado primeiro).")
+):
+    """
+    Versão assíncrona de /analyze_edital/ para editais longos.
+    Enfileira a análise e retorna imediatamente o job_id; acompanhe em GET /jobs/{job_id}.
+    Com a fila de jobs cheia ou o servidor sem vaga para receber o edital, responde 503 com Retry-After
+    antes de ler o arquivo.
+    """
+    check_content_length(request)
+    if job_queue.full():
+        raise CapacityExceeded(503, "Fila de análises cheia. Tente novamente mais tarde.", SCHEDULER_RETRY_AFTER_SECONDS)
+
+    # A vaga de análise cobre só o recebimento do edital e o registro do job (a análise roda depois, na fila)
+    admitted = await admission.acquire()
+    upload = None
+    try:
+        # O job roda depois da requisição: o edital vai sempre para um arquivo em JOBS_FILES_DIR
+        [upload] = await receive_uploads(request, "edital_file", content_types=SUPPORTED_CONTENT_TYPES, spool_threshold=0, spool_dir=JOBS_FILES_DIR)
+        job_id = await run_in_executor("jobs", job_store.create, upload.filename, upload.content_type, upload.path, priority)
+        try:
+            job_queue.submit(job_id, priority)
+        except JobQueueFull:
+            await run_in_executor("jobs", job_store.update, job_id, status=JOB_FAILED, error="Fila de jobs cheia.")
+            raise CapacityExceeded(503, "Fila de análises cheia. Tente novamente mais tarde.", SCHEDULER_RETRY_AFTER_SECONDS)
+    except BaseException:
+        if upload is not None:
+            upload.cleanup() # Sem job na fila, o arquivo não seria removido por ninguém
+        raise
+    finally:
+        await admission.release(admitted)
+
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}", "result_url": f"/jobs/{job_id}/result"}
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Estado do job, progresso por etapa do pipeline e, se concluído, o resultado."""
+    job = await run_in_executor("jobs", job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "priority": job["priority"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result": job["result"],
+    }
+
+@app.get("/jobs/{job_id}/result")
+async def get_analysis_job_result(job_id: str):
+    """Resultado de um job concluído (mesmo formato de /analyze_edital/), lido do job store sem recomputar."""
+    job = await run_in_executor("jobs", job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=422, detail=f"Job falhou: {job['error']}")
+    if job["status"] != JOB_DONE:
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"], "progress": job["progress"]})
+    return JSONResponse(content=job["result"])
+
+@app.post("/rematch/")
+async def rematch_endpoint():
+    """
+    Recruza os editais já analisados com a planilha de ativos atual (ex.: depois de cadastrar um novo atestado),
+    a partir das extrações guardadas: sem reenviar o PDF, sem OCR e sem Gemini. Só as linhas novas/alteradas
+    da planilha geram embeddings e só os requisitos cujo melhor ativo pode ter mudado são recalculados.
+    Retorna, por edital recruzado, as mudanças de status ("mudancas"); os resultados atualizados passam
+    a ser servidos pelo cache de /analyze_edital/. Ocupa uma vaga de análise (503 com Retry-After se o servidor estiver cheio).
+    """
+    timings = start_request()
+    status_code = 500
+    admitted = None
+    try:
+        admitted = await admission.acquire()
+        result = await rematch_stored_analyses()
+        status_code = 200
+        return JSONResponse(content=result, headers={"Server-Timing": timings.server_timing_header()})
+    except HTTPException as e:
+        status_code = e.status_code
+        raise e
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.started, endpoint="rematch", status=status_code)
+        if admitted is not None:
+            await admission.release(admitted)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métricas do processo (latência por etapa, páginas OCR, tokens, lotes de embedding, caches) no formato do Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Para rodar localmente com Uvicorn (para testes)
 # if __name__ == "__main__":
@@ -126,4 +333,4 @@ async def analyze_edital_endpoint(
 #     os.environ["GOOGLE_CLOUD_LOCATION"] = "us-central1" # Ou sua região para Gemini
 #     os.environ["GOOGLE_SHEET_URL"] = "https://docs.google.com/spreadsheets/d/13hwbIhqHSqcF8oPmCs8OYo3KY732APIVmKRfeBf9BtM/edit?gid=1116222026#gid=1116222026"
 #     os.environ["GOOGLE_SHEET_TAB_NAME"] = "DataFunction"
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+#     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,204 @@
+# metrics.py
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas em formato texto do Prometheus, sem dependências externas.
+# Contadores e histogramas são globais ao processo; cada requisição também acumula o próprio
+# detalhamento (RequestTimings) via contextvars, exposto no header Server-Timing.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Counter:
+    """Contador monotônico com rótulos."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Histograma com buckets cumulativos, soma e contagem por combinação de rótulos."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+def register_collector(name: str, documentation: str, kind: str, labelname: str, collect):
+    """
+    Expõe um dicionário de estatísticas já mantido por outro módulo (ex.: get_sheet_cache_stats)
+    como uma métrica com um rótulo por chave. `collect()` é chamado a cada leitura de /metrics.
+    """
+    _collectors.append((name, documentation, kind, labelname, collect))
+
+
+def render_metrics() -> str:
+    """Todas as métricas no formato de exposição texto do Prometheus (versão 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for name, documentation, kind, labelname, collect in _collectors:
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"Aviso: falha ao coletar a métrica {name}: {e}")
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_format_labels({labelname: key})} {value}" for key, value in sorted(values.items())
+                     if isinstance(value, (int, float)))
+    return "\n".join(lines) + "\n"
+
+
+# Métricas do pipeline
+REQUEST_SECONDS = Histogram("xanalysis_request_duration_seconds", "Duração das requisições de análise.", ("endpoint", "status"))
+STAGE_SECONDS = Histogram("xanalysis_stage_duration_seconds", "Duração de cada etapa do pipeline de análise.", ("stage",))
+RESULT_CACHE_TOTAL = Counter("xanalysis_result_cache_total", "Consultas ao cache de resultados, por resultado.", ("result",))
+PDF_PAGES_TOTAL = Counter("xanalysis_pdf_pages_total", "Páginas de PDF processadas, por método (texto direto ou OCR).", ("method",))
+OCR_CACHE_TOTAL = Counter("xanalysis_ocr_cache_total", "Imagens de página enviadas ao OCR, por resultado no cache de OCR.", ("result",))
+GEMINI_CALLS_TOTAL = Counter("xanalysis_gemini_calls_total", "Chamadas ao Gemini.", ("model",))
+PROMPT_PRUNING_TOTAL = Counter("xanalysis_prompt_pruning_total", "Editais enviados ao Gemini só com as seções relevantes (pruned) ou completos (full).", ("result",))
+PROMPT_CHARS_TOTAL = Counter("xanalysis_prompt_chars_total", "Caracteres do edital antes (original) e depois (sent) da poda de seções.", ("kind",))
+GEMINI_TOKENS_TOTAL = Counter("xanalysis_gemini_tokens_total", "Tokens enviados (prompt) e recebidos (response) do Gemini.", ("model", "kind"))
+EMBEDDING_BATCHES_TOTAL = Counter("xanalysis_embedding_batches_total", "Lotes enviados ao modelo de embedding.", ("model",))
+EMBEDDING_TEXTS_TOTAL = Counter("xanalysis_embedding_texts_total", "Textos enviados ao modelo de embedding.", ("model",))
+EMBEDDING_RETRIES_TOTAL = Counter("xanalysis_embedding_retries_total", "Novas tentativas após erro transitório no embedding.", ("model",))
+EMBEDDING_CACHE_TOTAL = Counter("xanalysis_embedding_cache_total", "Consultas aos caches de embeddings (ativos e requisitos), por resultado.", ("cache", "result"))
+REMATCH_REQUIREMENTS_TOTAL = Counter("xanalysis_rematch_requirements_total", "Requisitos de editais guardados no recruzamento com a planilha atualizada: recalculados ou reaproveitados.", ("result",))
+SCHEDULER_REJECTED_TOTAL = Counter("xanalysis_scheduler_rejected_total", "Requisições recusadas por falta de capacidade (cota do Vertex AI, concorrência ou fila de análises).", ("resource", "status"))
+SCHEDULER_WAIT_SECONDS = Histogram("xanalysis_scheduler_wait_seconds", "Espera por capacidade antes de executar (cota, concorrência, vaga de OCR ou de análise).", ("resource",))
+EXTERNAL_CALL_SECONDS = Histogram("xanalysis_external_call_duration_seconds", "Duração das chamadas a serviços externos.", ("service",))
+
+
+class RequestTimings:
+    """Detalhamento de uma requisição: duração de cada etapa e contadores (páginas, tokens, lotes, cache)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+                "counts": dict(self.counts),
+            }
+
+    def server_timing_header(self) -> str:
+        """Valor do header Server-Timing (exibido nas ferramentas de desenvolvedor dos navegadores)."""
+        with self._lock:
+            stages = dict(self.stages)
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    """Inicia o detalhamento da requisição atual (herdado por tasks e pelos pools de executors.run_in_executor)."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings() -> RequestTimings | None:
+    return _current_timings.get()
+
+
+def count(name: str, amount: float = 1):
+    """Soma um contador ao detalhamento da requisição atual (sem efeito fora de uma requisição)."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_count(name, amount)
+
+
+@contextmanager
+def span(stage: str):
+    """Mede uma etapa: alimenta o histograma xanalysis_stage_duration_seconds e o detalhamento da requisição."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add_stage(stage, seconds)
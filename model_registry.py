@@ -0,0 +1,97 @@
+# model_registry.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from config import GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME, VERTEX_API_TRANSPORT
+
+# Clientes de modelo do Vertex AI, criados uma vez por processo: {(tipo, nome do modelo): cliente}
+# Cada cliente mantém o canal (gRPC/HTTP) com o endpoint do Vertex AI, reaproveitado entre requisições
+_models = {}
+_lock = threading.Lock()
+# (projeto, região) do vertexai.init adiado para a criação do primeiro cliente (FAST_STARTUP)
+_deferred_init = None
+
+# O SDK do Vertex AI (mais de 1 s de import) só é carregado ao criar o primeiro cliente ou no vertexai.init;
+# servidores que só respondem do cache, /metrics ou /jobs não chegam a importá-lo
+if TYPE_CHECKING:
+    from vertexai.generative_models import GenerativeModel
+    from vertexai.language_models import TextEmbeddingModel
+
+
+def initialize_vertex_ai(project_id: str, location: str, deferred: bool = False):
+    """
+    Inicializa o SDK do Vertex AI (transporte configurável em VERTEX_API_TRANSPORT; gRPC reaproveita a conexão HTTP/2).
+    Com deferred=True, só guarda o projeto/região: o SDK é importado e inicializado ao criar o primeiro cliente.
+    """
+    global _deferred_init
+    if deferred:
+        with _lock:
+            _deferred_init = (project_id, location)
+        return
+    import vertexai
+
+    vertexai.init(project=project_id, location=location, api_transport=VERTEX_API_TRANSPORT or None)
+
+
+def _get_model(kind: str, model_name: str, factory):
+    global _deferred_init
+    key = (kind, model_name)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            if _deferred_init is not None:
+                initialize_vertex_ai(*_deferred_init)
+                _deferred_init = None
+            model = factory(model_name)
+            _models[key] = model
+        return model
+
+
+def get_generative_model(model_name: str = GEMINI_MODEL_NAME) -> GenerativeModel:
+    """Cliente Gemini compartilhado para o modelo informado."""
+    def create(name: str) -> GenerativeModel:
+        from vertexai.generative_models import GenerativeModel
+        return GenerativeModel(name)
+
+    return _get_model("generative", model_name, create)
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME) -> TextEmbeddingModel:
+    """Modelo de embedding compartilhado (from_pretrained consulta o Vertex AI; feito uma única vez)."""
+    def create(name: str) -> TextEmbeddingModel:
+        from vertexai.language_models import TextEmbeddingModel
+        return TextEmbeddingModel.from_pretrained(name)
+
+    return _get_model("embedding", model_name, create)
+
+
+def set_model(kind: str, model_name: str, model):
+    """Registra um cliente já construído ("generative" ou "embedding"), ex.: implementações locais no benchmark."""
+    with _lock:
+        _models[(kind, model_name)] = model
+
+
+def preload_models():
+    """Cria os clientes dos modelos configurados (sem chamadas de inferência)."""
+    get_generative_model()
+    get_embedding_model()
+
+
+def warm_up_models():
+    """
+    Faz uma chamada mínima a cada modelo, para que a primeira requisição após um cold start
+    não pague a criação do canal, a autenticação e o handshake TLS.
+    """
+    from embedding_client import get_embedding_client
+
+    started = time.perf_counter()
+    get_generative_model().generate_content("ok", generation_config={"max_output_tokens": 1})
+    gemini_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    get_embedding_client(EMBEDDING_MODEL_NAME).embed(["ok"])
+    embedding_seconds = time.perf_counter() - started
+    print(f"Modelos aquecidos: {GEMINI_MODEL_NAME} em {gemini_seconds:.2f}s, {EMBEDDING_MODEL_NAME} em {embedding_seconds:.2f}s.")
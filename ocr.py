@@ -0,0 +1,294 @@
+# ocr.py
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from config import (
+    OCR_TESSERACT_PATH, OCR_ENGINE, OCR_LANG, OCR_DPI, OCR_GRAYSCALE, OCR_MIN_TEXT_CHARS,
+    OCR_MIN_IMAGE_AREA_RATIO, OCR_CACHE_DIR, OCR_CACHE_MAX_ENTRIES, OCR_TIMEOUT_SECONDS, OCR_THREADS,
+)
+
+# OCR das páginas (ou trechos de página) sem camada de texto. Roda dentro dos workers do pool
+# de processos do pdf_processor; o cache em disco é compartilhado entre os workers.
+
+_MEMORY_CACHE_ENTRIES = 256
+
+# PyMuPDF é importado no primeiro uso (nos workers), não no import do servidor
+if TYPE_CHECKING:
+    import fitz
+
+
+def find_ocr_regions(page: fitz.Page, text: str) -> list[fitz.Rect | None]:
+    """
+    Trechos da página que precisam de OCR. [None] significa a página inteira (sem camada de texto
+    útil, ex.: página escaneada com só o número da página como texto). Em páginas mistas, retorna as
+    imagens grandes sem texto por cima (ex.: uma declaração escaneada colada no meio do edital).
+    """
+    if len(text.strip()) < OCR_MIN_TEXT_CHARS:
+        return [None]
+
+    import fitz
+
+    page_area = abs(page.rect)
+    if not page_area:
+        return []
+    regions = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or abs(rect) / page_area < OCR_MIN_IMAGE_AREA_RATIO:
+            continue
+        if any(rect in region for region in regions):
+            continue
+        # Imagem com texto por cima (ex.: fundo/marca d'água de página já digital) não precisa de OCR
+        if page.get_text("text", clip=rect).strip():
+            continue
+        regions.append(rect)
+    return regions
+
+
+def render_region(page: fitz.Page, clip: fitz.Rect | None = None) -> fitz.Pixmap:
+    """Renderiza a página (ou o trecho) na resolução do OCR; tons de cinza reduzem 3x os bytes a processar."""
+    import fitz
+
+    colorspace = fitz.csGRAY if OCR_GRAYSCALE else fitz.csRGB
+    pixmap = page.get_pixmap(dpi=OCR_DPI, colorspace=colorspace, clip=clip, alpha=False)
+    pixmap.set_dpi(OCR_DPI, OCR_DPI) # Gravado no PNG; o Tesseract usa para estimar o tamanho da fonte
+    return pixmap
+
+
+def load_image(data: bytes) -> fitz.Pixmap:
+    """Imagem embutida (PNG, JPEG, TIFF...) no mesmo formato de cor das páginas renderizadas. Levanta erro se o formato não é suportado."""
+    import fitz
+
+    pixmap = fitz.Pixmap(data)
+    if pixmap.alpha:
+        pixmap = fitz.Pixmap(pixmap, 0)
+    if OCR_GRAYSCALE and pixmap.n != 1:
+        pixmap = fitz.Pixmap(fitz.csGRAY, pixmap)
+    elif not OCR_GRAYSCALE and pixmap.n not in (1, 3):
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    return pixmap
+
+
+def image_key(pixmap: fitz.Pixmap) -> str:
+    """Hash da imagem renderizada (mesma capa/anexo em editais diferentes gera a mesma chave)."""
+    digest = hashlib.sha256()
+    digest.update(f"{pixmap.width}x{pixmap.height}x{pixmap.n}|{OCR_LANG}|".encode("utf-8"))
+    digest.update(pixmap.samples_mv)
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """Texto reconhecido por hash da imagem: memória do processo + arquivos em disco compartilhados entre workers."""
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_entries: int = OCR_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path) # Marca como usado recentemente (para a remoção por mtime)
+        except (FileNotFoundError, OSError):
+            return None
+        self._remember(key, text)
+        return text
+
+    def put(self, key: str, text: str):
+        self._remember(key, text)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o cache de OCR: {e}")
+            return
+        self._writes += 1
+        if self.max_entries and self._writes % 100 == 0:
+            self._evict_disk()
+
+    def _remember(self, key: str, text: str):
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > _MEMORY_CACHE_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Remove os textos menos usados recentemente quando o disco passa do limite de entradas."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except FileNotFoundError:
+                        pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_tess_api = None
+_tess_lock = threading.Lock()
+_cpu_slots = None
+
+
+def set_cpu_slots(semaphore):
+    """
+    Initializer dos workers: semáforo entre processos com as vagas de CPU do OCR (OCR_CPU_SLOTS).
+    O Tesseract roda com OCR_THREADS threads OpenMP, para que vagas x threads não passe dos núcleos.
+    """
+    global _cpu_slots
+    _cpu_slots = semaphore
+    os.environ["OMP_THREAD_LIMIT"] = str(max(1, OCR_THREADS))
+
+
+def get_ocr_cache() -> OcrCache | None:
+    """Cache de OCR do processo (None se OCR_CACHE_DIR estiver vazio)."""
+    global _cache
+    if _cache is None and OCR_CACHE_DIR:
+        _cache = OcrCache()
+    return _cache
+
+
+def _tesseract_cmd() -> str:
+    return OCR_TESSERACT_PATH or "tesseract"
+
+
+def _get_tesserocr_api():
+    """
+    API C do Tesseract (pacote opcional tesserocr), criada uma vez por worker: o modelo de idioma
+    é carregado uma única vez e reaproveitado em todas as páginas. None se o pacote não estiver instalado.
+    """
+    global _tess_api
+    if _tess_api is None:
+        try:
+            import tesserocr
+        except ImportError:
+            return None
+        # tessdata ao lado do executável configurado (Windows/instalações locais); senão, o padrão do sistema
+        tessdata = os.getenv("TESSDATA_PREFIX")
+        if not tessdata and OCR_TESSERACT_PATH:
+            tessdata = os.path.join(os.path.dirname(OCR_TESSERACT_PATH), "tessdata")
+        _tess_api = tesserocr.PyTessBaseAPI(path=tessdata, lang=OCR_LANG) if tessdata else tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+    return _tess_api
+
+
+def _ocr_with_api(api, pixmaps: list[fitz.Pixmap]) -> list[str]:
+    from PIL import Image
+
+    texts = []
+    with _tess_lock:
+        for pixmap in pixmaps:
+            mode = "L" if pixmap.n == 1 else "RGB"
+            api.SetImage(Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples))
+            api.SetSourceResolution(OCR_DPI)
+            texts.append(api.GetUTF8Text())
+    return texts
+
+
+def _ocr_with_cli(pixmaps: list[fitz.Pixmap]) -> list[str]:
+    """
+    Uma única execução do binário do Tesseract para todas as imagens (lista de arquivos na entrada):
+    o processo e o modelo de idioma são carregados uma vez por lote, não uma vez por página.
+    O Tesseract separa as páginas da saída com form feed (\\f).
+    """
+    with tempfile.TemporaryDirectory(prefix="xanalysis_ocr_") as work_dir:
+        paths = []
+        for index, pixmap in enumerate(pixmaps):
+            path = os.path.join(work_dir, f"{index:05d}.png")
+            pixmap.save(path)
+            paths.append(path)
+        list_path = os.path.join(work_dir, "imagens.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(paths) + "\n")
+
+        completed = subprocess.run(
+            [_tesseract_cmd(), list_path, "stdout", "-l", OCR_LANG],
+            capture_output=True, timeout=OCR_TIMEOUT_SECONDS * len(pixmaps), check=True,
+        )
+    texts = completed.stdout.decode("utf-8", errors="replace").split("\f")
+    if len(texts) < len(pixmaps):
+        raise RuntimeError(f"Tesseract retornou {len(texts)} páginas para {len(pixmaps)} imagens.")
+    return texts[:len(pixmaps)]
+
+
+def _run_engine(pixmaps: list[fitz.Pixmap]) -> list[str]:
+    if _cpu_slots is None:
+        return _run_selected_engine(pixmaps)
+    with _cpu_slots:
+        return _run_selected_engine(pixmaps)
+
+
+def _run_selected_engine(pixmaps: list[fitz.Pixmap]) -> list[str]:
+    if OCR_ENGINE in ("auto", "tesserocr"):
+        api = _get_tesserocr_api()
+        if api is not None:
+            return _ocr_with_api(api, pixmaps)
+        if OCR_ENGINE == "tesserocr":
+            raise RuntimeError("OCR_ENGINE=tesserocr, mas o pacote tesserocr não está instalado.")
+    return _ocr_with_cli(pixmaps)
+
+
+def ocr_images(pixmaps: list[fitz.Pixmap]) -> tuple[list[str], int]:
+    """
+    Reconhece o texto das imagens, consultando antes o cache por hash da imagem; as que faltam
+    vão ao Tesseract em um único lote (repetido imagem a imagem se o lote falhar). Levanta erro se
+    alguma imagem não puder ser reconhecida. Retorna (textos na ordem das imagens, acertos no cache).
+    """
+    if not pixmaps:
+        return [], 0
+    cache = get_ocr_cache()
+    keys = [image_key(pixmap) for pixmap in pixmaps]
+    texts = [cache.get(key) if cache is not None else None for key in keys]
+    missing = {}
+    for index, (key, text) in enumerate(zip(keys, texts)):
+        if text is None:
+            missing.setdefault(key, []).append(index) # A mesma imagem repetida no lote é reconhecida uma vez
+
+    if missing:
+        unique = [pixmaps[indexes[0]] for indexes in missing.values()]
+        try:
+            recognized = _run_engine(unique)
+        except Exception as e:
+            if len(unique) == 1:
+                raise
+            # Uma imagem problemática derruba o lote inteiro no binário: repete imagem a imagem,
+            # e a que falhar de novo propaga o erro (nunca devolve texto vazio no lugar do OCR)
+            print(f"Aviso: falha no OCR de um lote de {len(unique)} imagens ({e}); repetindo imagem a imagem.")
+            recognized = [_run_engine([pixmap])[0] for pixmap in unique]
+        for (key, indexes), text in zip(missing.items(), recognized):
+            if cache is not None:
+                cache.put(key, text)
+            for index in indexes:
+                texts[index] = text
+    return texts, len(pixmaps) - len(missing)
@@ -1,48 +1,204 @@
 # pdf_processor.py
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-import io
+from __future__ import annotations
+
 import os
+import math
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from metrics import PDF_PAGES_TOTAL, OCR_CACHE_TOTAL, count
+from ocr import find_ocr_regions, render_region, ocr_images, set_cpu_slots
+from config import PDF_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_SHARD_PAGES, OCR_CPU_SLOTS, OCR_BATCH_IMAGES
+
+# PyMuPDF é importado no primeiro PDF aberto (open_pdf), não no import do servidor
+if TYPE_CHECKING:
+    import fitz
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
 
-# Configura o caminho do Tesseract se definido em config.py
-# No ambiente Docker, Tesseract já estará no PATH
-if os.getenv("OCR_TESSERACT_PATH"):
-    pytesseract.pytesseract.tesseract_cmd = os.getenv("OCR_TESSERACT_PATH")
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Pool de processos (criado sob demanda, um por processo da API) para extração/OCR de páginas."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            # 'spawn' evita herdar locks de threads do servidor (uvicorn, atualização da planilha) via fork
+            context = multiprocessing.get_context("spawn")
+            # Vagas de CPU do OCR compartilhadas pelos workers (extração de texto direto não disputa as vagas)
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=context, initializer=set_cpu_slots,
+                                                initargs=(context.BoundedSemaphore(max(1, OCR_CPU_SLOTS)),))
+        return _pdf_executor
 
-def extract_text_from_pdf(pdf_file_path: str) -> str:
+def shutdown_pdf_executor():
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False, cancel_futures=True)
+            _pdf_executor = None
+
+def _extract_pages(document: fitz.Document, first_page: int, last_page: int) -> tuple[list[str], dict]:
     """
-    Extrai texto de um PDF. Tenta extrair texto diretamente.
-    Se não for encontrado texto, tenta OCR para cada página.
+    Extrai o texto das páginas [first_page, last_page). Páginas sem camada de texto são reconhecidas
+    por OCR inteiras; em páginas mistas, só as imagens grandes sem texto passam por OCR e o resultado
+    é acrescentado ao texto da página. As imagens vão ao OCR em lotes de até OCR_BATCH_IMAGES, e cada
+    lote é liberado antes de renderizar o próximo. Falha no OCR é propagada (ver ocr.ocr_images).
+    Retorna (textos, estatísticas: páginas com OCR e acertos no cache de OCR).
     """
-    document = fitz.open(pdf_file_path)
-    full_text = []
+    texts = []
+    batch = [] # (posição da página na faixa, substitui o texto da página?, imagem renderizada)
+    stats = {"ocr_pages": 0, "ocr_images": 0, "ocr_cache_hits": 0}
+    ocr_positions = set()
+
+    def flush():
+        try:
+            ocr_texts, cache_hits = ocr_images([pixmap for _, _, pixmap in batch])
+        except Exception as e:
+            raise RuntimeError(f"Falha no OCR das páginas {first_page + 1}-{last_page}: {e}") from e
+        for (position, whole_page, _), ocr_text in zip(batch, ocr_texts):
+            texts[position] = ocr_text if whole_page else f"{texts[position]}\n{ocr_text}"
+            ocr_positions.add(position)
+        stats["ocr_images"] += len(batch)
+        stats["ocr_cache_hits"] += cache_hits
+        batch.clear()
 
-    for page_num in range(document.page_count):
+    for page_num in range(first_page, last_page):
         page = document.load_page(page_num)
         text = page.get_text("text")
+        texts.append(text)
+        for clip in find_ocr_regions(page, text):
+            batch.append((len(texts) - 1, clip is None, render_region(page, clip)))
+            if len(batch) >= max(1, OCR_BATCH_IMAGES):
+                flush()
+    if batch:
+        flush()
+    stats["ocr_pages"] = len(ocr_positions)
+    return texts, stats
+
+def open_pdf(source: str | bytes | bytearray) -> fitz.Document:
+    """Abre o PDF a partir do caminho do arquivo ou direto do conteúdo em memória."""
+    import fitz
+
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def _page_count(source: str | bytes | bytearray) -> int:
+    document = open_pdf(source)
+    try:
+        return document.page_count
+    finally:
+        document.close()
+
+def _extract_page_range(source: str | bytes | bytearray, first_page: int, last_page: int) -> tuple[int, list[str], dict]:
+    """Executado em um worker: abre o documento e extrai as páginas [first_page, last_page)."""
+    document = open_pdf(source)
+    try:
+        texts, stats = _extract_pages(document, first_page, last_page)
+        return first_page, texts, stats
+    finally:
+        document.close()
+
+def _page_shards(page_count: int, shard_pages: int = PDF_SHARD_PAGES) -> list[tuple[int, int]]:
+    """Divide o documento em faixas de páginas contíguas, distribuídas entre os workers."""
+    shard_size = max(1, min(shard_pages, math.ceil(page_count / PDF_WORKERS)))
+    return [(first, min(first + shard_size, page_count)) for first in range(0, page_count, shard_size)]
+
+def _source_shards(source: str | bytes | bytearray, page_count: int) -> list[tuple[int, int]]:
+    """
+    Faixas para o pool: um PDF em memória é enviado inteiro a cada worker, então é dividido em uma
+    faixa por worker para limitar as cópias; em arquivo, cada worker abre o caminho e as faixas seguem PDF_SHARD_PAGES.
+    """
+    if isinstance(source, str):
+        return _page_shards(page_count)
+    return _page_shards(page_count, shard_pages=page_count)
+
+def extract_text_from_pdf(source: str | bytes | bytearray, parallel: bool | None = None) -> str:
+    """
+    Extrai texto de um PDF. Tenta extrair texto diretamente; páginas escaneadas e imagens
+    sem texto em páginas mistas passam por OCR (ver ocr.py).
+
+    Em modo paralelo, o documento é dividido em faixas de páginas e cada faixa é aberta e
+    processada (texto direto e OCR na mesma passada) em um worker do pool de processos.
+    A ordem das páginas é preservada. Com parallel=None, o modo paralelo é usado
+    para documentos com pelo menos PDF_PARALLEL_MIN_PAGES páginas.
+    `source` é o caminho do arquivo ou o conteúdo do PDF em memória.
+    """
+    document = open_pdf(source)
+    page_count = document.page_count
+
+    if parallel is None:
+        parallel = PDF_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+
+    if not parallel:
+        try:
+            texts, stats = _extract_pages(document, 0, page_count)
+        finally:
+            document.close()
+        _record_pages(page_count, [stats])
+        return "\n".join(texts)
 
-        if not text.strip(): # Se a página estiver vazia ou com espaços em branco, tenta OCR
-            pix = page.get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Tenta OCR em português
-            ocr_text = pytesseract.image_to_string(img, lang='por')
-            full_text.append(ocr_text)
-        else:
-            full_text.append(text)
-    
     document.close()
-    return "\n".join(full_text)
-
-def save_uploaded_file_temp(uploaded_file_content: bytes, filename: str) -> str:
-    """Salva o conteúdo do arquivo enviado em um arquivo temporário e retorna o caminho."""
-    temp_dir = "/tmp" # Diretório temporário padrão no Cloud Run
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_file_path = os.path.join(temp_dir, filename)
-    with open(temp_file_path, "wb") as f:
-        f.write(uploaded_file_content)
-    return temp_file_path
+    executor = get_pdf_executor()
+    futures = [executor.submit(_extract_page_range, source, first, last) for first, last in _source_shards(source, page_count)]
+    return _join_shards(page_count, [future.result() for future in futures])
+
+async def extract_text_from_pdf_async(source: str | bytes | bytearray, on_progress=None) -> str:
+    """
+    Versão não bloqueante de extract_text_from_pdf para o endpoint: todo o parsing e OCR
+    roda no pool de processos, e o event loop apenas aguarda os resultados das faixas.
+    `on_progress(páginas extraídas, total de páginas)` é chamado a cada faixa concluída.
+    As faixas seguem _source_shards (um PDF em memória é dividido em uma faixa por worker).
+    """
+    # Abrir o documento faz o parsing da estrutura do PDF: fora do event loop, para não travar outras requisições
+    page_count = await asyncio.to_thread(_page_count, source)
+
+    if PDF_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        shards = _source_shards(source, page_count)
+    else:
+        shards = [(0, page_count)]
+
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+    futures = [loop.run_in_executor(executor, _extract_page_range, source, first, last) for first, last in shards]
+    try:
+        results = []
+        pages_done = 0
+        for future in asyncio.as_completed(futures):
+            result = await future
+            results.append(result)
+            pages_done += len(result[1])
+            if on_progress is not None:
+                on_progress(pages_done, page_count)
+    finally:
+        # Cliente desistiu (ou faixa falhou): as faixas que ainda não começaram não chegam a rodar
+        for future in futures:
+            future.cancel()
+    return _join_shards(page_count, results)
+
+def _join_shards(page_count: int, results: list[tuple[int, list[str], dict]]) -> str:
+    """Junta o texto das faixas na ordem original das páginas."""
+    pages_text = [""] * page_count
+    for first_page, texts, _ in results:
+        pages_text[first_page:first_page + len(texts)] = texts
+    _record_pages(page_count, [stats for _, _, stats in results])
+    return "\n".join(pages_text)
+
+def _record_pages(page_count: int, shard_stats: list[dict]):
+    """Páginas extraídas por texto direto e por OCR e uso do cache de OCR (métricas do processo e da requisição atual)."""
+    ocr_pages = sum(stats["ocr_pages"] for stats in shard_stats)
+    ocr_images = sum(stats["ocr_images"] for stats in shard_stats)
+    cache_hits = sum(stats["ocr_cache_hits"] for stats in shard_stats)
+    PDF_PAGES_TOTAL.inc(page_count - ocr_pages, method="text")
+    PDF_PAGES_TOTAL.inc(ocr_pages, method="ocr")
+    OCR_CACHE_TOTAL.inc(cache_hits, result="hit")
+    OCR_CACHE_TOTAL.inc(ocr_images - cache_hits, result="miss")
+    count("pdf_pages_text", page_count - ocr_pages)
+    count("pdf_pages_ocr", ocr_pages)
+    if ocr_images:
+        count("ocr_cache_hits", cache_hits)
 
 def cleanup_temp_file(file_path: str):
     """Remove um arquivo temporário."""
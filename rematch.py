@@ -0,0 +1,242 @@
+# rematch.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from asset_catalog import get_asset_catalog
+from ai_analyzer import (
+    collect_requirements, requirement_type_of, rank_requirements, build_match_row, get_asset_embeddings, get_asset_matcher,
+    get_matching_version, EXTRACTION_PROMPT_VERSION,
+)
+from extraction_store import ExtractionStore, make_extraction_key
+from vector_index import l2_normalize
+from metrics import REMATCH_REQUIREMENTS_TOTAL, count
+from config import (
+    EXTRACTION_STORE_DIR, EXTRACTION_STORE_MAX_ENTRIES, GEMINI_MODEL_NAME, EMBEDDING_MODEL_NAME, MATCH_MODE, MATCH_TOP_K,
+    MATCH_SHORTLIST_SIZE,
+)
+
+# Recruzamento incremental: quando a planilha de ativos muda (ex.: um novo atestado), os editais já
+# analisados são cruzados de novo a partir das extrações guardadas, sem OCR nem Gemini. Só as linhas
+# novas/alteradas da planilha geram embeddings, e só os requisitos cujo melhor ativo pode ter mudado
+# são reclassificados.
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_extraction_store() -> ExtractionStore | None:
+    """Armazenamento das extrações (único por processo); None se EXTRACTION_STORE_DIR estiver vazio."""
+    global _store
+    with _store_lock:
+        if _store is None and EXTRACTION_STORE_DIR:
+            _store = ExtractionStore(EXTRACTION_STORE_DIR, EXTRACTION_STORE_MAX_ENTRIES)
+        return _store
+
+
+def asset_fingerprints(assets_df: pd.DataFrame) -> list[str]:
+    """
+    Impressão digital de cada linha da planilha (todas as colunas, como texto): muda quando qualquer
+    campo usado no cruzamento ou na evidência muda, e não depende da posição da linha.
+    Calculada uma vez por snapshot da planilha (ver AssetCatalog.fingerprints).
+    """
+    return get_asset_catalog(assets_df).fingerprints()
+
+
+def _candidates(fingerprints: list[str], rows: np.ndarray, scores: np.ndarray) -> tuple[list[str], list[float]]:
+    valid = [(fingerprints[row], float(score)) for row, score in zip(rows, scores) if row >= 0 and np.isfinite(score)]
+    return [fingerprint for fingerprint, _ in valid], [score for _, score in valid]
+
+
+def save_extraction(document_sha256: str, extracted_requirements: dict, assets_df: pd.DataFrame, match_state: tuple | None, rows: list[dict]):
+    """
+    Guarda a extração do edital e o cruzamento feito com ela. `match_state` é o que
+    cross_reference_assets passa para on_match: (requisitos, embeddings, linhas, scores);
+    None se o cruzamento não aconteceu (planilha indisponível), e o recruzamento o fará por completo.
+    """
+    store = get_extraction_store()
+    if store is None:
+        return
+    entry = {
+        "document_sha256": document_sha256,
+        "gemini_model": GEMINI_MODEL_NAME,
+        "prompt_version": EXTRACTION_PROMPT_VERSION,
+        "extracted_requirements": extracted_requirements,
+        "requirements": collect_requirements(extracted_requirements),
+        "embedding_model": None,
+        "match": None,
+        "updated_at": time.time(),
+    }
+    embeddings = None
+    if match_state is not None:
+        requirements, embeddings, top_indices, top_scores = match_state
+        fingerprints = asset_fingerprints(assets_df)
+        entry["requirements"] = requirements
+        entry["embedding_model"] = EMBEDDING_MODEL_NAME if embeddings is not None else None
+        entry["match"] = _match_record(fingerprints, store.save_sheet_snapshot(fingerprints), get_matching_version(),
+                                       [_candidates(fingerprints, top_indices[q], top_scores[q]) for q in range(len(requirements))], rows)
+    store.put(make_extraction_key(document_sha256, GEMINI_MODEL_NAME, EXTRACTION_PROMPT_VERSION), entry, embeddings)
+
+
+def _match_record(fingerprints: list[str], snapshot_id: str, matching_version: str, candidates: list[tuple], rows: list[dict]) -> dict:
+    return {
+        "sheet_snapshot": snapshot_id,
+        "matching_version": matching_version,
+        "top_k": MATCH_TOP_K,
+        "candidates": [list(fingerprints_q) for fingerprints_q, _ in candidates],
+        "scores": [list(scores_q) for _, scores_q in candidates],
+        "rows": rows,
+    }
+
+
+def _affected_requirements(requirements: list[str], embeddings: np.ndarray | None, match: dict, assets_df: pd.DataFrame,
+                           current: set, added: list[int]) -> set[int]:
+    """
+    Requisitos cujo melhor ativo pode ter mudado: algum candidato guardado saiu da planilha (linha
+    removida ou alterada), ou uma linha nova pode entrar entre os candidatos, isto é, entra na
+    pré-seleção BM25 (modo híbrido) ou tem cosseno acima do k-ésimo score guardado (busca vetorial).
+    No modo híbrido, a variação do IDF do BM25 com as linhas novas não recalcula os demais pares.
+    """
+    affected = {q for q, candidates in enumerate(match["candidates"]) if any(fingerprint not in current for fingerprint in candidates)}
+    if not added:
+        return affected
+
+    vector_queries = list(range(len(requirements)))
+    if MATCH_MODE == "hybrid":
+        shortlist_rows, _ = get_asset_matcher(assets_df, with_vectors=False).lexical.search(requirements, max(MATCH_TOP_K, MATCH_SHORTLIST_SIZE))
+        added_rows = set(added)
+        vector_queries = []
+        for q in range(len(requirements)):
+            rows = shortlist_rows[q][shortlist_rows[q] >= 0]
+            if not len(rows):
+                vector_queries.append(q) # Sem candidato lexical: busca vetorial no catálogo inteiro
+            elif added_rows.intersection(rows.tolist()):
+                affected.add(q)
+
+    vector_queries = [q for q in vector_queries if q not in affected]
+    if vector_queries:
+        # Só as linhas novas/alteradas vão ao modelo de embedding; as demais já estão no cache
+        added_embeddings = l2_normalize(get_asset_embeddings(get_asset_catalog(assets_df).take(added)))
+        similarities = l2_normalize(embeddings[vector_queries]) @ added_embeddings.T
+        for q, best in zip(vector_queries, similarities.max(axis=1)):
+            scores = match["scores"][q]
+            kth = scores[-1] if len(scores) >= MATCH_TOP_K else -np.inf
+            if best > kth:
+                affected.add(q)
+    return affected
+
+
+def _rematch_entry(store: ExtractionStore, key: str, entry: dict, embeddings: np.ndarray | None, assets_df: pd.DataFrame,
+                   fingerprints: list[str], snapshot_id: str, matching_version: str) -> tuple[dict, list[dict]]:
+    requirements = entry["requirements"]
+    match = entry.get("match")
+    if embeddings is not None and (entry.get("embedding_model") != EMBEDDING_MODEL_NAME or len(embeddings) != len(requirements)):
+        embeddings = None
+    current = set(fingerprints)
+    previous = store.load_sheet_snapshot(match["sheet_snapshot"]) if match is not None else None
+    if previous is None:
+        added, removed = list(range(len(fingerprints))), 0
+    else:
+        previous_set = set(previous)
+        added = [row for row, fingerprint in enumerate(fingerprints) if fingerprint not in previous_set]
+        removed = len(previous_set - current)
+
+    # Sem cruzamento anterior comparável (configuração ou snapshot diferente, embeddings ausentes), recruza tudo;
+    # no modo lexical também, pois o BM25 é local e não chama o Vertex AI
+    full = (
+        previous is None or match["matching_version"] != matching_version or match["top_k"] != MATCH_TOP_K
+        or MATCH_MODE == "lexical" or embeddings is None
+    )
+    if full:
+        affected = set(range(len(requirements)))
+    else:
+        affected = _affected_requirements(requirements, embeddings, match, assets_df, current, added)
+
+    old_rows = match["rows"] if match is not None and len(match["rows"]) == len(requirements) else [None] * len(requirements)
+    rows = list(old_rows)
+    candidates = list(zip(match["candidates"], match["scores"])) if not full else [([], [])] * len(requirements)
+    new_embeddings = None
+    if affected:
+        subset = sorted(affected)
+        matcher, top_indices, top_scores, threshold, subset_embeddings = rank_requirements(
+            [requirements[q] for q in subset], assets_df, MATCH_TOP_K, embeddings[subset] if embeddings is not None else None
+        )
+        if embeddings is None and subset_embeddings is not None:
+            new_embeddings = subset_embeddings # Recruzamento completo: embeddings de todos os requisitos
+        requirement_type = requirement_type_of(entry["extracted_requirements"])
+        for i, q in enumerate(subset):
+            rows[q] = build_match_row(matcher, requirements[q], requirement_type, top_indices[i], top_scores[i], threshold, MATCH_TOP_K)
+            candidates[q] = _candidates(fingerprints, top_indices[i], top_scores[i])
+
+    changes = []
+    for q in sorted(affected):
+        before, after = old_rows[q], rows[q]
+        if before is None or before["Status"] != after["Status"] or before["Evidência"] != after["Evidência"]:
+            changes.append({
+                "Requisito": requirements[q],
+                "StatusAnterior": before["Status"] if before is not None else None,
+                "Status": after["Status"],
+                "EvidênciaAnterior": before["Evidência"] if before is not None else None,
+                "Evidência": after["Evidência"],
+            })
+    REMATCH_REQUIREMENTS_TOTAL.inc(len(affected), result="recalculated")
+    REMATCH_REQUIREMENTS_TOTAL.inc(len(requirements) - len(affected), result="reused")
+    count("rematch_requirements_recalculated", len(affected))
+
+    entry["match"] = _match_record(fingerprints, snapshot_id, matching_version, candidates, rows)
+    if new_embeddings is not None:
+        entry["embedding_model"] = EMBEDDING_MODEL_NAME
+    entry["updated_at"] = time.time()
+    store.put(key, entry, new_embeddings)
+
+    extracted = entry["extracted_requirements"]
+    summary = {
+        "documento": entry["document_sha256"],
+        "objeto": extracted.get("Objeto", "N/A"),
+        "orgao": extracted.get("Orgao", "N/A"),
+        "requisitos": len(requirements),
+        "requisitos_recalculados": len(affected),
+        "ativos_adicionados": len(added),
+        "ativos_removidos": removed,
+        "mudancas": changes,
+    }
+    return summary, rows
+
+
+def rematch_all(assets_df: pd.DataFrame) -> list[tuple[dict, dict | None, list[dict] | None]]:
+    """
+    Recruza com a planilha atual todos os editais guardados cujo último cruzamento usou outra versão da
+    planilha (ou outra configuração de cruzamento). Retorna, por edital recruzado, (resumo com as mudanças
+    de status, requisitos extraídos, novo mapa de atendimento); em caso de erro, o resumo traz "erro" e os
+    demais campos são None. A falha de um edital não interrompe os demais.
+    """
+    store = get_extraction_store()
+    if store is None or assets_df.empty:
+        return []
+    fingerprints = asset_fingerprints(assets_df)
+    snapshot_id = store.save_sheet_snapshot(fingerprints)
+    matching_version = get_matching_version()
+
+    results = []
+    for key in store.keys():
+        entry, embeddings = store.get(key)
+        if entry is None or entry.get("gemini_model") != GEMINI_MODEL_NAME or entry.get("prompt_version") != EXTRACTION_PROMPT_VERSION:
+            continue # Extração de outro modelo/prompt: o resultado não corresponderia à chave atual do cache
+        match = entry.get("match")
+        if match is not None and match["sheet_snapshot"] == snapshot_id and match["matching_version"] == matching_version \
+                and match["top_k"] == MATCH_TOP_K:
+            continue # Já cruzado com esta planilha
+        try:
+            summary, rows = _rematch_entry(store, key, entry, embeddings, assets_df, fingerprints, snapshot_id, matching_version)
+            results.append((summary, entry["extracted_requirements"], rows))
+        except Exception as e:
+            print(f"Erro ao recruzar o edital {entry.get('document_sha256')}: {e}")
+            results.append(({"documento": entry.get("document_sha256"), "erro": str(getattr(e, "detail", e))}, None, None))
+    return results
@@ -0,0 +1,115 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def make_result_cache_key(document_sha256: str, sheet_revision: str, gemini_model: str, embedding_model: str, prompt_version: str,
+                          matching_version: str = "") -> str:
+    """
+    Chave do resultado completo: mesmo documento + mesma planilha + mesmos modelos/prompt + mesma
+    configuração de cruzamento (modo, sinônimos) = mesma análise.
+    """
+    payload = json.dumps([document_sha256, sheet_revision, gemini_model, embedding_model, prompt_version, matching_version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache em camadas dos resultados de /analyze_edital/: LRU em memória na frente de um
+    armazenamento em disco (um JSON por chave), compartilhável entre workers.
+    get/put fazem E/S de arquivo: a partir do event loop, chame-os em uma thread (asyncio.to_thread).
+    """
+
+    def __init__(self, cache_dir: str, memory_entries: int = 128, disk_max_entries: int = 2000):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # Arquivos em disco, contados a cada gravação nova; o diretório só é varrido na primeira gravação
+        # e quando a contagem passa do limite (a varredura recalibra a contagem, inclusive com outros workers)
+        self._disk_entries = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, result: dict):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> tuple[dict | None, str]:
+        """Retorna (resultado, camada), com camada 'memory', 'disk' ou 'miss'."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key], "memory"
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None, "miss"
+
+        os.utime(path) # mtime marca o último uso, para a evicção em disco
+        self._remember(key, result)
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        return result, "disk"
+
+    def put(self, key: str, result: dict):
+        self._remember(key, result)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o resultado no cache em disco: {e}")
+            return
+        with self._lock:
+            if self._disk_entries is not None and is_new:
+                self._disk_entries += 1
+            over_limit = self._disk_entries is None or self._disk_entries > self.disk_max_entries
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Remove os resultados menos usados recentemente quando o disco passa do limite de entradas, até 90%
+        do limite (a próxima varredura só acontece depois de ~10% de gravações novas).
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except FileNotFoundError:
+                        pass
+        remaining = len(entries)
+        if remaining > self.disk_max_entries:
+            entries.sort()
+            remaining = int(self.disk_max_entries * 0.9)
+            for _, path in entries[:len(entries) - remaining]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._disk_entries = remaining
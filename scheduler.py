@@ -0,0 +1,269 @@
+# scheduler.py
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from metrics import SCHEDULER_REJECTED_TOTAL, SCHEDULER_WAIT_SECONDS
+from config import (
+    SCHEDULER_MAX_WAIT_SECONDS, SCHEDULER_RETRY_AFTER_SECONDS, ANALYSIS_MAX_CONCURRENT, ANALYSIS_MAX_QUEUED,
+    GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, GEMINI_MAX_CONCURRENCY,
+    EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_MAX_CONCURRENCY,
+)
+
+# Controle central de capacidade: admissão de análises no endpoint, token buckets das cotas do
+# Vertex AI (requisições e tokens por minuto) e concorrência adaptativa, que cai pela metade a cada
+# erro 429 e volta a subir aos poucos. Sem capacidade dentro do prazo de espera, a requisição falha
+# rápido com 429/503 e Retry-After, em vez de acumular trabalho.
+
+
+class CapacityExceeded(HTTPException):
+    """Sem capacidade agora: 429 (cota do Vertex AI) ou 503 (servidor cheio), com o header Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+
+# Espera máxima por capacidade na requisição atual (None = sem limite, ex.: jobs em segundo plano).
+# Propagado às threads dos pools pelo contexto (executors.run_in_executor).
+_max_wait = contextvars.ContextVar("scheduler_max_wait", default=SCHEDULER_MAX_WAIT_SECONDS)
+
+
+def set_max_wait(seconds: float | None):
+    _max_wait.set(seconds)
+
+
+def _reject(resource: str, status_code: int, detail: str, retry_after: float) -> CapacityExceeded:
+    SCHEDULER_REJECTED_TOTAL.inc(resource=resource, status=status_code)
+    return CapacityExceeded(status_code, detail, retry_after)
+
+
+class TokenBucket:
+    """
+    Token bucket por minuto (thread-safe). acquire() reserva as unidades na hora e espera o saldo
+    ficar positivo; se a espera passaria do limite, desfaz a reserva e levanta CapacityExceeded (429).
+    Com rate_per_minute=0 o bucket não limita nada.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, capacity: float | None = None):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1):
+        if self.rate <= 0:
+            return
+        max_wait = _max_wait.get()
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            wait = max(0.0, -self._tokens / self.rate)
+            if max_wait is not None and wait > max_wait:
+                self._tokens += amount
+                raise _reject(self.name, 429, f"Cota de {self.name} esgotada no momento. Tente novamente mais tarde.", wait)
+        if wait > 0:
+            SCHEDULER_WAIT_SECONDS.observe(wait, resource=self.name)
+            time.sleep(wait)
+
+    def adjust(self, amount: float):
+        """Corrige uma reserva estimada com o consumo real (positivo cobra, negativo devolve)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - amount) # Devolução não passa da capacidade
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {"available": self._tokens, "capacity": self.capacity}
+
+
+class AdaptiveLimiter:
+    """
+    Limite de chamadas simultâneas com ajuste AIMD (thread-safe): cada resposta 429 do Vertex AI corta
+    o limite pela metade; cada chamada bem-sucedida soma 1/limite (cerca de +1 a cada "limite" sucessos),
+    até max_limit.
+    """
+
+    def __init__(self, name: str, max_limit: int, min_limit: int = 1):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.throttled = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        max_wait = _max_wait.get()
+        started = time.monotonic()
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = None if max_wait is None else max_wait - (time.monotonic() - started)
+                if remaining is not None and remaining <= 0:
+                    raise _reject(self.name, 429, f"Limite de chamadas simultâneas a {self.name} atingido. Tente novamente mais tarde.",
+                                  SCHEDULER_RETRY_AFTER_SECONDS)
+                self._condition.wait(remaining)
+            self.in_flight += 1
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            SCHEDULER_WAIT_SECONDS.observe(waited, resource=self.name)
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                print(f"Aviso: {self.name} limitado pelo Vertex AI (429); concorrência reduzida para {int(self.limit)}.")
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "throttled": self.throttled}
+
+
+class AdmissionControl:
+    """
+    Admissão de análises no event loop: até max_active em execução e max_queued aguardando vaga
+    (no máximo o prazo de espera da requisição). Com a fila cheia, levanta 503 na hora, com um
+    Retry-After estimado pela duração média recente das análises.
+    """
+
+    def __init__(self, max_active: int, max_queued: int):
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self._average_seconds = None
+        self._condition = None
+
+    def _estimated_wait(self) -> float:
+        average = self._average_seconds or SCHEDULER_RETRY_AFTER_SECONDS
+        return average * (self.queued + 1) / self.max_active
+
+    async def acquire(self) -> float:
+        """Ocupa uma vaga e retorna o instante de início (para release)."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            if self.active >= self.max_active:
+                if self.queued >= self.max_queued:
+                    self.rejected += 1
+                    raise _reject("analises", 503, "Servidor ocupado com outras análises. Tente novamente mais tarde.", self._estimated_wait())
+                self.queued += 1
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(self._condition.wait_for(lambda: self.active < self.max_active), _max_wait.get())
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise _reject("analises", 503, "Servidor ocupado com outras análises. Tente novamente mais tarde.", self._estimated_wait())
+                finally:
+                    self.queued -= 1
+                SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - started, resource="analises")
+            self.active += 1
+            return time.monotonic()
+
+    async def release(self, started: float):
+        seconds = time.monotonic() - started
+        # Média móvel exponencial da duração, usada no Retry-After
+        self._average_seconds = seconds if self._average_seconds is None else 0.8 * self._average_seconds + 0.2 * seconds
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "queued": self.queued, "rejected": self.rejected}
+
+
+admission = AdmissionControl(ANALYSIS_MAX_CONCURRENT, ANALYSIS_MAX_QUEUED)
+gemini_requests = TokenBucket("gemini_requisicoes", GEMINI_REQUESTS_PER_MINUTE)
+gemini_tokens = TokenBucket("gemini_tokens", GEMINI_TOKENS_PER_MINUTE)
+gemini_limiter = AdaptiveLimiter("gemini", GEMINI_MAX_CONCURRENCY)
+embedding_requests = TokenBucket("embedding_requisicoes", EMBEDDING_REQUESTS_PER_MINUTE)
+embedding_limiter = AdaptiveLimiter("embedding", EMBEDDING_MAX_CONCURRENCY)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Erro de cota do Vertex AI (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    from google.api_core import exceptions as google_exceptions
+    return isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests))
+
+
+def _reserve(reservations: list[tuple[TokenBucket, float]], limiter: AdaptiveLimiter):
+    """
+    Reserva as cotas e depois a vaga de concorrência. Se uma etapa falhar (ex.: CapacityExceeded por
+    espera longa demais), as cotas já reservadas são devolvidas: a chamada não aconteceu.
+    """
+    reserved = []
+    try:
+        for bucket, amount in reservations:
+            bucket.acquire(amount)
+            reserved.append((bucket, amount))
+        limiter.acquire()
+    except BaseException:
+        for bucket, amount in reserved:
+            bucket.adjust(-amount)
+        raise
+
+
+@contextmanager
+def gemini_call(estimated_tokens: int):
+    """
+    Envolve uma chamada ao Gemini: reserva requisição e tokens nas cotas por minuto e uma vaga de
+    concorrência. Um 429 do Vertex AI reduz a concorrência e vira CapacityExceeded (429 para o cliente).
+    Use `adjust(tokens_reais)` no objeto retornado para corrigir a estimativa de tokens.
+    """
+    _reserve([(gemini_requests, 1), (gemini_tokens, estimated_tokens)], gemini_limiter)
+    throttled = False
+    try:
+        yield lambda actual_tokens: gemini_tokens.adjust(actual_tokens - estimated_tokens)
+    except Exception as e:
+        if is_throttling_error(e):
+            throttled = True
+            SCHEDULER_REJECTED_TOTAL.inc(resource="gemini", status=429)
+            raise CapacityExceeded(429, "Cota do Gemini esgotada no momento. Tente novamente mais tarde.", SCHEDULER_RETRY_AFTER_SECONDS) from e
+        raise
+    finally:
+        gemini_limiter.release(throttled)
+
+
+@contextmanager
+def embedding_call():
+    """Envolve um lote de embedding (cota por minuto e concorrência adaptativa). Os 429 seguem para o retry do cliente."""
+    _reserve([(embedding_requests, 1)], embedding_limiter)
+    throttled = False
+    try:
+        yield
+    except Exception as e:
+        throttled = is_throttling_error(e)
+        raise
+    finally:
+        embedding_limiter.release(throttled)
+
+
+def get_scheduler_stats() -> dict:
+    """Estado atual do controle de capacidade (para /metrics)."""
+    stats = {}
+    for prefix, values in (("analises", admission.stats()), ("gemini", gemini_limiter.stats()), ("embedding", embedding_limiter.stats())):
+        stats.update({f"{prefix}_{key}": value for key, value in values.items()})
+    for bucket in (gemini_requests, gemini_tokens, embedding_requests):
+        if bucket.rate > 0:
+            stats[f"{bucket.name}_disponiveis"] = bucket.stats()["available"]
+    return stats
@@ -0,0 +1,197 @@
+# section_index.py
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from config import (
+    PROMPT_PRUNING_MIN_CHARS, PROMPT_PRUNING_MIN_SECTIONS, PROMPT_PRUNING_MIN_DENSITY,
+    PROMPT_PRUNING_PREAMBLE_CHARS, PROMPT_PRUNING_MAX_KEPT_RATIO,
+)
+
+# Índice de seções do texto do edital, usado para enviar ao Gemini apenas as seções com as
+# informações extraídas (objeto, habilitação, qualificação técnica, valores, datas e julgamento).
+
+# Títulos de seção: cláusulas numeradas com ponto ("6.", "6.1", "6.1.3 Qualificação técnica"; números soltos
+# como "10 (dez) dias" em linhas quebradas não contam) ou ANEXO/CAPÍTULO/CLÁUSULA/SEÇÃO/TÍTULO
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:(?P<number>\d{1,2}\.(?:\d{1,2}\.?){0,5})[ \t]+(?=[^\W\d_])"
+    r"|(?P<keyword>(?:CL[ÁA]USULA|CAP[ÍI]TULO|ANEXO|SE[ÇC][ÃA]O|T[ÍI]TULO)\b"
+    r"|(?:Cl[áa]usula|Cap[íi]tulo|Anexo|Se[çc][ãa]o|T[íi]tulo)\s+[IVXLCDM\d]+\b))",
+    re.MULTILINE,
+)
+
+# Títulos que abrem um novo bloco do documento (as cláusulas numeradas recomeçam dentro deles)
+_BLOCK_KEYWORDS = ("anexo", "capitulo", "titulo")
+
+# Palavras-chave (sem acentos, minúsculas) de cada assunto extraído; prefixos como "habilitac" cobrem as variações
+TOPIC_KEYWORDS = {
+    "objeto": ("objeto", "especificac", "termo de referencia", "escopo", "descricao dos servicos", "quantitativ"),
+    "habilitacao": ("habilitac", "regularidade fiscal", "economico-financeira", "economico financeira", "documentos de"),
+    "qualificacao_tecnica": ("qualificacao tecnica", "capacidade tecnica", "atestado", "certificac", "experiencia"),
+    "datas": ("sessao publica", "abertura da sessao", "recebimento das propostas", "cronograma", "data da sessao"),
+    "valor": ("valor estimado", "preco estimado", "orcamento estimado", "estimativa de", "valor global", "valor total"),
+    "julgamento": ("criterio de julgamento", "julgamento", "menor preco", "tecnica e preco", "maior desconto"),
+    "condicoes": ("garantia", "subcontratac", "prova de conceito", "amostra", "visita tecnica", "vistoria", "da proposta", "validade da proposta"),
+}
+
+# Títulos de seções sem nenhum dos campos extraídos (minuta do contrato, sanções, disposições gerais...)
+EXCLUDED_HEADING_KEYWORDS = (
+    "minuta", "sanc", "penalidade", "infrac", "rescis", "recurso", "impugnac", "disposicoes gerais",
+    "disposicoes finais", "foro", "dotacao orcamentaria", "reajust", "repactuac", "fiscalizac", "gestao do contrato",
+    "obrigacoes da contratante", "protecao de dados", "lgpd", "anticorrupc", "modelo de declarac",
+)
+
+_DATE_PATTERN = re.compile(r"\b\d{1,2}/\d{1,2}/\d{2,4}\b")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _keywords_pattern(keywords) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)) + ")")
+
+
+_TOPIC_PATTERNS = {topic: _keywords_pattern(keywords) for topic, keywords in TOPIC_KEYWORDS.items()}
+_ANY_TOPIC_PATTERN = _keywords_pattern([keyword for keywords in TOPIC_KEYWORDS.values() for keyword in keywords])
+_EXCLUDED_PATTERN = _keywords_pattern(EXCLUDED_HEADING_KEYWORDS)
+
+
+@dataclass
+class Section:
+    number: str | None # "6.1.3" (sem o ponto final) ou None para títulos sem número e para o preâmbulo
+    title: str # Primeira linha da seção
+    start: int
+    end: int
+    block: int # Bloco do documento (0 = corpo do edital; cada ANEXO/CAPÍTULO abre um novo)
+    topics: set = field(default_factory=set) # Assuntos citados no título
+    excluded: bool = False
+    density: float = 0.0 # Ocorrências de palavras-chave dos assuntos por 1000 caracteres
+    relevant: bool = False
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+
+@dataclass
+class PruneResult:
+    text: str # Texto a enviar ao Gemini (o original, se a poda não foi aplicada)
+    pruned: bool
+    reason: str
+    original_chars: int
+    kept_chars: int
+    sections_total: int = 0
+    sections_kept: int = 0
+
+    @property
+    def tokens_saved_estimate(self) -> int:
+        """Tokens de prompt economizados, estimados em ~4 caracteres por token."""
+        return (self.original_chars - self.kept_chars) // 4
+
+
+def build_section_index(text: str) -> list[Section]:
+    """Divide o texto em seções pelos títulos (HEADING_PATTERN) e classifica cada uma pelo título e pela densidade de palavras-chave."""
+    starts = [match for match in HEADING_PATTERN.finditer(text)]
+    sections = []
+    if not starts or starts[0].start() > 0:
+        first_end = starts[0].start() if starts else len(text)
+        sections.append(Section(None, "preâmbulo", 0, first_end, 0))
+
+    block = 0
+    block_excluded = False
+    for index, match in enumerate(starts):
+        end = starts[index + 1].start() if index + 1 < len(starts) else len(text)
+        line_end = text.find("\n", match.start())
+        title = text[match.start():line_end if 0 <= line_end < end else end].strip()
+        folded_title = _fold(title)
+        number = match.group("number").rstrip(".") if match.group("number") else None
+        # Títulos curtos são títulos de fato; linhas longas são cláusulas (o assunto vem da densidade)
+        heading_like = len(title) <= 100
+
+        if number is None and folded_title.startswith(_BLOCK_KEYWORDS):
+            block += 1
+            block_excluded = bool(_EXCLUDED_PATTERN.search(folded_title))
+
+        section = Section(number, title[:120], match.start(), end, block)
+        section.excluded = block_excluded or (heading_like and bool(_EXCLUDED_PATTERN.search(folded_title)))
+        if heading_like:
+            section.topics = {topic for topic, pattern in _TOPIC_PATTERNS.items() if pattern.search(folded_title)}
+        body = _fold(text[match.start():end])
+        hits = len(_ANY_TOPIC_PATTERN.findall(body)) + len(_DATE_PATTERN.findall(body))
+        section.density = hits * 1000 / max(len(body), 500)
+        sections.append(section)
+    return sections
+
+
+def _mark_relevant(sections: list[Section]):
+    """
+    Uma seção é relevante se o título cita um dos assuntos, se está dentro de uma seção numerada
+    relevante (ex.: 6.1.3.2 dentro de "6.1.3 Qualificação técnica") ou se a densidade de palavras-chave
+    atinge PROMPT_PRUNING_MIN_DENSITY. Seções excluídas (e as de dentro delas) nunca são relevantes.
+    """
+    latest = {} # (bloco, número) -> seção mais recente com esse número
+    for section in sections:
+        if section.number is None:
+            section.relevant = section.start == 0 or (not section.excluded and bool(section.topics))
+            continue
+        parts = section.number.split(".")
+        ancestors = [latest.get((section.block, ".".join(parts[:depth]))) for depth in range(1, len(parts))]
+        ancestors = [ancestor for ancestor in ancestors if ancestor is not None]
+        latest[(section.block, section.number)] = section
+        if section.excluded or any(ancestor.excluded for ancestor in ancestors):
+            section.excluded = True
+            continue
+        section.relevant = (
+            bool(section.topics)
+            or any(ancestor.relevant and ancestor.topics for ancestor in ancestors)
+            or section.density >= PROMPT_PRUNING_MIN_DENSITY
+        )
+
+
+def prune_edital_text(text: str) -> PruneResult:
+    """
+    Mantém só as seções relevantes do edital (mais o início do preâmbulo, onde ficam órgão, objeto
+    e datas), marcando os trechos omitidos com "[...]". Volta ao texto completo quando o índice
+    não parece confiável: poucas seções, uma seção com mais da metade do texto (títulos não
+    reconhecidos), objeto ou habilitação/qualificação técnica não encontrados, ou economia pequena.
+    """
+    original_chars = len(text)
+
+    def full_text(reason: str, sections_total: int = 0) -> PruneResult:
+        return PruneResult(text, False, reason, original_chars, original_chars, sections_total, sections_total)
+
+    if original_chars < PROMPT_PRUNING_MIN_CHARS:
+        return full_text("edital curto")
+
+    sections = build_section_index(text)
+    if len(sections) < PROMPT_PRUNING_MIN_SECTIONS:
+        return full_text("poucas seções reconhecidas", len(sections))
+    if max(section.length for section in sections) > original_chars / 2:
+        return full_text("uma seção concentra mais da metade do texto", len(sections))
+
+    _mark_relevant(sections)
+    kept = [section for section in sections if section.relevant]
+    topics = set().union(*(section.topics for section in kept))
+    if "objeto" not in topics or not topics & {"habilitacao", "qualificacao_tecnica"}:
+        return full_text("seções de objeto ou habilitação não encontradas", len(sections))
+
+    pieces = []
+    previous_end = 0
+    for section in kept:
+        end = section.end
+        if section.number is None and section.start == 0:
+            end = min(end, PROMPT_PRUNING_PREAMBLE_CHARS)
+        if section.start > previous_end:
+            pieces.append("[...]\n")
+        piece = text[section.start:end]
+        pieces.append(piece if piece.endswith("\n") else piece + "\n")
+        previous_end = end
+    if previous_end < original_chars:
+        pieces.append("[...]\n")
+    pruned_text = "".join(pieces)
+
+    if len(pruned_text) > original_chars * PROMPT_PRUNING_MAX_KEPT_RATIO:
+        return full_text("economia pequena", len(sections))
+    return PruneResult(pruned_text, True, "seções relevantes", original_chars, len(pruned_text), len(sections), len(kept))
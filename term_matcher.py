@@ -0,0 +1,133 @@
+# term_matcher.py
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from config import SYNONYMS_FILE, SYNONYMS_SHEET_TAB, GOOGLE_SHEET_URL
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tabela padrão de sinônimos: termo encontrado no texto -> termo canônico
+# Pode ser substituída por um arquivo (SYNONYMS_FILE) ou por uma aba da planilha (SYNONYMS_SHEET_TAB)
+DEFAULT_SYNONYMS = {
+    "google workspace": "google workspace",
+    "gws": "google workspace",
+    "contas google": "google workspace contas",
+    "google cloud platform": "google cloud platform",
+    "gcp": "google cloud platform",
+    "armazenamento em nuvem": "cloud storage",
+    "nuvem pública": "cloud public",
+    "ia": "inteligência artificial",
+    "inteligência artificial": "inteligência artificial",
+    "robô": "robô",
+    "robotizado": "robô",
+    "chatbots": "chatbot",
+    "ura": "unidade de resposta audível",
+    "geração de linguagem natural": "geração de linguagem natural"
+}
+
+
+class TermMatcher:
+    """
+    Reconhecedor de termos compilado: todos os sinônimos viram uma única expressão regular
+    (alternativas mais longas primeiro, delimitadas por fronteira de palavra), de modo que uma
+    única passada pelo texto encontra todos os termos canônicos mencionados.
+    """
+
+    def __init__(self, synonyms: dict[str, str]):
+        self.synonyms = {key.lower().strip(): value.lower().strip() for key, value in synonyms.items() if key and key.strip()}
+        self.fingerprint = hashlib.sha256(json.dumps(sorted(self.synonyms.items())).encode("utf-8")).hexdigest()[:16]
+        alternatives = sorted(self.synonyms, key=len, reverse=True)
+        if alternatives:
+            pattern = "|".join(re.escape(term) for term in alternatives)
+            self._pattern = re.compile(rf"(?<!\w)(?:{pattern})(?!\w)")
+        else:
+            self._pattern = None
+
+    def find_terms(self, text: str) -> set[str]:
+        """Conjunto de termos canônicos mencionados no texto."""
+        if self._pattern is None or not text:
+            return set()
+        return {self.synonyms[match] for match in self._pattern.findall(text.lower())}
+
+    def normalize(self, text: str) -> str:
+        """Termo canônico da primeira menção no texto; sem menção, o próprio texto em minúsculas."""
+        text = text.lower().strip()
+        match = self._pattern.search(text) if self._pattern is not None else None
+        return self.synonyms[match.group(0)] if match else text
+
+
+def synonyms_from_dataframe(df: pd.DataFrame) -> dict[str, str]:
+    """Lê a tabela de sinônimos de uma aba com as colunas "Termo" e "Canonico" (ou das duas primeiras colunas)."""
+    if df.empty or len(df.columns) < 2:
+        return {}
+    term_column = "Termo" if "Termo" in df.columns else df.columns[0]
+    canonical_column = "Canonico" if "Canonico" in df.columns else df.columns[1]
+    return {
+        str(term): str(canonical)
+        for term, canonical in zip(df[term_column], df[canonical_column])
+        if str(term).strip() and str(canonical).strip()
+    }
+
+
+def load_synonyms_file(path: str) -> dict[str, str]:
+    """Lê a tabela de sinônimos de um JSON ({"termo": "canônico"}) ou CSV (termo,canônico)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            return json.load(f)
+        return {row[0]: row[1] for row in csv.reader(f) if len(row) >= 2 and row[0].strip()}
+
+
+_matcher_lock = threading.Lock()
+_matcher_cache = {"source": None, "matcher": None, "table": None}
+
+
+def _synonyms_source():
+    """Identifica a versão atual da tabela (aba da planilha, arquivo ou padrão) e a carrega se preciso."""
+    if SYNONYMS_SHEET_TAB:
+        from google_sheets_integrator import get_google_sheet_data
+        df = get_google_sheet_data(GOOGLE_SHEET_URL, SYNONYMS_SHEET_TAB)
+        # O snapshot da aba é o mesmo objeto enquanto não houver nova revisão da planilha
+        return ("sheet", id(df)), df, lambda: synonyms_from_dataframe(df)
+    if SYNONYMS_FILE:
+        mtime = os.path.getmtime(SYNONYMS_FILE)
+        return ("file", SYNONYMS_FILE, mtime), None, lambda: load_synonyms_file(SYNONYMS_FILE)
+    return ("default",), None, lambda: DEFAULT_SYNONYMS
+
+
+def get_term_matcher() -> TermMatcher:
+    """
+    Reconhecedor da tabela de sinônimos configurada, recompilado apenas quando a tabela muda.
+    Se a fonte configurada falhar (ou vier vazia), usa a tabela padrão.
+    """
+    try:
+        source, table, load = _synonyms_source()
+    except Exception as e:
+        print(f"Aviso: não foi possível ler a tabela de sinônimos ({e}); usando a tabela padrão.")
+        source, table, load = ("default",), None, lambda: DEFAULT_SYNONYMS
+
+    with _matcher_lock:
+        if _matcher_cache["source"] == source:
+            return _matcher_cache["matcher"]
+
+    try:
+        synonyms = load()
+    except Exception as e:
+        print(f"Aviso: não foi possível ler a tabela de sinônimos ({e}); usando a tabela padrão.")
+        synonyms = DEFAULT_SYNONYMS
+    if not synonyms:
+        print("Aviso: tabela de sinônimos vazia; usando a tabela padrão.")
+        synonyms = DEFAULT_SYNONYMS
+    matcher = TermMatcher(synonyms)
+    with _matcher_lock:
+        _matcher_cache["source"] = source
+        _matcher_cache["matcher"] = matcher
+        _matcher_cache["table"] = table # Mantém o snapshot vivo para que id(df) não seja reaproveitado
+    return matcher
@@ -0,0 +1,49 @@
+# test_ai_analyzer.py
+from ai_analyzer import merge_extracted_requirements
+
+
+def test_scalars_keep_first_value_present():
+    merged = merge_extracted_requirements([
+        {"Orgao": "N/A", "Objeto": "Serviços de nuvem"},
+        {"Orgao": "Prefeitura de Campinas", "Objeto": "Outro objeto"},
+    ])
+    assert merged == {"Orgao": "Prefeitura de Campinas", "Objeto": "Serviços de nuvem"}
+
+
+def test_lists_are_concatenated_without_duplicates():
+    merged = merge_extracted_requirements([
+        {"Documentos": ["Certidão negativa de débitos", "Balanço patrimonial"]},
+        {"Documentos": ["CERTIDAO NEGATIVA DE DEBITOS.", "Contrato social"]},
+    ])
+    assert merged["Documentos"] == ["Certidão negativa de débitos", "Balanço patrimonial", "Contrato social"]
+
+
+def test_object_requirements_with_same_description_are_merged():
+    merged = merge_extracted_requirements([
+        {"RequisitosObjetoQualificacaoTecnicaEspecifica": [
+            {"Descricao": "Licenças Google Workspace", "Quantidade": "N/A"},
+            {"Descricao": "Suporte técnico 24x7", "Quantidade": "12 meses"},
+        ]},
+        {"RequisitosObjetoQualificacaoTecnicaEspecifica": [
+            {"Descricao": "licenças google workspace", "Quantidade": "500"},
+        ]},
+    ])
+    assert merged["RequisitosObjetoQualificacaoTecnicaEspecifica"] == [
+        {"Descricao": "Licenças Google Workspace", "Quantidade": "500"},
+        {"Descricao": "Suporte técnico 24x7", "Quantidade": "12 meses"},
+    ]
+
+
+def test_key_order_follows_the_chunks():
+    merged = merge_extracted_requirements([{"B": "1"}, {"A": "2", "B": "3"}])
+    assert list(merged) == ["B", "A"]
+
+
+def test_failed_chunks_are_ignored():
+    merged = merge_extracted_requirements([{"Error": "timeout"}, {"Objeto": "Serviços de nuvem"}])
+    assert merged == {"Objeto": "Serviços de nuvem"}
+
+
+def test_all_chunks_failed_returns_first_error():
+    assert merge_extracted_requirements([{"Error": "a"}, {"Error": "b"}]) == {"Error": "a"}
+    assert "Error" in merge_extracted_requirements([])
@@ -0,0 +1,74 @@
+# test_docx_processor.py
+import io
+import zipfile
+
+from docx_processor import CELL_SEPARATOR, _parse_document, extract_text_from_docx
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def p(*runs: str) -> str:
+    return "<w:p>" + "".join(f"<w:r>{run}</w:r>" for run in runs) + "</w:p>"
+
+
+def t(text: str) -> str:
+    return f"<w:t>{text}</w:t>"
+
+
+def tbl(*rows: list[str]) -> str:
+    return "<w:tbl>" + "".join("<w:tr>" + "".join(f"<w:tc>{cell}</w:tc>" for cell in row) + "</w:tr>" for row in rows) + "</w:tbl>"
+
+
+def make_docx(body: str, document_path: str = "word/document.xml", relationships: dict | None = None) -> bytes:
+    """DOCX mínimo em memória: _rels/.rels apontando para o documento principal e, se houver, seus relacionamentos."""
+    document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{W_NS}" xmlns:a="{A_NS}" xmlns:r="{R_NS}"><w:body>{body}</w:body></w:document>'
+    package_rels = (f'<Relationships xmlns="{PACKAGE_NS}"><Relationship Id="rId1" Type="{R_NS}/officeDocument" '
+                    f'Target="/{document_path}"/></Relationships>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("_rels/.rels", package_rels)
+        archive.writestr(document_path, document)
+        if relationships:
+            folder, name = document_path.rsplit("/", 1)
+            entries = "".join(f'<Relationship Id="{rid}" Type="{R_NS}/image" Target="{target}"/>' for rid, target in relationships.items())
+            archive.writestr(f"{folder}/_rels/{name}.rels", f'<Relationships xmlns="{PACKAGE_NS}">{entries}</Relationships>')
+    return buffer.getvalue()
+
+
+def test_paragraphs_in_document_order():
+    body = p(t("EDITAL DE "), t("PREGÃO")) + p("<w:tab/>", t("Objeto"), "<w:br/>", t("Serviços")) + p() + p(t("Fim"))
+    assert extract_text_from_docx(make_docx(body), ocr=False) == "EDITAL DE PREGÃO\n\tObjeto\nServiços\n\nFim"
+
+
+def test_table_rows_become_lines():
+    body = p(t("Itens:")) + tbl(
+        [p(t("Item")), p(t("Quantidade"))],
+        [p(t("Licença")) + p() + p(t("  Workspace   Business ")), p(t("500"))],
+    ) + p(t("Depois da tabela"))
+    text = extract_text_from_docx(make_docx(body), ocr=False)
+    assert text.split("\n") == ["Itens:", f"Item{CELL_SEPARATOR}Quantidade", f"Licença Workspace Business{CELL_SEPARATOR}500", "Depois da tabela"]
+
+
+def test_nested_table_goes_into_outer_cell():
+    inner = tbl([p(t("a")), p(t("b"))], [p(t("c")), p(t("d"))])
+    body = tbl([p(t("Externa")) + inner, p(t("Lado"))])
+    text = extract_text_from_docx(make_docx(body), ocr=False)
+    assert text == f"Externa a{CELL_SEPARATOR}b c{CELL_SEPARATOR}d{CELL_SEPARATOR}Lado"
+
+
+def test_main_document_from_package_relationships(tmp_path):
+    path = tmp_path / "edital.docx"
+    path.write_bytes(make_docx(p(t("Documento principal")), document_path="word/document2.xml"))
+    assert extract_text_from_docx(str(path), ocr=False) == "Documento principal"
+
+
+def test_images_are_marked_only_with_ocr():
+    blip = '<w:drawing><a:blip r:embed="rId5"/></w:drawing>'
+    docx = make_docx(p(t("Antes")) + p(blip) + p(t("Depois")) + p(blip), relationships={"rId5": "media/image1.png"})
+    text, images = _parse_document(docx, with_images=True)
+    assert images == ["word/media/image1.png"] # Mesma imagem repetida: um único OCR
+    assert text.split("\n") == ["Antes", "\x000\x00", "Depois", "\x000\x00"]
+    assert _parse_document(docx, with_images=False) == ("Antes\n\nDepois\n", [])
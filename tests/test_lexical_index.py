@@ -0,0 +1,62 @@
+# test_lexical_index.py
+import numpy as np
+
+from lexical_index import LexicalIndex, tokenize
+from term_matcher import DEFAULT_SYNONYMS, TermMatcher
+
+ASSETS = [
+    "Backup em nuvem com retenção de 30 dias",
+    "Licenças Google Workspace Business Standard",
+    "Projeto de migração para Google Cloud Platform",
+    "Chatbot com atendimento por URA",
+    "Backup local em fita",
+]
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("Certificação da Solução") == ["certificacao", "solucao"]
+    assert tokenize("Projetos no GCP", TermMatcher(DEFAULT_SYNONYMS)) == ["projetos", "gcp", "#google cloud platform"]
+
+
+def test_ranks_asset_with_all_query_terms_first():
+    index = LexicalIndex(ASSETS)
+    rows, scores = index.search(["backup em nuvem"], k=3)
+    assert rows[0, 0] == 0
+    assert rows[0, 1] == 4 # Só "backup" em comum
+    assert scores[0, 0] > scores[0, 1] > 0
+    assert rows[0, 2] == -1 and scores[0, 2] == 0
+
+
+def test_scores_are_normalized():
+    index = LexicalIndex(ASSETS)
+    scores = index.scores("chatbot ura")
+    assert scores.shape == (len(ASSETS),)
+    assert np.isclose(scores.max(), 1.0) and scores.argmax() == 3
+    assert scores.min() == 0
+
+
+def test_rare_terms_weigh_more():
+    index = LexicalIndex(ASSETS)
+    scores = index.scores("backup fita")
+    assert scores[4] > scores[0] > 0 # "fita" só aparece em um ativo
+
+
+def test_unknown_terms_lower_the_score():
+    index = LexicalIndex(ASSETS)
+    assert index.scores("backup nuvem")[0] > index.scores("backup nuvem criptografado")[0]
+
+
+def test_synonyms_match_canonical_terms():
+    without_synonyms = LexicalIndex(ASSETS)
+    with_synonyms = LexicalIndex(ASSETS, term_matcher=TermMatcher(DEFAULT_SYNONYMS))
+    assert without_synonyms.scores("serviços GCP")[2] == 0
+    rows, _ = with_synonyms.search(["serviços GCP"], k=1)
+    assert rows[0, 0] == 2
+
+
+def test_empty_query_and_empty_catalog():
+    index = LexicalIndex(ASSETS)
+    rows, scores = index.search(["de para com"], k=2)
+    assert (rows == -1).all() and (scores == 0).all()
+    rows, scores = LexicalIndex([]).search(["backup"], k=5)
+    assert rows.shape == (1, 0)
@@ -0,0 +1,103 @@
+# test_scheduler.py
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from scheduler import AdaptiveLimiter, AdmissionControl, CapacityExceeded, TokenBucket, set_max_wait
+
+
+def with_max_wait(seconds, func, *args):
+    """Executa func com o prazo de espera informado sem alterar o contexto dos outros testes."""
+    def run():
+        set_max_wait(seconds)
+        return func(*args)
+    return contextvars.copy_context().run(run)
+
+
+def test_bucket_without_rate_never_limits():
+    bucket = TokenBucket("teste", 0)
+    for _ in range(1000):
+        with_max_wait(0, bucket.acquire, 10)
+
+
+def test_bucket_rejects_when_wait_exceeds_limit():
+    bucket = TokenBucket("teste", 60, capacity=2) # 1 unidade por segundo
+    with_max_wait(0, bucket.acquire, 2)
+    with pytest.raises(CapacityExceeded) as error:
+        with_max_wait(0.5, bucket.acquire)
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+    assert bucket.stats()["available"] == pytest.approx(0, abs=0.1) # Reserva desfeita
+
+
+def test_bucket_waits_for_refill():
+    bucket = TokenBucket("teste", 6000, capacity=1) # 100 unidades por segundo
+    with_max_wait(1, bucket.acquire)
+    started = time.monotonic()
+    with_max_wait(1, bucket.acquire)
+    assert time.monotonic() - started >= 0.005
+
+
+def test_bucket_adjust_never_exceeds_capacity():
+    bucket = TokenBucket("teste", 60, capacity=10)
+    with_max_wait(None, bucket.acquire, 4)
+    bucket.adjust(3)
+    assert bucket.stats()["available"] == pytest.approx(3, abs=0.1)
+    bucket.adjust(-100)
+    assert bucket.stats()["available"] == 10
+
+
+def test_limiter_halves_on_throttling_and_grows_additively():
+    limiter = AdaptiveLimiter("teste", max_limit=8)
+    for expected in (4, 2, 1, 1):
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.stats()["limit"] == expected
+    assert limiter.throttled == 4
+
+    successes = 0
+    while limiter.stats()["limit"] < 4:
+        limiter.acquire()
+        limiter.release()
+        successes += 1
+    assert successes == 7 # +1/limite por sucesso: 1 -> 2 -> 2.5 -> 2.9 -> 3.24 -> 3.55 -> 3.84 -> 4.1
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.stats() == {"limit": 8, "in_flight": 0, "throttled": 4}
+
+
+def test_limiter_rejects_when_full():
+    limiter = AdaptiveLimiter("teste", max_limit=1)
+    limiter.acquire()
+    with pytest.raises(CapacityExceeded) as error:
+        with_max_wait(0.05, limiter.acquire)
+    assert error.value.status_code == 429
+    limiter.release()
+    with_max_wait(0, limiter.acquire)
+
+
+def test_limiter_wakes_waiting_caller():
+    limiter = AdaptiveLimiter("teste", max_limit=1)
+    limiter.acquire()
+    threading.Timer(0.05, limiter.release).start()
+    with_max_wait(5, limiter.acquire)
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_admission_rejects_when_queue_is_full():
+    async def scenario():
+        admission = AdmissionControl(max_active=1, max_queued=0)
+        started = await admission.acquire()
+        with pytest.raises(CapacityExceeded) as error:
+            await admission.acquire()
+        await admission.release(started)
+        await admission.release(await admission.acquire())
+        return error.value, admission.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert stats == {"active": 0, "queued": 0, "rejected": 1}
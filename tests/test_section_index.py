@@ -0,0 +1,66 @@
+# test_section_index.py
+from config import PROMPT_PRUNING_MIN_CHARS
+from section_index import prune_edital_text
+
+FILLER = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt. "
+
+
+def make_edital(titles: list[str], section_chars: int = 2000, sizes: dict | None = None) -> str:
+    """Edital sintético: preâmbulo curto e uma seção numerada por título, com texto neutro (sem palavras-chave)."""
+    sizes = sizes or {}
+    parts = ["PREGÃO ELETRÔNICO Nº 10/2024\n" + FILLER * 3 + "\n"]
+    for number, title in enumerate(titles, start=1):
+        chars = sizes.get(title, section_chars)
+        parts.append(f"{number}. {title}\n" + FILLER * (chars // len(FILLER)) + "\n")
+    return "".join(parts)
+
+
+TITLES = [
+    "DO OBJETO", "DA HABILITAÇÃO", "DAS SANÇÕES ADMINISTRATIVAS", "DO FORO", "DAS DISPOSIÇÕES GERAIS",
+    "DA RESCISÃO", "DOS RECURSOS", "DA FISCALIZAÇÃO", "DO REAJUSTE", "DAS PENALIDADES",
+]
+
+
+def test_prunes_to_relevant_sections():
+    text = make_edital(TITLES)
+    result = prune_edital_text(text)
+    assert result.pruned
+    assert "1. DO OBJETO" in result.text and "2. DA HABILITAÇÃO" in result.text
+    assert "DO FORO" not in result.text
+    assert "[...]" in result.text
+    assert result.kept_chars == len(result.text) < result.original_chars == len(text)
+    assert result.sections_kept < result.sections_total
+
+
+def test_short_text_is_kept_whole():
+    text = make_edital(TITLES, section_chars=200)
+    assert len(text) < PROMPT_PRUNING_MIN_CHARS
+    result = prune_edital_text(text)
+    assert not result.pruned and result.reason == "edital curto" and result.text == text
+
+
+def test_few_sections_fall_back_to_full_text():
+    text = make_edital(TITLES[:3], section_chars=6000)
+    result = prune_edital_text(text)
+    assert not result.pruned and result.reason == "poucas seções reconhecidas" and result.text == text
+
+
+def test_dominant_section_falls_back_to_full_text():
+    text = make_edital(TITLES, sizes={"DO FORO": 30000})
+    result = prune_edital_text(text)
+    assert not result.pruned and result.reason == "uma seção concentra mais da metade do texto"
+
+
+def test_missing_object_section_falls_back_to_full_text():
+    text = make_edital(["DO PAGAMENTO"] + TITLES[1:])
+    result = prune_edital_text(text)
+    assert not result.pruned and result.reason == "seções de objeto ou habilitação não encontradas"
+
+
+def test_small_savings_fall_back_to_full_text():
+    relevant = [
+        "DO OBJETO", "DA HABILITAÇÃO", "DA QUALIFICAÇÃO TÉCNICA", "DO VALOR ESTIMADO", "DO CRITÉRIO DE JULGAMENTO",
+        "DA GARANTIA", "DA VISITA TÉCNICA", "DA PROVA DE CONCEITO", "DA SESSÃO PÚBLICA", "DO FORO",
+    ]
+    result = prune_edital_text(make_edital(relevant))
+    assert not result.pruned and result.reason == "economia pequena"
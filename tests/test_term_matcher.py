@@ -0,0 +1,46 @@
+# test_term_matcher.py
+from term_matcher import DEFAULT_SYNONYMS, TermMatcher, load_synonyms_file
+
+
+def test_finds_canonical_terms():
+    matcher = TermMatcher(DEFAULT_SYNONYMS)
+    terms = matcher.find_terms("Migração de contas GWS e projetos no GCP com Inteligência Artificial")
+    assert terms == {"google workspace", "google cloud platform", "inteligência artificial"}
+
+
+def test_longest_alternative_wins():
+    matcher = TermMatcher({"google": "google", "google cloud platform": "gcp"})
+    assert matcher.find_terms("Projetos no Google Cloud Platform") == {"gcp"}
+
+
+def test_terms_only_match_whole_words():
+    matcher = TermMatcher(DEFAULT_SYNONYMS)
+    assert matcher.find_terms("matéria de iniciação") == set()
+    assert matcher.find_terms("solução de IA.") == {"inteligência artificial"}
+
+
+def test_normalize():
+    matcher = TermMatcher(DEFAULT_SYNONYMS)
+    assert matcher.normalize("  Chatbots ") == "chatbot"
+    assert matcher.normalize("Servidor Dedicado") == "servidor dedicado"
+
+
+def test_empty_table():
+    matcher = TermMatcher({"": "ignorado"})
+    assert matcher.find_terms("qualquer texto") == set()
+    assert matcher.normalize("Texto") == "texto"
+
+
+def test_fingerprint_ignores_order_and_case():
+    assert TermMatcher({"GCP": "Google Cloud", "gws": "workspace"}).fingerprint == \
+        TermMatcher({"gws": "workspace", "gcp": "google cloud"}).fingerprint
+    assert TermMatcher({"gcp": "google cloud"}).fingerprint != TermMatcher({"gcp": "outro"}).fingerprint
+
+
+def test_load_synonyms_file(tmp_path):
+    csv_path = tmp_path / "sinonimos.csv"
+    csv_path.write_text("bq,bigquery\nlinha incompleta\n", encoding="utf-8")
+    json_path = tmp_path / "sinonimos.json"
+    json_path.write_text('{"bq": "bigquery"}', encoding="utf-8")
+    assert load_synonyms_file(str(csv_path)) == {"bq": "bigquery"}
+    assert load_synonyms_file(str(json_path)) == {"bq": "bigquery"}
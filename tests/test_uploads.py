@@ -0,0 +1,112 @@
+# test_uploads.py
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from uploads import check_content_length, receive_uploads
+
+BOUNDARY = "limite-do-teste"
+
+
+def multipart_body(files: list[tuple[str, str, str, bytes]], fields: dict | None = None) -> bytes:
+    """Corpo multipart/form-data com os arquivos (campo, nome, tipo, conteúdo) e campos de texto."""
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for field, filename, content_type, content in files:
+        header = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                  f"Content-Type: {content_type}\r\n\r\n")
+        parts.append(header.encode() + content + b"\r\n")
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, chunk_size: int = 7000, content_length: bool = True) -> Request:
+    """Requisição ASGI com o corpo entregue em blocos (como no servidor)."""
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    chunks = [body[first:first + chunk_size] for first in range(0, len(body), chunk_size)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers}, receive)
+
+
+def receive(body: bytes, **options):
+    options.setdefault("content_types", ["application/pdf"])
+    return asyncio.run(receive_uploads(make_request(body, content_length=options.pop("content_length", True)), "file", **options))
+
+
+def test_small_upload_stays_in_memory(tmp_path):
+    content = os.urandom(5000)
+    body = multipart_body([("file", "edital.pdf", "application/pdf", content)], fields={"prioridade": "1"})
+    [upload] = receive(body, spool_threshold=10000, spool_dir=str(tmp_path))
+    assert upload.filename == "edital.pdf" and upload.content_type == "application/pdf"
+    assert upload.path is None and bytes(upload.source) == content
+    assert upload.size == len(content) and upload.sha256 == hashlib.sha256(content).hexdigest()
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_upload_is_spooled_to_file(tmp_path):
+    content = os.urandom(3 * 1024 * 1024 + 123)
+    [upload] = receive(multipart_body([("file", "edital.pdf", "application/pdf", content)]),
+                       spool_threshold=1024, spool_dir=str(tmp_path))
+    assert upload.data is None and upload.source == upload.path
+    assert os.path.dirname(upload.path) == str(tmp_path) and upload.path.endswith(".pdf")
+    with open(upload.path, "rb") as f:
+        assert f.read() == content
+    assert upload.sha256 == hashlib.sha256(content).hexdigest()
+    upload.cleanup()
+    assert os.listdir(tmp_path) == []
+
+
+def test_multiple_files_keep_form_order(tmp_path):
+    contents = [b"primeiro" * 100, b"segundo" * 100]
+    body = multipart_body([("file", f"{i}.pdf", "application/pdf", content) for i, content in enumerate(contents)])
+    uploads = receive(body, max_files=2, spool_threshold=0, spool_dir=str(tmp_path))
+    assert [upload.filename for upload in uploads] == ["0.pdf", "1.pdf"]
+    assert [upload.sha256 for upload in uploads] == [hashlib.sha256(content).hexdigest() for content in contents]
+    assert len({upload.path for upload in uploads}) == 2
+
+
+def test_file_over_limit_is_rejected_and_removed(tmp_path):
+    body = multipart_body([("file", "edital.pdf", "application/pdf", os.urandom(200000))])
+    with pytest.raises(HTTPException) as error:
+        receive(body, max_bytes=100000, spool_threshold=1024, spool_dir=str(tmp_path), content_length=False)
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_content_length_is_checked_before_reading():
+    async def receive():
+        raise AssertionError("o corpo não deveria ser lido")
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()), (b"content-length", b"3000000")]
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": headers}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(receive_uploads(request, "file", max_files=2, max_bytes=1024 * 1024))
+    assert error.value.status_code == 413
+    check_content_length(request, max_bytes=0) # 0 desativa o limite
+
+
+def test_too_many_files(tmp_path):
+    body = multipart_body([("file", f"{i}.pdf", "application/pdf", b"conteudo") for i in range(3)])
+    with pytest.raises(HTTPException) as error:
+        receive(body, max_files=2, spool_threshold=0, spool_dir=str(tmp_path))
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_unsupported_type_and_missing_field():
+    with pytest.raises(HTTPException) as error:
+        receive(multipart_body([("file", "planilha.xlsx", "application/vnd.ms-excel", b"conteudo")]))
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        receive(multipart_body([("outro", "edital.pdf", "application/pdf", b"conteudo")]))
+    assert error.value.status_code == 422
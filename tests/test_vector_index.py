@@ -0,0 +1,74 @@
+# test_vector_index.py
+import numpy as np
+import pytest
+
+from vector_index import ExactIndex, IVFIndex, create_index, l2_normalize, load_index, recall_at_k
+
+
+def clustered_vectors(n: int, dim: int = 32, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    """Vetores agrupados em torno de centros aleatórios, como embeddings de um catálogo real."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + rng.normal(scale=0.3, size=(n, dim))).astype(np.float32)
+
+
+def build(kind: str, vectors: np.ndarray, **options) -> ExactIndex:
+    index = create_index(kind, vectors.shape[1], **options)
+    index.add(vectors, [f"ativo-{row}" for row in range(len(vectors))])
+    return index
+
+
+def test_exact_index_matches_brute_force():
+    vectors = clustered_vectors(300)
+    queries = clustered_vectors(10, seed=1)
+    ids, scores = build("exact", vectors).search(queries, 5)
+    similarities = l2_normalize(queries) @ l2_normalize(vectors).T
+    assert (ids == np.argsort(-similarities, axis=1)[:, :5]).all()
+    assert np.allclose(scores, np.sort(similarities, axis=1)[:, ::-1][:, :5], atol=1e-6)
+
+
+def test_add_skips_known_keys():
+    vectors = clustered_vectors(4)
+    index = ExactIndex(vectors.shape[1])
+    assert index.add(vectors[:2], ["a", "b"]) == [0, 1]
+    assert index.add(vectors[1:], ["b", "c", "d"]) == [1, 2, 3]
+    assert index.ntotal == 4
+
+
+@pytest.mark.parametrize("n_probe, min_recall", [(8, 0.9), (1000, 1.0)])
+def test_ivf_recall_against_exact(n_probe, min_recall):
+    vectors = clustered_vectors(3000)
+    queries = clustered_vectors(200, seed=1)
+    index = build("ivf", vectors, n_probe=n_probe)
+    assert len(index.centroids) == int(np.sqrt(len(vectors)))
+    for k in (1, 10):
+        assert recall_at_k(index, queries, k) >= min_recall
+
+
+def test_ivf_retrains_when_size_doubles():
+    vectors = clustered_vectors(800)
+    index = build("ivf", vectors[:200])
+    assert index.trained_size == 200
+    index.add(vectors[200:300], [f"novo-{row}" for row in range(100)])
+    assert index.trained_size == 200 and len(index.assignments) == 300
+    index.add(vectors[300:], [f"mais-{row}" for row in range(500)])
+    assert index.trained_size == 800
+    assert recall_at_k(index, clustered_vectors(50, seed=2), 5) >= 0.9
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf"])
+def test_save_and_load(tmp_path, kind):
+    vectors = clustered_vectors(500)
+    queries = clustered_vectors(20, seed=1)
+    index = build(kind, vectors)
+    index.save(str(tmp_path))
+    loaded = load_index(str(tmp_path))
+    assert type(loaded) is type(index) and loaded.keys == index.keys
+    for expected, found in zip(index.search(queries, 5), loaded.search(queries, 5)):
+        assert np.allclose(expected, found)
+    assert load_index(str(tmp_path / "ausente")) is None
+
+
+def test_ivf_empty_index():
+    ids, scores = IVFIndex(8).search(np.ones((2, 8), dtype=np.float32), 3)
+    assert ids.shape == (2, 0) and scores.shape == (2, 0)
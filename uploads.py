@@ -0,0 +1,203 @@
+# uploads.py
+import asyncio
+import hashlib
+import os
+import uuid
+
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from config import UPLOAD_MAX_BYTES, UPLOAD_SPOOL_THRESHOLD_BYTES, UPLOAD_SPOOL_DIR
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Folga para os cabeçalhos e delimitadores do multipart na checagem do Content-Length
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class IngestedUpload:
+    """
+    Documento recebido em um upload. O conteúdo fica em memória (`data`) ou, acima do limite de spool,
+    em um arquivo de nome único (`path`), nunca nos dois: `source` é o que o pipeline recebe.
+    """
+
+    def __init__(self, filename: str | None, content_type: str, sha256: str, size: int,
+                 data: bytearray | None = None, path: str | None = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> bytearray | str:
+        return self.path if self.path is not None else self.data
+
+    def cleanup(self):
+        """Libera o conteúdo (remove o arquivo de spool, se houver)."""
+        self.data = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+            print(f"Arquivo temporário removido: {self.path}")
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Arquivo maior que o limite de {max_bytes / (1024 * 1024):.1f} MB.")
+
+
+def check_content_length(request: Request, max_bytes: int = UPLOAD_MAX_BYTES, max_files: int = 1):
+    """
+    Recusa com 413 pelo Content-Length, antes de ler qualquer byte do corpo, um formulário que não
+    cabe em `max_files` arquivos de até `max_bytes` (0 desativa). Sem o header (chunked), o limite
+    é aplicado durante a leitura.
+    """
+    content_length = request.headers.get("content-length")
+    if not max_bytes or content_length is None:
+        return
+    try:
+        length = int(content_length)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Header Content-Length inválido.")
+    if length > max_bytes * max_files + UPLOAD_FORM_OVERHEAD_BYTES:
+        raise _too_large(max_bytes)
+
+
+class _UploadSink:
+    """
+    Destino de um arquivo do formulário: SHA-256 e tamanho calculados durante a leitura; até
+    `spool_threshold` bytes em memória, a partir daí em um arquivo de spool (escrito fora do event loop).
+    """
+
+    def __init__(self, filename: str | None, content_type: str, max_bytes: int, spool_threshold: int, spool_dir: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.buffer = bytearray() # Conteúdo em memória ou, com spool, o que ainda não foi gravado
+        self.path = None
+        self.spool = None
+
+    def _open_spool(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        extension = os.path.splitext(self.filename or "")[1]
+        # Nome único: uploads simultâneos com o mesmo nome não se sobrescrevem
+        self.path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}{extension}")
+        self.spool = open(self.path, "wb")
+
+    async def _flush(self):
+        if self.buffer:
+            data, self.buffer = self.buffer, bytearray()
+            await asyncio.to_thread(self.spool.write, data)
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        self.digest.update(chunk)
+        self.buffer += chunk
+        if self.spool is None and self.size > self.spool_threshold:
+            self._open_spool()
+        if self.spool is not None and len(self.buffer) >= UPLOAD_CHUNK_BYTES:
+            await self._flush()
+
+    async def finish(self) -> IngestedUpload:
+        if self.spool is None and self.spool_threshold <= 0:
+            self._open_spool() # Upload vazio, mas o chamador precisa de um arquivo
+        if self.spool is None:
+            return IngestedUpload(self.filename, self.content_type, self.digest.hexdigest(), self.size, data=self.buffer)
+        await self._flush()
+        self.spool.close()
+        return IngestedUpload(self.filename, self.content_type, self.digest.hexdigest(), self.size, path=self.path)
+
+    def discard(self):
+        self.buffer = bytearray()
+        if self.spool is not None:
+            self.spool.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+async def receive_uploads(request: Request, field: str, max_files: int = 1, content_types: list[str] | None = None,
+                          max_bytes: int = UPLOAD_MAX_BYTES, spool_threshold: int = UPLOAD_SPOOL_THRESHOLD_BYTES,
+                          spool_dir: str = UPLOAD_SPOOL_DIR) -> list[IngestedUpload]:
+    """
+    Lê os arquivos do campo `field` direto do corpo multipart da requisição, sem a cópia intermediária
+    do parser de formulário do Starlette: cada bloco recebido vai uma única vez para a memória ou para o
+    arquivo de spool em `spool_dir` (com spool_threshold=0, sempre em arquivo, ex.: jobs que sobrevivem
+    à requisição), com o SHA-256 calculado durante a leitura.
+    Levanta HTTPException 413 pelo Content-Length antes de ler o corpo, ou assim que um arquivo passa de
+    `max_bytes` (0 desativa); 400 se o tipo de um arquivo não está em `content_types`; 422 sem o campo.
+    """
+    check_content_length(request, max_bytes, max_files)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Envie o arquivo como multipart/form-data.")
+
+    sinks = []
+    current = {"headers": {}, "header_name": b"", "header_value": b"", "sink": None}
+    pending = [] # (destino, bytes) recebidos no último bloco, gravados depois do parser (await)
+
+    def on_part_begin():
+        current.update(headers={}, header_name=b"", header_value=b"", sink=None)
+
+    def on_header_field(data, start, end):
+        current["header_name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        current["header_value"] += data[start:end]
+
+    def on_header_end():
+        current["headers"][current["header_name"].lower()] = current["header_value"]
+        current["header_name"], current["header_value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(current["headers"].get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("utf-8", errors="replace") != field or b"filename" not in options:
+            return # Outros campos do formulário são ignorados
+        if len(sinks) >= max_files:
+            raise HTTPException(status_code=413, detail=f"Máximo de {max_files} arquivos por requisição.")
+        part_type = current["headers"].get(b"content-type", b"application/octet-stream").decode("latin-1").strip()
+        if content_types is not None and part_type not in content_types:
+            raise HTTPException(status_code=400, detail="Formato de arquivo não suportado. Apenas PDF e DOCX são aceitos.")
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        current["sink"] = _UploadSink(filename, part_type, max_bytes, spool_threshold, spool_dir)
+        sinks.append(current["sink"])
+
+    def on_part_data(data, start, end):
+        if current["sink"] is not None:
+            pending.append((current["sink"], bytes(data[start:end])))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin, "on_part_data": on_part_data, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise HTTPException(status_code=400, detail=f"Formulário multipart inválido: {e}")
+            for sink, data in pending:
+                await sink.write(data)
+            pending.clear()
+        parser.finalize()
+        if not sinks:
+            raise HTTPException(status_code=422, detail=f"Campo de arquivo '{field}' ausente no formulário.")
+        return [await sink.finish() for sink in sinks]
+    except BaseException:
+        for sink in sinks:
+            sink.discard()
+        raise
+
+
+def upload_form_openapi(field: str, description: str, multiple: bool = False) -> dict:
+    """Corpo multipart do endpoint na documentação (OpenAPI), já que o arquivo é lido por receive_uploads e não por File()."""
+    schema = {"type": "string", "format": "binary"}
+    if multiple:
+        schema = {"type": "array", "items": schema}
+    form = {"type": "object", "required": [field], "properties": {field: {**schema, "description": description}}}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": form}}}}
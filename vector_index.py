@@ -0,0 +1,265 @@
+# vector_index.py
+import json
+import os
+
+import numpy as np
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza as linhas para norma 1 (produto interno = similaridade de cosseno). Linhas nulas ficam nulas."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _save_array(path: str, name: str, array: np.ndarray):
+    """Grava o .npy em arquivo temporário e troca atomicamente (leitores nunca veem arquivo parcial)."""
+    final_path = os.path.join(path, f"{name}.npy")
+    tmp_path = f"{final_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, final_path)
+
+
+class ExactIndex:
+    """
+    Índice exato (força bruta): similaridade de cosseno contra todos os vetores em um produto de matrizes.
+    Cada vetor tem uma chave (hash do conteúdo, ver EmbeddingCache.make_key), o que permite adicionar
+    apenas as linhas novas quando a planilha muda.
+    """
+
+    kind = "exact"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.keys = []
+        self.key_to_id = {}
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.keys)
+
+    def add(self, vectors: np.ndarray, keys: list[str]) -> list[int]:
+        """Adiciona vetores (normalizados aqui) ainda não indexados; retorna os ids de todas as chaves."""
+        vectors = l2_normalize(vectors)
+        new_positions = []
+        for position, key in enumerate(keys):
+            if key not in self.key_to_id:
+                self.key_to_id[key] = len(self.keys)
+                self.keys.append(key)
+                new_positions.append(position)
+        if new_positions:
+            self._append(vectors[new_positions])
+        return [self.key_to_id[key] for key in keys]
+
+    def _append(self, vectors: np.ndarray):
+        self.vectors = np.vstack([np.asarray(self.vectors), vectors]).astype(np.float32, copy=False)
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Retorna (ids, scores) com forma (n_consultas, k'), k' = min(k, ntotal), do melhor para o pior."""
+        queries = l2_normalize(queries)
+        return _top_k(queries @ np.asarray(self.vectors).T, np.arange(self.ntotal), k)
+
+    def _save_arrays(self, path: str):
+        _save_array(path, "vectors", np.asarray(self.vectors))
+
+    def _load_arrays(self, path: str, mmap: bool):
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+
+    def save(self, path: str):
+        """Persiste o índice em um diretório (arrays .npy, que podem ser abertos via mmap, + metadados JSON)."""
+        os.makedirs(path, exist_ok=True)
+        self._save_arrays(path)
+        tmp_path = os.path.join(path, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "dim": self.dim, "keys": self.keys, **self._extra_meta()}, f)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+    def _extra_meta(self) -> dict:
+        return {}
+
+
+class IVFIndex(ExactIndex):
+    """
+    Índice aproximado IVF (inverted file), em NumPy puro e sem GPU: os vetores são agrupados por
+    k-means em `n_lists` listas; a busca compara a consulta só com os vetores das `n_probe` listas
+    de centróides mais próximos. Novos vetores entram na lista do centróide mais próximo, sem
+    retreino; o k-means é refeito quando o índice dobra de tamanho desde o último treino.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim: int, n_lists: int = 0, n_probe: int = 8, seed: int = 0):
+        super().__init__(dim)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self._lists = []
+
+    def train(self, vectors: np.ndarray, iterations: int = 10):
+        """k-means esférico (cosseno) sobre os vetores informados."""
+        vectors = l2_normalize(vectors)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            # Listas que ficaram vazias mantêm o centróide anterior
+            empty = ~np.bincount(assignments, minlength=n_lists).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = l2_normalize(sums)
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def _append(self, vectors: np.ndarray):
+        super()._append(vectors)
+        if not len(self.centroids) or self.ntotal >= 2 * max(1, self.trained_size):
+            self.train(np.asarray(self.vectors))
+            self.assignments = self._assign(np.asarray(self.vectors))
+        else:
+            self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._rebuild_lists()
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        queries = l2_normalize(queries)
+        if self.ntotal == 0 or not len(queries):
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        k = min(k, self.ntotal)
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :n_probe]
+        vectors = np.asarray(self.vectors)
+
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([self._lists[list_id] for list_id in probes[q]])
+            if not len(candidates):
+                continue
+            ids, scores = _top_k((vectors[candidates] @ query)[None, :], candidates, k)
+            all_ids[q, :ids.shape[1]] = ids[0]
+            all_scores[q, :scores.shape[1]] = scores[0]
+        return all_ids, all_scores
+
+    def _save_arrays(self, path: str):
+        super()._save_arrays(path)
+        _save_array(path, "centroids", self.centroids)
+        _save_array(path, "assignments", self.assignments)
+
+    def _load_arrays(self, path: str, mmap: bool):
+        super()._load_arrays(path, mmap)
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.assignments = np.load(os.path.join(path, "assignments.npy"))
+        self._rebuild_lists()
+
+    def _extra_meta(self) -> dict:
+        return {"n_lists": self.n_lists, "n_probe": self.n_probe, "seed": self.seed, "trained_size": self.trained_size}
+
+
+def _top_k(similarities: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    n_candidates = similarities.shape[1]
+    k = min(k, n_candidates)
+    if k == 0:
+        return np.zeros((similarities.shape[0], 0), dtype=np.int64), np.zeros((similarities.shape[0], 0), dtype=np.float32)
+    if k < n_candidates:
+        positions = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.tile(np.arange(n_candidates), (similarities.shape[0], 1))
+    scores = np.take_along_axis(similarities, positions, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    positions = np.take_along_axis(positions, order, axis=1)
+    return ids[positions].astype(np.int64), np.take_along_axis(scores, order, axis=1)
+
+
+def create_index(kind: str, dim: int, n_lists: int = 0, n_probe: int = 8) -> ExactIndex:
+    if kind == "ivf":
+        return IVFIndex(dim, n_lists=n_lists, n_probe=n_probe)
+    if kind == "exact":
+        return ExactIndex(dim)
+    raise ValueError(f"Tipo de índice vetorial desconhecido: {kind}")
+
+
+def load_index(path: str, mmap: bool = True) -> ExactIndex | None:
+    """Carrega um índice salvo com save(); os vetores são abertos via mmap (somente leitura até o próximo add)."""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["kind"] == "ivf":
+        index = IVFIndex(meta["dim"], n_lists=meta["n_lists"], n_probe=meta["n_probe"], seed=meta["seed"])
+        index.trained_size = meta["trained_size"]
+    else:
+        index = ExactIndex(meta["dim"])
+    index.keys = meta["keys"]
+    index.key_to_id = {key: position for position, key in enumerate(index.keys)}
+    try:
+        index._load_arrays(path, mmap)
+    except (OSError, ValueError) as e:
+        print(f"Aviso: índice vetorial em {path} ilegível: {e}")
+        return None
+    if len(index.vectors) != len(index.keys):
+        # Gravação concorrente de outro worker em andamento: ignora e reconstrói
+        print(f"Aviso: índice vetorial em {path} inconsistente; será reconstruído.")
+        return None
+    return index
+
+
+def recall_at_k(index: ExactIndex, queries: np.ndarray, k: int = 10) -> float:
+    """Recall@k do índice em relação à busca exata sobre os mesmos vetores (1.0 = idêntico ao exato)."""
+    exact = ExactIndex(index.dim)
+    exact.vectors = np.asarray(index.vectors)
+    exact.keys = index.keys
+    expected, _ = exact.search(queries, k)
+    found, _ = index.search(queries, k)
+    hits = sum(len(set(expected[q]) & set(found[q])) for q in range(len(queries)))
+    return hits / max(1, expected.size)
+
+
+# Relatório de recall do índice persistido (dados reais): python vector_index.py [ivf|exact]
+# Consultas: embeddings de requisitos já calculados (cache de requisitos); a busca exata de referência usa
+# os mesmos vetores do índice carregado (ver recall_at_k)
+if __name__ == "__main__":
+    import sys
+    from config import (VECTOR_INDEX_DIR, REQUIREMENT_EMBEDDING_CACHE_DIR, REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES,
+                        EMBEDDING_MODEL_NAME)
+    from embedding_cache import get_embedding_cache, normalize_requirement_text
+
+    kind = sys.argv[1] if len(sys.argv) > 1 else "ivf"
+    index_dir = os.path.join(VECTOR_INDEX_DIR, kind) # Mesmo layout de ai_analyzer (um subdiretório por tipo)
+    index = load_index(index_dir)
+    if index is None:
+        print(f"Nenhum índice salvo em {index_dir}. Execute uma análise com VECTOR_INDEX_BACKEND={kind} para construí-lo.")
+        sys.exit(1)
+
+    queries = np.empty((0, index.dim), dtype=np.float32)
+    if REQUIREMENT_EMBEDDING_CACHE_DIR:
+        cache = get_embedding_cache(REQUIREMENT_EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, REQUIREMENT_EMBEDDING_CACHE_MAX_ENTRIES,
+                                    normalize=normalize_requirement_text, name="requirement_embedding")
+        queries = cache.stored_vectors()
+    if len(queries) == 0 or queries.shape[1] != index.dim:
+        print(f"Nenhum embedding de requisito (dim {index.dim}) em REQUIREMENT_EMBEDDING_CACHE_DIR={REQUIREMENT_EMBEDDING_CACHE_DIR!r}. "
+              "Execute algumas análises com o cache de requisitos ativo para gerar as consultas.")
+        sys.exit(1)
+
+    queries = l2_normalize(queries)
+    for k in (1, 5, 10):
+        print(f"{index.kind} ({index.ntotal} vetores, {len(queries)} requisitos): recall@{k} = {recall_at_k(index, queries, k):.4f}")